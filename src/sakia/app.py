@@ -7,7 +7,7 @@ import aiohttp
 from PyQt5.QtCore import QObject, pyqtSignal, QTranslator, QCoreApplication, QLocale, Qt
 from . import __version__
 from .options import SakiaOptions
-from sakia.data.connectors import BmaConnector
+from sakia.data.connectors import BmaConnector, EndpointsHealthTracker
 from sakia.services import NetworkService, BlockchainService, IdentitiesService, \
     SourcesServices, TransactionsService, DocumentsService
 from sakia.data.repositories import SakiaDatabase
@@ -41,6 +41,7 @@ class Application(QObject):
     :param sakia.services.SourcesService sources_service: All sources services for current currency
     :param sakia.Services.TransactionsService transactions_service: All transactions services for current currency
     :param sakia.services.DocumentsService documents_service: A service to broadcast documents
+    :param sakia.data.connectors.BmaConnector bma_connector: The connector to BMA API, shared by all processors
     """
 
     new_dividend = pyqtSignal(Dividend)
@@ -66,6 +67,7 @@ class Application(QObject):
     sources_service = attr.ib(default=None)
     transactions_service = attr.ib(default=None)
     documents_service = attr.ib(default=None)
+    bma_connector = attr.ib(default=None)
     current_ref = attr.ib(default=Quantitative)
     _logger = attr.ib(default=attr.Factory(lambda:logging.getLogger('sakia')))
     available_version = attr.ib(init=False)
@@ -103,7 +105,11 @@ class Application(QObject):
 
     def instanciate_services(self):
         nodes_processor = NodesProcessor(self.db.nodes_repo)
-        bma_connector = BmaConnector(nodes_processor, self.parameters)
+        if self.bma_connector:
+            asyncio.ensure_future(self.bma_connector.close_sessions())
+        bma_connector = BmaConnector(nodes_processor, self.parameters, self.db.blocks_repo,
+                                     EndpointsHealthTracker.instanciate(self))
+        self.bma_connector = bma_connector
         connections_processor = ConnectionsProcessor(self.db.connections_repo)
         identities_processor = IdentitiesProcessor(self.db.identities_repo, self.db.blockchains_repo, bma_connector)
         certs_processor = CertificationsProcessor(self.db.certifications_repo, self.db.identities_repo, bma_connector)
@@ -123,7 +129,7 @@ class Application(QObject):
         self.transactions_service = TransactionsService(self.currency, transactions_processor,
                                                                    dividends_processor,
                                                                    identities_processor, connections_processor,
-                                                                   bma_connector)
+                                                                   blockchain_processor, bma_connector)
 
         self.sources_service = SourcesServices(self.currency, sources_processor,
                                                connections_processor, transactions_processor,
@@ -187,6 +193,11 @@ class Application(QObject):
         and stop the coroutines
         """
         await self.network_service.stop_coroutines(closing)
+        await self.blockchain_service.stop_coroutines()
+        await self.bma_connector.close_sessions()
+        self.bma_connector.persist_endpoints_health()
+        self.db.commit()
+        self.db.shutdown()
 
     @asyncify
     async def get_last_version(self):
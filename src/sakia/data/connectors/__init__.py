@@ -1,3 +1,8 @@
 from .node import NodeConnector
 from .bma import BmaConnector
 from .bma import parse_responses as parse_bma_responses
+from .endpoints_health import EndpointsHealthTracker
+from .rate_limiter import RateLimiter, TokenBucket
+from .circuit_breaker import CircuitBreaker, CircuitBreakers
+from .blocks_fan_in import BlocksFanIn
+from .peers_leaves import PeersLeaves
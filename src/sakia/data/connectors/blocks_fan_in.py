@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from duniterpy.api import errors
+from duniterpy.documents import BlockUID
+from ..entities.node import Node
+
+
+class BlocksFanIn(QObject):
+    """
+    Fan-in of the blocks notified by the nodes of a network.
+
+    The same block is notified by the websocket of every node : the notifications
+    are grouped by block hash during a short delay, the previous block of the nodes
+    is requested once per group through a cache shared by all the nodes,
+    and the nodes of a group are updated in one batch.
+    """
+    # The nodes updated by a notified block
+    nodes_changed = pyqtSignal(list)
+
+    # Delay in seconds during which the notifications of a block are grouped
+    DELAY = 0.5
+    # Previous blocks kept in the cache
+    CACHE_SIZE = 100
+
+    def __init__(self):
+        super().__init__()
+        self._pending = {}
+        self._previous_blocks = OrderedDict()
+        self._logger = logging.getLogger('sakia')
+
+    def receive(self, connector, block_data):
+        """
+        Receive a block notified by a node
+        :param sakia.data.connectors.NodeConnector connector: the connector of the node
+        :param dict block_data: the block data in json format
+        """
+        node = connector.node
+        if node.state == Node.ONLINE and node.current_buid \
+                and node.current_buid.sha_hash == block_data['hash']:
+            return
+        if block_data['hash'] in self._pending:
+            connectors = self._pending[block_data['hash']][1]
+            if connector not in connectors:
+                connectors.append(connector)
+        else:
+            self._pending[block_data['hash']] = (block_data, [connector])
+            asyncio.ensure_future(self._handle_block(block_data['hash']))
+
+    async def _handle_block(self, block_hash):
+        """
+        Update all the nodes which notified a block
+        :param str block_hash: the hash of the block
+        """
+        await asyncio.sleep(BlocksFanIn.DELAY)
+        block_data, connectors = self._pending.pop(block_hash)
+        self._logger.debug("Block {0} notified by {1} nodes".format(block_data['number'], len(connectors)))
+        changed = []
+        failed = set()
+        for connector in connectors:
+            node = connector.node
+            if node.current_buid:
+                number = node.current_buid.number
+            else:
+                # The node had no block yet : its previous block is the one before the notified block
+                number = block_data['number'] - 1
+            previous_buid = await self.previous_buid(block_data, number, connectors, failed)
+            if previous_buid is None:
+                # Only the nodes which failed to answer are offline
+                if connector not in failed:
+                    continue
+                node.state = Node.OFFLINE
+            else:
+                node.state = Node.ONLINE
+                node.previous_buid = previous_buid
+                node.current_buid = BlockUID(block_data['number'], block_data['hash'])
+                node.current_ts = block_data['medianTime']
+            changed.append(connector)
+        self.nodes_changed.emit(changed)
+
+    async def previous_buid(self, block_data, number, connectors, failed):
+        """
+        Get the uid of the block at a given number in the chain of a notified block.
+        It is requested once to the nodes which notified the block, then cached.
+        :param dict block_data: the notified block data in json format
+        :param int number: the number of the previous block
+        :param List[sakia.data.connectors.NodeConnector] connectors: the connectors of the nodes
+        which notified the block
+        :param set failed: the connectors which failed to answer, they are not requested again
+        and the connectors failing to answer are added to it
+        :return: the block uid, BlockUID.empty() if the block was not found, None if no node answered
+        :rtype: duniterpy.documents.BlockUID
+        """
+        if number == block_data['number'] - 1 and block_data.get('previousHash'):
+            return BlockUID(number, block_data['previousHash'])
+        key = (block_data['hash'], number)
+        if key in self._previous_blocks:
+            self._previous_blocks.move_to_end(key)
+            return self._previous_blocks[key]
+        for connector in connectors:
+            if connector in failed:
+                continue
+            try:
+                previous_block = await connector.request_block(number)
+                if previous_block:
+                    previous_buid = BlockUID(previous_block['number'], previous_block['hash'])
+                    break
+            except errors.DuniterError as e:
+                if e.ucode == errors.BLOCK_NOT_FOUND:
+                    previous_buid = BlockUID.empty()
+                    break
+                self._logger.debug("Error in previous block reply of {0} : {1}".format(connector.node.pubkey[:5],
+                                                                                      str(e)))
+            failed.add(connector)
+        else:
+            return None
+        self._previous_blocks[key] = previous_buid
+        if len(self._previous_blocks) > BlocksFanIn.CACHE_SIZE:
+            self._previous_blocks.popitem(last=False)
+        return previous_buid
@@ -2,15 +2,28 @@ import logging
 import aiohttp
 from aiohttp.errors import ClientError, ServerDisconnectedError
 from duniterpy.api import bma, errors
-from duniterpy.documents import BMAEndpoint, SecuredBMAEndpoint
+from duniterpy.documents import BMAEndpoint, SecuredBMAEndpoint, Block
+from duniterpy.documents.document import MalformedDocumentError
 from sakia.errors import NoPeerAvailable
+from ..entities import CachedBlock
+from .endpoints_health import EndpointsHealthTracker
+from .rate_limiter import RateLimiter
+from .circuit_breaker import CircuitBreakers
 from pkg_resources import parse_version
 from socket import gaierror
 import asyncio
-import random
+import math
+import time
 import jsonschema
 import attr
-import copy
+import hashlib
+import inspect
+
+# The argument limiting the connections to a same node : aiohttp >= 2.0 limits the total of the connections
+# of a session with "limit", and the connections to a same endpoint with "limit_per_host".
+# The "limit" of aiohttp 1.x is per endpoint.
+_PER_HOST_LIMIT = "limit_per_host" if "limit_per_host" in inspect.signature(aiohttp.TCPConnector).parameters \
+    else "limit"
 
 
 async def parse_responses(responses):
@@ -59,25 +72,6 @@ def filter_endpoints(request, nodes):
     return endpoints
 
 
-def make_hash(o):
-    """
-    Makes a hash from a dictionary, list, tuple or set to any level, that contains
-    only other hashable types (including any lists, tuples, sets, and
-    dictionaries).
-    """
-
-    if isinstance(o, (set, tuple, list)):
-        return tuple(sorted([make_hash(e) for e in o]))
-    elif not isinstance(o, dict):
-        return hash(o)
-
-    new_o = copy.deepcopy(o)
-    for k, v in new_o.items():
-        new_o[k] = make_hash(v)
-
-    return hash(tuple(frozenset(sorted(new_o.items()))))
-
-
 def _compare_json(first, second):
     """
     Compare two json dicts
@@ -104,21 +98,63 @@ def _compare_json(first, second):
     return ordered(first) == ordered(second)
 
 
-def _filter_data(request, data):
-    filtered = data
-    if request is bma.tx.history:
-        filtered = copy.deepcopy(data)
-        filtered["history"].pop("sending")
-        filtered["history"].pop("receiving")
-        filtered["history"].pop("pending")
-    elif request is bma.wot.requirements:
-        filtered = copy.deepcopy(data)
-        for idty in filtered["identities"]:
-            for c in idty["certifications"]:
-                c.pop("expiresIn")
-            idty.pop('membershipPendingExpiresIn')
+# Fields of the answers which differ from one node to another, and must be ignored
+# when comparing them. A field set to None is skipped, the fields of a list apply to
+# each of its elements.
+VOLATILE_FIELDS = {
+    bma.tx.history: {"history": {"sending": None, "receiving": None, "pending": None}},
+    bma.wot.requirements: {"identities": {"membershipPendingExpiresIn": None,
+                                          "certifications": {"expiresIn": None}}}
+}
 
-    return filtered
+
+def _feed_digest(hasher, data, volatile_fields):
+    """
+    Feed a canonical form of json data to a hasher : the keys of the dicts are sorted,
+    and the order of the elements of the lists is not significant.
+    :param hasher: the hashlib hasher
+    :param data: the json data
+    :param dict volatile_fields: the fields to skip
+    """
+    if isinstance(data, dict):
+        hasher.update(b"{")
+        for key in sorted(data):
+            fields = volatile_fields.get(key, {}) if volatile_fields else {}
+            if fields is not None:
+                hasher.update(repr(key).encode("utf-8"))
+                hasher.update(b":")
+                _feed_digest(hasher, data[key], fields)
+        hasher.update(b"}")
+    elif isinstance(data, (list, tuple)):
+        hasher.update(b"[")
+        for element in sorted(_element_digest(e, volatile_fields) for e in data):
+            hasher.update(element)
+        hasher.update(b"]")
+    else:
+        hasher.update(repr(data).encode("utf-8"))
+        hasher.update(b",")
+
+
+def _element_digest(data, volatile_fields):
+    if isinstance(data, (dict, list, tuple)):
+        hasher = hashlib.sha256()
+        _feed_digest(hasher, data, volatile_fields)
+        return b"h" + hasher.digest()
+    else:
+        return b"s" + repr(data).encode("utf-8") + b","
+
+
+def answer_digest(request, data):
+    """
+    Compute the digest of an answer, to compare it with the answers of the other nodes.
+    The data is neither copied nor modified.
+    :param class request: the bma request class of the answer
+    :param data: the json data answered
+    :rtype: bytes
+    """
+    hasher = hashlib.sha256()
+    _feed_digest(hasher, data, VOLATILE_FIELDS.get(request))
+    return hasher.digest()
 
 
 def _merge_lookups(answers_data):
@@ -154,68 +190,258 @@ def _best_answer(answers, answers_data, nb_verification):
         return answers_data[best_dict_hash]
 
 
+def _verified_block_doc(data):
+    """
+    Rebuild a block from its signed raw, and check that it was not tampered with :
+    its inner hash must be the hash of its contents, its hash the proof of work of its inner hash,
+    and the fields of its json format must be the ones of its signed raw.
+    :param dict data: the block in json format
+    :return: the document of the block, None if the block was tampered with
+    :rtype: duniterpy.documents.Block
+    """
+    try:
+        block_doc = Block.from_signed_raw("{0}{1}\n".format(data['raw'], data['signature']))
+    except (KeyError, TypeError, ValueError, IndexError, AttributeError, MalformedDocumentError):
+        return None
+    # The inner hash covers the signed text up to the InnerHash field, as the node sent it :
+    # the raw regenerated by duniterpy does not always give the same text
+    # (and its computed_inner_hash also covers the InnerHash and Nonce fields)
+    raw = data['raw']
+    inner_doc = raw[:raw.rindex("InnerHash: ")]
+    if hashlib.sha256(inner_doc.encode("ascii")).hexdigest().upper() != block_doc.inner_hash:
+        return None
+    if block_doc.proof_of_work() != data.get('hash'):
+        return None
+    if (data.get('number'), data.get('previousHash') or None, data.get('medianTime'), data.get('membersCount'),
+            data.get('dividend') or None, data.get('unitbase')) != \
+            (block_doc.number, block_doc.prev_hash, block_doc.mediantime, block_doc.members_count,
+             block_doc.ud or None, block_doc.unit_base):
+        return None
+    return block_doc
+
+
+def _check_blocks_chain(blocks_data, start, count, previous_hash, end_hash):
+    """
+    Check that blocks are the expected ones, not tampered with, and linked by their previous hash
+    :param list[dict] blocks_data: the blocks in json format
+    :param int start: the number of the first block expected
+    :param int count: the number of blocks expected
+    :param str previous_hash: the hash of the block before the first one, if known
+    :param str end_hash: the hash of the last block
+    :rtype: bool
+    """
+    if len(blocks_data) != count:
+        return False
+    for i, data in enumerate(blocks_data):
+        block_doc = _verified_block_doc(data)
+        if not block_doc or block_doc.number != start + i:
+            return False
+        if i > 0:
+            previous_hash = blocks_data[i - 1]['hash']
+        if previous_hash and block_doc.prev_hash != previous_hash:
+            return False
+    return blocks_data[-1]['hash'] == end_hash
+
+
 @attr.s()
 class BmaConnector:
     """
     This class is used to access BMA API.
+
+    HTTP sessions are pooled by currency : every request to the nodes
+    of a currency reuses the same keep-alive connections.
+
+    Identical GET requests in flight at the same time are coalesced :
+    the callers share the result of the first request.
+
+    Blocks below the consensus head are immutable : once verified, they are
+    stored in the blocks repository and served without any network request.
+
+    Every request outcome feeds the endpoints health tracker, which weights
+    the selection of the endpoints toward fast and healthy nodes.
+
+    The requests sent to a node are rate limited by a token bucket learning the
+    rate tolerated by the node : they are queued when its budget is spent.
+
+    The endpoints failing repeatedly are skipped until a cool-down is over, thanks
+    to circuit breakers shared with the nodes connectors.
     """
+    # Simultaneous connections opened to a same node, the total is left to the aiohttp default
+    CONNECTIONS_PER_HOST = 4
+    # Time in seconds an idle connection is kept open
+    KEEPALIVE_TIMEOUT = 30
+    # Blocks requested at once when downloading a range of blocks
+    BLOCKS_WINDOW = 100
+    # Windows of blocks downloaded at the same time
+    DOWNLOAD_CONCURRENCY = 4
+
     _nodes_processor = attr.ib()
     _user_parameters = attr.ib()
+    _blocks_repo = attr.ib(default=None)
+    _endpoints_health = attr.ib(default=attr.Factory(lambda: EndpointsHealthTracker(None)))
+    _rate_limiter = attr.ib(default=attr.Factory(RateLimiter))
+    circuit_breakers = attr.ib(default=attr.Factory(CircuitBreakers))
+    _sessions = attr.ib(default=attr.Factory(dict))
+    _in_flight = attr.ib(default=attr.Factory(dict))
+    # Number of calls served by an identical request already in flight
+    coalesced_calls = attr.ib(default=0, init=False)
+    # Statistics of the blocks cache
+    blocks_cache_hits = attr.ib(default=0, init=False)
+    blocks_cache_misses = attr.ib(default=0, init=False)
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
+    def session(self, currency):
+        """
+        Get the pooled session of a currency, creating it if needed
+        :param str currency: the currency requested
+        :rtype: aiohttp.ClientSession
+        """
+        session = self._sessions.get(currency)
+        if not session or session.closed:
+            connector = aiohttp.TCPConnector(keepalive_timeout=BmaConnector.KEEPALIVE_TIMEOUT,
+                                             use_dns_cache=True,
+                                             **{_PER_HOST_LIMIT: BmaConnector.CONNECTIONS_PER_HOST})
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[currency] = session
+        return session
+
+    async def close_sessions(self):
+        """
+        Close all pooled sessions and their connections
+        """
+        for currency, session in self._sessions.items():
+            if not session.closed:
+                self._logger.debug("Closing session of {0}".format(currency))
+                await session.close()
+        self._sessions.clear()
+
+    async def _request(self, currency, request, endpoint, req_args, proxy=None):
+        """
+        Send a request to an endpoint when its rate limit allows it,
+        and record its outcome in the endpoints health and circuit breakers
+        :param str currency: the currency requested
+        :param class request: A bma request class calling for data
+        :param duniterpy.documents.Endpoint endpoint: the endpoint to request
+        :param dict req_args: Arguments to pass to the request constructor
+        :param str proxy: the proxy to use
+        """
+        self.circuit_breakers.attempt(endpoint)
+        try:
+            await self._rate_limiter.acquire(endpoint)
+            start = time.monotonic()
+            result = await request(endpoint.conn_handler(self.session(currency), proxy=proxy), **req_args)
+        except errors.DuniterError as e:
+            self.circuit_breakers.success(endpoint)
+            if e.ucode == errors.HTTP_LIMITATION:
+                self._rate_limiter.limited(endpoint)
+                self._endpoints_health.record_limitation(currency, endpoint)
+            else:
+                self._rate_limiter.succeeded(endpoint)
+                self._endpoints_health.record_success(currency, endpoint, time.monotonic() - start)
+            raise
+        except asyncio.CancelledError:
+            self.circuit_breakers.release(endpoint)
+            raise
+        except Exception:
+            self.circuit_breakers.failure(endpoint)
+            self._endpoints_health.record_failure(currency, endpoint)
+            raise
+        self.circuit_breakers.success(endpoint)
+        self._rate_limiter.succeeded(endpoint)
+        self._endpoints_health.record_success(currency, endpoint, time.monotonic() - start)
+        return result
+
+    def _available_endpoints(self, request, nodes):
+        """
+        Get the endpoints of the nodes which can be requested, skipping the ones with an open circuit
+        :param class request: A bma request class
+        :param list[sakia.data.entities.Node] nodes: the nodes
+        :rtype: list[duniterpy.documents.Endpoint]
+        """
+        return [e for e in filter_endpoints(request, nodes) if self.circuit_breakers.available(e)]
+
+    def persist_endpoints_health(self):
+        """
+        Write the health of the endpoints learned from the requests to the database
+        """
+        self._endpoints_health.persist()
+
     async def verified_get(self, currency, request, req_args):
+        """
+        Request the same data to multiple nodes, and return it as soon as enough nodes agree.
+
+        The answers are handled as they arrive : a new node is requested only when a node
+        fails or disagrees, and the requests still pending are cancelled once the quorum is reached.
+        :param str currency: the currency requested
+        :param class request: A bma request class calling for data
+        :param dict req_args: Arguments to pass to the request constructor
+        """
         synced_nodes = self._nodes_processor.synced_members_nodes(currency)
         if not synced_nodes:
             # If no node is known as a member, lookup synced nodes as a fallback
             synced_nodes = self._nodes_processor.synced_nodes(currency)
-        nodes_generator = (n for n in synced_nodes)
+        # The nodes with the fastest and healthiest endpoints are requested first
+        nodes_generator = (n for n in self._endpoints_health.order(currency, synced_nodes,
+                                                                   lambda n: self._available_endpoints(request, [n])))
         answers = {}
         answers_data = {}
         nb_verification = min(max(1, 0.66 * len(synced_nodes)), 10)
         # We try to find agreeing nodes from one 1 to 66% of nodes, max 10
-        session = aiohttp.ClientSession()
-        filtered_data = {}
+        # More than nb_verification nodes have to agree
+        quorum = math.floor(nb_verification) + 1
+        requested_nodes = {}
+
+        def request_next_node():
+            for node in nodes_generator:
+                endpoints = self._available_endpoints(request, [node])
+                if endpoints:
+                    endpoint = self._endpoints_health.choose(currency, endpoints)
+                    self._logger.debug(
+                        "Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
+                    future = asyncio.ensure_future(self._request(currency, request, endpoint, req_args,
+                                                                 proxy=self._user_parameters.proxy()))
+                    requested_nodes[future] = node
+                    return future
+
+        pending = set()
         try:
-            while max([len(nodes) for nodes in answers.values()] + [0]) <= nb_verification:
-                futures = []
-
-                try:
-                    for i in range(0, int(nb_verification)+1):
-                        node = next(nodes_generator)
-                        endpoints = filter_endpoints(request, [node])
-                        endpoint = random.choice(endpoints)
-                        self._logger.debug(
-                            "Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
-                        futures.append(request(
-                            endpoint.conn_handler(session, proxy=self._user_parameters.proxy()),
-                            **req_args))
-                except StopIteration:
-                    # When no more node is available, we go out of the while loop
+            while True:
+                agreeing = max([len(nodes) for nodes in answers.values()] + [0])
+                if agreeing >= quorum:
+                    break
+                # Keep enough requests in flight to reach the quorum, plus one
+                # so that the slowest node is not waited for
+                while len(pending) < quorum - agreeing + 1:
+                    future = request_next_node()
+                    if not future:
+                        break
+                    pending.add(future)
+                if not pending:
                     break
-                finally:
-                    # Everytime we go out of the while loop, we gather the futures
-                    if futures:
-                        responses = await asyncio.gather(*futures, return_exceptions=True)
-                        for r in responses:
-                            if isinstance(r, errors.DuniterError):
-                                if r.ucode == errors.HTTP_LIMITATION:
-                                    self._logger.debug("Exception in responses : " + r.message)
-                                    continue
-                                else:
-                                    data_hash = hash(r.ucode)
-                            elif isinstance(r, BaseException):
-                                self._logger.debug("Exception in responses : " + str(r))
-                                continue
-                            else:
-                                filtered_data = _filter_data(request, r)
-                                data_hash = make_hash(filtered_data)
-                            answers_data[data_hash] = r
-                            if data_hash not in answers:
-                                answers[data_hash] = [node]
-                            else:
-                                answers[data_hash].append(node)
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    node = requested_nodes.pop(future)
+                    r = future.exception() or future.result()
+                    if isinstance(r, errors.DuniterError):
+                        if r.ucode == errors.HTTP_LIMITATION:
+                            self._logger.debug("Exception in responses : " + r.message)
+                            continue
+                        else:
+                            data_hash = hash(r.ucode)
+                    elif isinstance(r, BaseException):
+                        self._logger.debug("Exception in responses : " + str(r))
+                        continue
+                    else:
+                        data_hash = answer_digest(request, r)
+                    answers_data[data_hash] = r
+                    if data_hash not in answers:
+                        answers[data_hash] = [node]
+                    else:
+                        answers[data_hash].append(node)
         finally:
-            session.close()
+            for future in pending:
+                future.cancel()
 
         if len(answers_data) > 0:
             if request is bma.wot.lookup:
@@ -226,16 +452,15 @@ class BmaConnector:
         raise NoPeerAvailable("", len(synced_nodes))
 
     async def simple_get(self, currency, request, req_args):
-        endpoints = filter_endpoints(request, self._nodes_processor.synced_nodes(currency))
+        endpoints = self._available_endpoints(request, self._nodes_processor.synced_nodes(currency))
         tries = 0
         while tries < 3 and endpoints:
-            endpoint = random.choice(endpoints)
+            endpoint = self._endpoints_health.choose(currency, endpoints)
             endpoints.remove(endpoint)
             try:
                 self._logger.debug("Requesting {0} on endpoint {1}".format(str(request.__name__), str(endpoint)))
-                async with aiohttp.ClientSession() as session:
-                    json_data = await request(endpoint.conn_handler(session), **req_args)
-                    return json_data
+                json_data = await self._request(currency, request, endpoint, req_args)
+                return json_data
             except errors.DuniterError as e:
                 if e.ucode == errors.HTTP_LIMITATION:
                     self._logger.debug(str(e))
@@ -248,18 +473,149 @@ class BmaConnector:
                 tries += 1
         raise NoPeerAvailable("", len(endpoints))
 
+    def download_blocks(self, currency, start, end, previous_hash=None, end_hash=None, lookahead=None):
+        """
+        Download a range of blocks, by windows spread over the synced nodes.
+
+        The windows are requested to a single node, and checked against the hash chain. Every block is
+        rebuilt from its signed raw, and its hashes must be the hashes of its signed text. The previous hash
+        of every block must be the hash of the block before it, from the block before the range up
+        to the end of the range. As the windows are given back before the end of the range is downloaded,
+        the last block of every window must be the one verified against multiple nodes :
+        a node can not serve a forged chain, even consistent. A single block is verified per window.
+
+        :param str currency: the currency requested
+        :param int start: the number of the first block
+        :param int end: the number of the last block
+        :param str previous_hash: the known hash of the block before the first one, if any
+        :param str end_hash: the known hash of the last block, if any
+        :param asyncio.Semaphore lookahead: if given, a window is downloaded only once it acquired the semaphore.
+        The caller releases it when it is done with a window, to bound the windows downloaded in advance.
+        :return: the futures of the windows, in the order of the blocks. Each future
+        gives the json data of the blocks of its window once it is linked to the previous windows.
+        :rtype: list[asyncio.Future]
+        """
+        nodes = self._endpoints_health.order(currency, self._nodes_processor.synced_nodes(currency),
+                                             lambda n: self._available_endpoints(bma.blockchain.blocks, [n]))
+        endpoints = []
+        for node in nodes:
+            node_endpoints = self._available_endpoints(bma.blockchain.blocks, [node])
+            if node_endpoints:
+                endpoints.append(self._endpoints_health.choose(currency, node_endpoints))
+
+        semaphore = asyncio.Semaphore(BmaConnector.DOWNLOAD_CONCURRENCY)
+        windows = []
+        previous_window = None
+        for index, window_start in enumerate(range(start, end + 1, BmaConnector.BLOCKS_WINDOW)):
+            count = min(BmaConnector.BLOCKS_WINDOW, end + 1 - window_start)
+            # The windows are spread over the nodes
+            window_endpoints = endpoints[index % len(endpoints):] + endpoints[:index % len(endpoints)] \
+                if endpoints else []
+            window = asyncio.ensure_future(self._download_window(currency, window_start, count, window_endpoints,
+                                                                 semaphore, lookahead, previous_window, previous_hash,
+                                                                 end_hash if window_start + count > end else None))
+            windows.append(window)
+            previous_window = window
+        return windows
+
+    async def _download_window(self, currency, start, count, endpoints, semaphore, lookahead,
+                               previous_window, previous_hash, end_hash):
+        """
+        Download a window of blocks, trying the endpoints in order until one of them
+        gives blocks linked to the previous window and to the verified last block of the window
+        """
+        if lookahead:
+            await lookahead.acquire()
+        # The windows are handled as they arrive, before the end of the range is reached :
+        # the hash chain alone can not tell a consistent forged branch from the chain of the network,
+        # so the last block of every window is verified against multiple nodes
+        if not end_hash:
+            last_block = await self.get(currency, bma.blockchain.block, {'number': start + count - 1})
+            end_hash = last_block['hash']
+        for endpoint in endpoints:
+            try:
+                async with semaphore:
+                    self._logger.debug("Requesting blocks {0}-{1} on endpoint {2}".format(start, start + count - 1,
+                                                                                           str(endpoint)))
+                    blocks_data = await self._request(currency, bma.blockchain.blocks, endpoint,
+                                                      {'count': count, 'start': start},
+                                                      proxy=self._user_parameters.proxy())
+            except errors.DuniterError as e:
+                self._logger.debug(str(e))
+                continue
+            except (ClientError, ServerDisconnectedError, gaierror,
+                    asyncio.TimeoutError, ValueError, jsonschema.ValidationError) as e:
+                self._logger.debug(str(e))
+                continue
+
+            if previous_window:
+                previous_hash = (await previous_window)[-1]['hash']
+            if _check_blocks_chain(blocks_data, start, count, previous_hash, end_hash):
+                return blocks_data
+            self._logger.debug("Blocks {0}-{1} of {2} are not linked to the chain".format(start, start + count - 1,
+                                                                                         str(endpoint)))
+        raise NoPeerAvailable(currency, len(endpoints))
+
     async def get(self, currency, request, req_args={}, verify=True):
         """
         :param str currency: the currency requested
         :param class request: A bma request class calling for data
         :param dict req_args: Arguments to pass to the request constructor
         :param bool verify: Verify returned value against multiple nodes
-        :return: The returned data
+        :return: The returned data, shared between coalesced callers : it must not be modified
         """
-        if verify:
-            return await self.verified_get(currency, request, req_args)
+        # Without a number, the current block is requested : it is not cached
+        if request is bma.blockchain.block and self._blocks_repo and req_args.get('number') is not None:
+            return await self.get_block(currency, req_args['number'], verify)
+        return await self._coalesced_get(currency, request, req_args, verify)
+
+    async def _coalesced_get(self, currency, request, req_args, verify):
+        key = (currency, request, tuple(sorted(req_args.items())), verify)
+        future = self._in_flight.get(key)
+        if future:
+            self.coalesced_calls += 1
+            self._logger.debug("Coalescing {0} request".format(request.__name__))
         else:
-            return await self.simple_get(currency, request, req_args)
+            if verify:
+                future = asyncio.ensure_future(self.verified_get(currency, request, req_args))
+            else:
+                future = asyncio.ensure_future(self.simple_get(currency, request, req_args))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self._in_flight.pop(key, None))
+        # A cancelled caller must not cancel the request of the other callers
+        return await asyncio.shield(future)
+
+    async def get_block(self, currency, number, verify=True, cached=True):
+        """
+        Get a block from the blocks cache, or from the network if it is not cached yet
+        :param str currency: the currency requested
+        :param int number: the number of the block
+        :param bool verify: Verify returned value against multiple nodes if the block is not cached
+        :param bool cached: False to request the block to the network without reading nor writing the cache
+        :return: the block in json format
+        """
+        if cached:
+            cached_block = self._blocks_repo.get_one(currency=currency, number=number)
+            if cached_block:
+                self.blocks_cache_hits += 1
+                return cached_block.bma_data()
+            self.blocks_cache_misses += 1
+
+        block_data = await self._coalesced_get(currency, bma.blockchain.block, {'number': number}, verify)
+        # Only verified blocks below the consensus head can be considered immutable
+        if cached and block_data and verify and number < self._nodes_processor.current_buid(currency).number:
+            self._blocks_repo.insert(CachedBlock.from_bma(currency, block_data))
+        return block_data
+
+    def invalidate_blocks(self, currency, number):
+        """
+        Drop cached blocks and indexed headers after a rollback
+        :param str currency: the currency of the blocks
+        :param int number: the first invalid block number
+        """
+        if self._blocks_repo:
+            self._logger.debug("Invalidating cached blocks from {0}".format(number))
+            self._blocks_repo.drop_from(currency, number)
 
     async def broadcast(self, currency, request, req_args={}):
         """
@@ -275,21 +631,18 @@ class BmaConnector:
         .. note:: If one node accept the requests (returns 200),
         the broadcast should be considered accepted by the network.
         """
-        filtered_endpoints = filter_endpoints(request, self._nodes_processor.synced_nodes(currency))
-        endpoints = random.sample(filtered_endpoints, 6) if len(filtered_endpoints) > 6 else filtered_endpoints
+        filtered_endpoints = self._available_endpoints(request, self._nodes_processor.synced_nodes(currency))
+        endpoints = self._endpoints_health.sample(currency, filtered_endpoints, 6)
         replies = []
 
         if len(endpoints) > 0:
-            with aiohttp.ClientSession() as session:
-                for endpoint in endpoints:
-                    self._logger.debug("Trying to connect to : " + str(endpoint))
-                    reply = asyncio.ensure_future(request(endpoint.conn_handler(session,
-                                                                                proxy=self._user_parameters.proxy()),
-                                                          **req_args))
-                    replies.append(reply)
-
-                result = await asyncio.gather(*replies, return_exceptions=True)
-                return tuple(result)
-            return ()
+            for endpoint in endpoints:
+                self._logger.debug("Trying to connect to : " + str(endpoint))
+                reply = asyncio.ensure_future(self._request(currency, request, endpoint, req_args,
+                                                            proxy=self._user_parameters.proxy()))
+                replies.append(reply)
+
+            result = await asyncio.gather(*replies, return_exceptions=True)
+            return tuple(result)
         else:
             raise NoPeerAvailable("", len(endpoints))
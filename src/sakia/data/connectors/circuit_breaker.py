@@ -0,0 +1,129 @@
+import logging
+import time
+import attr
+
+
+@attr.s()
+class CircuitBreaker:
+    """
+    The circuit breaker of an endpoint, with three states :
+    - CLOSED : the endpoint is requested normally
+    - OPEN : the endpoint failed too many times in a row, it is not requested until the cool-down is over
+    - HALF_OPEN : the cool-down is over and a single trial request is running.
+    If it succeeds the circuit is closed, else it is opened for a new cool-down.
+    """
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    # Consecutive failures opening the circuit
+    FAILURES_THRESHOLD = 3
+    # Delay in seconds before a trial request is sent to an endpoint with an open circuit
+    COOLDOWN = 60
+
+    state = attr.ib(default=CLOSED)
+    failures = attr.ib(default=0)
+    opened_at = attr.ib(default=0)
+
+    def available(self):
+        """
+        :return: True if a request can be sent to the endpoint
+        :rtype: bool
+        """
+        if self.state == CircuitBreaker.OPEN:
+            return time.monotonic() - self.opened_at >= CircuitBreaker.COOLDOWN
+        return self.state == CircuitBreaker.CLOSED
+
+    def attempt(self):
+        """
+        A request is sent to the endpoint
+        """
+        if self.state == CircuitBreaker.OPEN and self.available():
+            self.state = CircuitBreaker.HALF_OPEN
+
+    def release(self):
+        """
+        A request to the endpoint was cancelled before its outcome was known
+        """
+        if self.state == CircuitBreaker.HALF_OPEN:
+            self.state = CircuitBreaker.OPEN
+
+    def success(self):
+        """
+        The endpoint answered a request
+        """
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+
+    def failure(self):
+        """
+        A request to the endpoint failed
+        :return: True if the circuit has just been opened
+        :rtype: bool
+        """
+        self.failures += 1
+        if self.state == CircuitBreaker.HALF_OPEN \
+                or (self.state == CircuitBreaker.CLOSED and self.failures >= CircuitBreaker.FAILURES_THRESHOLD):
+            self.state = CircuitBreaker.OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+@attr.s()
+class CircuitBreakers:
+    """
+    The circuit breakers of the endpoints, shared by all the connectors
+    """
+    _breakers = attr.ib(default=attr.Factory(dict))
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+
+    def breaker(self, endpoint):
+        """
+        Get the circuit breaker of an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :rtype: CircuitBreaker
+        """
+        key = str(endpoint)
+        breaker = self._breakers.get(key)
+        if not breaker:
+            breaker = CircuitBreaker()
+            self._breakers[key] = breaker
+        return breaker
+
+    def available(self, endpoint):
+        """
+        Check if a request can be sent to an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :rtype: bool
+        """
+        return self.breaker(endpoint).available()
+
+    def attempt(self, endpoint):
+        """
+        Record a request sent to an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        self.breaker(endpoint).attempt()
+
+    def release(self, endpoint):
+        """
+        Record a request to an endpoint cancelled before its outcome was known
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        self.breaker(endpoint).release()
+
+    def success(self, endpoint):
+        """
+        Record an answer of an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        self.breaker(endpoint).success()
+
+    def failure(self, endpoint):
+        """
+        Record a failed request to an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        if self.breaker(endpoint).failure():
+            self._logger.debug("Circuit opened for {0} during {1}s".format(endpoint, CircuitBreaker.COOLDOWN))
@@ -0,0 +1,170 @@
+import attr
+import logging
+import random
+import time
+from ..entities import EndpointHealth
+
+
+@attr.s
+class EndpointsHealthTracker:
+    """
+    Tracks the health of the nodes endpoints from the outcome of every request,
+    and selects the endpoints to request accordingly.
+
+    The health is kept in memory and written to the repository at most
+    every PERSIST_INTERVAL seconds.
+
+    :param sakia.data.repositories.EndpointsHealthRepo _repo: the repository of the endpoints health
+    """
+    # Weight of the last outcome in the moving averages
+    ALPHA = 0.2
+    # Latency in seconds assumed for an endpoint never requested
+    DEFAULT_LATENCY = 1.
+    # Latency in seconds added to the score of an endpoint always failing
+    ERROR_PENALTY = 10.
+    # Latency in seconds added to the score for each HTTP_LIMITATION received
+    LIMITATION_PENALTY = 2.
+    # Probability to pick an endpoint uniformly, so that recovering nodes are still probed
+    EXPLORATION = 0.1
+    # Minimum interval in seconds between two writes to the repository
+    PERSIST_INTERVAL = 60
+
+    _repo = attr.ib()  # :type sakia.data.repositories.EndpointsHealthRepo
+    _healths = attr.ib(default=attr.Factory(dict))
+    _loaded_currencies = attr.ib(default=attr.Factory(set))
+    _dirty = attr.ib(default=attr.Factory(set))
+    _last_persist = attr.ib(default=attr.Factory(time.monotonic))
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+
+    @classmethod
+    def instanciate(cls, app):
+        """
+        Instanciate an endpoints health tracker
+        :param sakia.app.Application app: the app
+        """
+        return cls(app.db.endpoints_health_repo)
+
+    def _load(self, currency):
+        if currency not in self._loaded_currencies:
+            self._loaded_currencies.add(currency)
+            if self._repo:
+                for health in self._repo.get_all(currency):
+                    self._healths[(health.currency, health.endpoint)] = health
+
+    def health(self, currency, endpoint):
+        """
+        Get the health of an endpoint
+        :param str currency: the currency of the node
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :rtype: sakia.data.entities.EndpointHealth
+        """
+        self._load(currency)
+        key = (currency, str(endpoint))
+        health = self._healths.get(key)
+        if not health:
+            health = EndpointHealth(currency, str(endpoint), EndpointsHealthTracker.DEFAULT_LATENCY)
+            self._healths[key] = health
+        return health
+
+    def score(self, currency, endpoint):
+        """
+        The expected cost of a request to the endpoint, in seconds. Lower is better.
+        :param str currency: the currency of the node
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :rtype: float
+        """
+        health = self.health(currency, endpoint)
+        return health.latency \
+               + health.error_rate * EndpointsHealthTracker.ERROR_PENALTY \
+               + health.limitations * EndpointsHealthTracker.LIMITATION_PENALTY
+
+    def _update(self, currency, endpoint, error, latency=None):
+        health = self.health(currency, endpoint)
+        alpha = EndpointsHealthTracker.ALPHA
+        if latency is not None:
+            health.latency = (1 - alpha) * health.latency + alpha * latency
+        health.error_rate = (1 - alpha) * health.error_rate + alpha * (1. if error else 0.)
+        health.requests += 1
+        self._dirty.add((health.currency, health.endpoint))
+        if time.monotonic() - self._last_persist > EndpointsHealthTracker.PERSIST_INTERVAL:
+            self.persist()
+        return health
+
+    def record_success(self, currency, endpoint, latency):
+        """
+        Record an answer of the endpoint
+        :param str currency: the currency of the node
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :param float latency: the response time in seconds
+        """
+        health = self._update(currency, endpoint, False, latency)
+        health.limitations = 0
+
+    def record_failure(self, currency, endpoint):
+        """
+        Record a request to the endpoint which failed (connection error, timeout, invalid answer...)
+        :param str currency: the currency of the node
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        self._update(currency, endpoint, True)
+
+    def record_limitation(self, currency, endpoint):
+        """
+        Record an HTTP_LIMITATION answer of the endpoint
+        :param str currency: the currency of the node
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        health = self._update(currency, endpoint, False)
+        health.limitations += 1
+
+    def _weight(self, currency, endpoint):
+        return 1 / max(self.score(currency, endpoint), 0.001)
+
+    def choose(self, currency, endpoints):
+        """
+        Choose an endpoint, weighted toward fast and healthy ones
+        :param str currency: the currency of the nodes
+        :param list[duniterpy.documents.Endpoint] endpoints: the endpoints to choose from
+        :rtype: duniterpy.documents.Endpoint
+        """
+        return self.order(currency, endpoints)[0]
+
+    def sample(self, currency, endpoints, k):
+        """
+        Choose k distinct endpoints, weighted toward fast and healthy ones
+        :param str currency: the currency of the nodes
+        :param list[duniterpy.documents.Endpoint] endpoints: the endpoints to choose from
+        :param int k: the number of endpoints to choose
+        :rtype: list[duniterpy.documents.Endpoint]
+        """
+        return self.order(currency, endpoints)[:k]
+
+    def order(self, currency, items, endpoints_of=None):
+        """
+        Shuffle items so that the ones with the fastest and healthiest endpoints come first.
+        Each item gets a weighted random key, so that slower items are still requested
+        from time to time.
+        :param str currency: the currency of the nodes
+        :param list items: the endpoints, or the items to order
+        :param endpoints_of: a function returning the endpoints of an item, if the items are not endpoints
+        :rtype: list
+        """
+        def key(item):
+            if random.random() < EndpointsHealthTracker.EXPLORATION:
+                weight = 1 / EndpointsHealthTracker.DEFAULT_LATENCY
+            elif endpoints_of:
+                weight = max([self._weight(currency, e) for e in endpoints_of(item)] + [0.001])
+            else:
+                weight = self._weight(currency, item)
+            return random.random() ** (1 / weight)
+        return sorted(items, key=key, reverse=True)
+
+    def persist(self):
+        """
+        Write the updated health of the endpoints to the repository
+        """
+        self._last_persist = time.monotonic()
+        if self._repo and self._dirty:
+            self._logger.debug("Saving health of {0} endpoints".format(len(self._dirty)))
+            self._repo.upsert_many([self._healths[k] for k in self._dirty])
+        self._dirty.clear()
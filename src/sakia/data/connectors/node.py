@@ -15,6 +15,8 @@ from duniterpy.documents.peer import Peer, ConnectionHandler
 from sakia.decorators import asyncify
 from sakia.errors import InvalidNodeCurrency
 from ..entities.node import Node
+from .circuit_breaker import CircuitBreakers
+from .peers_leaves import PeersLeaves
 
 
 class NodeConnector(QObject):
@@ -26,9 +28,22 @@ class NodeConnector(QObject):
     identity_changed = pyqtSignal()
     neighbour_found = pyqtSignal(Peer)
 
-    def __init__(self, node, user_parameters, session=None):
+    # Leaves of the merkle tree of peers requested at the same time
+    LEAVES_CONCURRENCY = 10
+
+    def __init__(self, node, user_parameters, session=None, circuit_breakers=None, blocks_fan_in=None,
+                 peers_leaves=None):
         """
         Constructor
+        :param sakia.data.entities.Node node: the node
+        :param sakia.data.entities.UserParameters user_parameters: the user parameters
+        :param aiohttp.ClientSession session: the http session
+        :param sakia.data.connectors.circuit_breaker.CircuitBreakers circuit_breakers: the circuit breakers
+        shared with the other connectors
+        :param sakia.data.connectors.blocks_fan_in.BlocksFanIn blocks_fan_in: the fan-in of the blocks
+        notified by the nodes of the network. If None, the node handles its blocks alone.
+        :param sakia.data.connectors.peers_leaves.PeersLeaves peers_leaves: the merkle leaves of peers
+        already fetched, shared with the other connectors
         """
         super().__init__()
         self.node = node
@@ -38,6 +53,9 @@ class NodeConnector(QObject):
                     'peer': False}
         self._user_parameters = user_parameters
         self.session = session
+        self._circuit_breakers = circuit_breakers if circuit_breakers else CircuitBreakers()
+        self._blocks_fan_in = blocks_fan_in
+        self._peers_leaves = peers_leaves if peers_leaves else PeersLeaves()
         self._refresh_counter = 1
         self._logger = logging.getLogger('sakia')
 
@@ -76,12 +94,16 @@ class NodeConnector(QObject):
         return cls(node, user_parameters, session=session)
 
     @classmethod
-    def from_peer(cls, currency, peer, user_parameters):
+    def from_peer(cls, currency, peer, user_parameters, circuit_breakers=None, blocks_fan_in=None,
+                  peers_leaves=None):
         """
         Factory method to get a node from a peer document.
         :param str currency: The node currency. None if we don't know\
          the currency it should have, for example if its the first one we add
         :param peer: The peer document
+        :param sakia.data.connectors.circuit_breaker.CircuitBreakers circuit_breakers: the circuit breakers
+        :param sakia.data.connectors.blocks_fan_in.BlocksFanIn blocks_fan_in: the fan-in of the blocks
+        :param sakia.data.connectors.peers_leaves.PeersLeaves peers_leaves: the merkle leaves of peers already fetched
         :return: A new node
         :rtype: sakia.core.net.Node
         """
@@ -91,19 +113,33 @@ class NodeConnector(QObject):
         node = Node(peer.currency, peer.pubkey, peer.endpoints, peer.blockUID)
         logging.getLogger('sakia').debug("Node from peer : {:}".format(str(node)))
 
-        return cls(node, user_parameters, session=None)
+        return cls(node, user_parameters, session=None, circuit_breakers=circuit_breakers,
+                   blocks_fan_in=blocks_fan_in, peers_leaves=peers_leaves)
 
     async def safe_request(self, endpoint, request, proxy, req_args={}):
+        if not self._circuit_breakers.available(endpoint):
+            self._logger.debug("Circuit open for {0} : {1}".format(str(endpoint), self.node.pubkey[:5]))
+            return
+        self._circuit_breakers.attempt(endpoint)
         try:
             conn_handler = endpoint.conn_handler(self.session, proxy=proxy)
             data = await request(conn_handler, **req_args)
+            self._circuit_breakers.success(endpoint)
             return data
+        except errors.DuniterError:
+            self._circuit_breakers.success(endpoint)
+            raise
+        except asyncio.CancelledError:
+            self._circuit_breakers.release(endpoint)
+            raise
         except (ClientError, gaierror, TimeoutError, ConnectionRefusedError, DisconnectedError, ValueError) as e:
             self._logger.debug("{0} : {1}".format(str(e), self.node.pubkey[:5]))
+            self._circuit_breakers.failure(endpoint)
             self.node.state = Node.OFFLINE
         except jsonschema.ValidationError as e:
             self._logger.debug(str(e))
             self._logger.debug("Validation error : {0}".format(self.node.pubkey[:5]))
+            self._circuit_breakers.failure(endpoint)
             self.node.state = Node.CORRUPTED
 
     async def init_session(self):
@@ -131,7 +167,11 @@ class NodeConnector(QObject):
         """
         Refresh all data of this node
         :param bool manual: True if the refresh was manually initiated
+        :return: the requests started by the refresh. The websockets run as long as they are connected,
+        their tasks are not returned.
+        :rtype: List[asyncio.Task]
         """
+        tasks = []
         if not self._ws_tasks['block']:
             self._ws_tasks['block'] = asyncio.ensure_future(self.connect_current_block())
 
@@ -139,13 +179,21 @@ class NodeConnector(QObject):
             self._ws_tasks['peer'] = asyncio.ensure_future(self.connect_peers())
 
         if manual:
-            asyncio.ensure_future(self.request_peers())
+            tasks.append(asyncio.ensure_future(self.request_peers()))
 
         if self._refresh_counter % 20 == 0 or manual:
-            self.refresh_summary()
+            tasks.append(asyncio.ensure_future(self.refresh_summary()))
             self._refresh_counter = self._refresh_counter if manual else 1
         else:
             self._refresh_counter += 1
+        return tasks
+
+    def block_ws_connected(self):
+        """
+        :return: True if the websocket of the blocks of the node is connected
+        :rtype: bool
+        """
+        return self._connected['block']
 
     async def connect_current_block(self):
         """
@@ -153,19 +201,20 @@ class NodeConnector(QObject):
         If the connection fails, it tries the fallback mode on HTTP GET
         """
         for endpoint in [e for e in self.node.endpoints if isinstance(e, BMAEndpoint)]:
-            if not self._connected['block']:
+            if not self._connected['block'] and self._circuit_breakers.available(endpoint):
                 try:
                     conn_handler = endpoint.conn_handler(self.session, proxy=self._user_parameters.proxy())
                     ws_connection = bma.ws.block(conn_handler)
                     async with ws_connection as ws:
                         self._connected['block'] = True
+                        self._circuit_breakers.success(endpoint)
                         self._logger.debug("Connected successfully to block ws : {0}"
                                       .format(self.node.pubkey[:5]))
                         async for msg in ws:
                             if msg.tp == aiohttp.MsgType.text:
                                 self._logger.debug("Received a block : {0}".format(self.node.pubkey[:5]))
                                 block_data = bma.parse_text(msg.data, bma.ws.WS_BLOCk_SCHEMA)
-                                await self.refresh_block(block_data)
+                                await self.handle_block(block_data)
                             elif msg.tp == aiohttp.MsgType.closed:
                                 break
                             elif msg.tp == aiohttp.MsgType.error:
@@ -177,6 +226,7 @@ class NodeConnector(QObject):
                     await self.request_current_block()
                 except (ClientError, gaierror, TimeoutError, DisconnectedError) as e:
                     self._logger.debug("{0} : {1}".format(str(e), self.node.pubkey[:5]))
+                    self._circuit_breakers.failure(endpoint)
                     self.node.state = Node.OFFLINE
                     self.changed.emit()
                 except jsonschema.ValidationError as e:
@@ -199,7 +249,7 @@ class NodeConnector(QObject):
                                                      proxy=self._user_parameters.proxy())
                 if not block_data:
                     continue
-                await self.refresh_block(block_data)
+                await self.handle_block(block_data)
                 return  # Do not try any more endpoint
             except errors.DuniterError as e:
                 if e.ucode == errors.BLOCK_NOT_FOUND:
@@ -214,6 +264,30 @@ class NodeConnector(QObject):
             self.node.state = Node.OFFLINE
             self.changed.emit()
 
+    async def handle_block(self, block_data):
+        """
+        Handle a block notified by the node : it is sent to the blocks fan-in of the network if any
+        :param dict block_data: The block data in json format
+        """
+        if self._blocks_fan_in:
+            self._blocks_fan_in.receive(self, block_data)
+        else:
+            await self.refresh_block(block_data)
+
+    async def request_block(self, number):
+        """
+        Request a block on the BMA endpoints of the node
+        :param int number: the number of the block
+        :return: the block data in json format, None if no endpoint answered
+        :rtype: dict
+        """
+        for endpoint in [e for e in self.node.endpoints if isinstance(e, BMAEndpoint)]:
+            block_data = await self.safe_request(endpoint, bma.blockchain.block,
+                                                 proxy=self._user_parameters.proxy(),
+                                                 req_args={'number': number})
+            if block_data:
+                return block_data
+
     async def refresh_block(self, block_data):
         """
         Refresh the blocks of this node
@@ -283,13 +357,14 @@ class NodeConnector(QObject):
         If the connection fails, it tries the fallback mode on HTTP GET
         """
         for endpoint in [e for e in self.node.endpoints if isinstance(e, BMAEndpoint)]:
-            if not self._connected['peer']:
+            if not self._connected['peer'] and self._circuit_breakers.available(endpoint):
                 try:
                     conn_handler = endpoint.conn_handler(self.session,
                                                          proxy=self._user_parameters.proxy())
                     ws_connection = bma.ws.peer(conn_handler)
                     async with ws_connection as ws:
                         self._connected['peer'] = True
+                        self._circuit_breakers.success(endpoint)
                         self._logger.debug("Connected successfully to peer ws : {0}".format(self.node.pubkey[:5]))
                         async for msg in ws:
                             if msg.tp == aiohttp.MsgType.text:
@@ -307,6 +382,7 @@ class NodeConnector(QObject):
                     await self.request_peers()
                 except (ClientError, gaierror, TimeoutError, DisconnectedError) as e:
                     self._logger.debug("{0} : {1}".format(str(e), self.node.pubkey[:5]))
+                    self._circuit_breakers.failure(endpoint)
                     self.node.state = Node.OFFLINE
                     self.changed.emit()
                 except jsonschema.ValidationError as e:
@@ -335,25 +411,14 @@ class NodeConnector(QObject):
                     continue
                 self.node.state = Node.ONLINE
                 if peers_data['root'] != self.node.merkle_peers_root:
-                    leaves = [leaf for leaf in peers_data['leaves']
-                              if leaf not in self.node.merkle_peers_leaves]
-                    for leaf_hash in leaves:
-                        try:
-                            leaf_data = await self.safe_request(endpoint,
-                                                                bma.network.peers,
-                                                                proxy=self._user_parameters.proxy(),
-                                                                req_args={'leaf': leaf_hash})
-                            if not leaf_data:
-                                break
-                            self.refresh_peer_data(leaf_data['leaf']['value'])
-                        except (AttributeError, ValueError, errors.DuniterError) as e:
-                            self._logger.debug("{pubkey} : Incorrect peer data in {leaf}"
-                                          .format(pubkey=self.node.pubkey[:5],
-                                                  leaf=leaf_hash))
-                            self.node.state = Node.OFFLINE
-                        finally:
-                            self.changed.emit()
-                    else:
+                    leaves = set(peers_data['leaves']) - set(self.node.merkle_peers_leaves)
+                    missing = [leaf for leaf in leaves if not self._peers_leaves.get(self.node.currency, leaf)]
+                    semaphore = asyncio.Semaphore(NodeConnector.LEAVES_CONCURRENCY)
+                    fetched = await asyncio.gather(*[self.request_leaf(endpoint, leaf_hash, semaphore)
+                                                     for leaf_hash in missing])
+                    if missing:
+                        self.changed.emit()
+                    if all(fetched):
                         self.node.merkle_peers_root = peers_data['root']
                         self.node.merkle_peers_leaves = tuple(peers_data['leaves'])
                 return  # Break endpoints loop
@@ -366,13 +431,47 @@ class NodeConnector(QObject):
             self.node.state = Node.OFFLINE
             self.changed.emit()
 
+    async def request_leaf(self, endpoint, leaf_hash, semaphore):
+        """
+        Request the peer document of a merkle leaf of the node
+        :param duniterpy.documents.BMAEndpoint endpoint: the endpoint of the node
+        :param str leaf_hash: the hash of the leaf
+        :param asyncio.Semaphore semaphore: the semaphore bounding the concurrent requests of leaves
+        :return: False if the node did not answer
+        :rtype: bool
+        """
+        async with semaphore:
+            try:
+                leaf_data = await self.safe_request(endpoint,
+                                                    bma.network.peers,
+                                                    proxy=self._user_parameters.proxy(),
+                                                    req_args={'leaf': leaf_hash})
+                if not leaf_data:
+                    return False
+                peer_doc = self.refresh_peer_data(leaf_data['leaf']['value'])
+                if peer_doc:
+                    self._peers_leaves.add(self.node.currency, leaf_hash, peer_doc)
+            except (AttributeError, ValueError, errors.DuniterError) as e:
+                self._logger.debug("{pubkey} : Incorrect peer data in {leaf}"
+                                   .format(pubkey=self.node.pubkey[:5],
+                                           leaf=leaf_hash))
+                self.node.state = Node.OFFLINE
+            return True
+
     def refresh_peer_data(self, peer_data):
+        """
+        Handle a peer document sent by the node
+        :param dict peer_data: the peer document in json format
+        :return: the peer document, None if it is malformed
+        :rtype: duniterpy.documents.Peer
+        """
         if "raw" in peer_data:
             try:
                 str_doc = "{0}{1}\n".format(peer_data['raw'],
                                             peer_data['signature'])
                 peer_doc = Peer.from_signed_raw(str_doc)
                 self.neighbour_found.emit(peer_doc)
+                return peer_doc
             except MalformedDocumentError as e:
                 self._logger.debug(str(e))
         else:
@@ -0,0 +1,39 @@
+from collections import OrderedDict
+import attr
+
+
+@attr.s()
+class PeersLeaves:
+    """
+    The peers documents of the merkle leaves already fetched by the connectors of the nodes,
+    so that a leaf present in the trees of several nodes is fetched once
+    """
+    # Leaves kept per currency
+    MAX_LEAVES = 10000
+
+    _leaves = attr.ib(default=attr.Factory(dict))
+
+    def get(self, currency, leaf_hash):
+        """
+        Get the peer document of a leaf
+        :param str currency: the currency of the peer
+        :param str leaf_hash: the hash of the merkle leaf
+        :return: the peer document, None if the leaf was never fetched
+        :rtype: duniterpy.documents.Peer
+        """
+        leaves = self._leaves.get(currency)
+        if leaves and leaf_hash in leaves:
+            leaves.move_to_end(leaf_hash)
+            return leaves[leaf_hash]
+
+    def add(self, currency, leaf_hash, peer):
+        """
+        Add the peer document of a fetched leaf
+        :param str currency: the currency of the peer
+        :param str leaf_hash: the hash of the merkle leaf
+        :param duniterpy.documents.Peer peer: the peer document
+        """
+        leaves = self._leaves.setdefault(currency, OrderedDict())
+        leaves[leaf_hash] = peer
+        if len(leaves) > PeersLeaves.MAX_LEAVES:
+            leaves.popitem(last=False)
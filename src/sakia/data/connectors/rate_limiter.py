@@ -0,0 +1,131 @@
+import asyncio
+import logging
+import time
+import attr
+
+
+@attr.s()
+class TokenBucket:
+    """
+    A token bucket limiting the rate of the requests sent to a node.
+
+    The rate is learned from the answers of the node : it slowly increases
+    while the requests succeed, and is halved when the node answers
+    HTTP_LIMITATION. After a limitation, no request is sent to the node until
+    a backoff delay doubling at each consecutive limitation is over.
+    """
+    # Requests per second allowed to a node never requested
+    INITIAL_RATE = 10.
+    MIN_RATE = 0.5
+    MAX_RATE = 50.
+    # Requests per second added to the rate after each successful request
+    RATE_INCREASE = 0.1
+    # Requests which can be sent in a burst
+    CAPACITY = 10.
+    # Delay in seconds without any request after a first limitation
+    BACKOFF = 1.
+    MAX_BACKOFF = 60.
+
+    rate = attr.ib(default=INITIAL_RATE)
+    tokens = attr.ib(default=CAPACITY)
+    limitations = attr.ib(default=0)
+    _last_refill = attr.ib(default=attr.Factory(time.monotonic))
+    _blocked_until = attr.ib(default=0)
+    _queue = attr.ib(default=attr.Factory(asyncio.Lock))
+
+    def _refill(self, now):
+        self.tokens = min(TokenBucket.CAPACITY, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def delay(self):
+        """
+        The delay before a request can be sent
+        :return: the delay in seconds, 0 if a token is available
+        :rtype: float
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        elif self.tokens < 1:
+            return (1 - self.tokens) / self.rate
+        return 0
+
+    async def acquire(self):
+        """
+        Wait until a request can be sent to the node. The requests are queued in order.
+        """
+        async with self._queue:
+            delay = self.delay()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self.delay()
+            self.tokens -= 1
+
+    def succeeded(self):
+        """
+        The node answered a request
+        """
+        self.limitations = 0
+        self.rate = min(TokenBucket.MAX_RATE, self.rate + TokenBucket.RATE_INCREASE)
+
+    def limited(self):
+        """
+        The node answered HTTP_LIMITATION
+        :return: the backoff delay in seconds
+        :rtype: float
+        """
+        now = time.monotonic()
+        backoff = min(TokenBucket.MAX_BACKOFF, TokenBucket.BACKOFF * 2 ** self.limitations)
+        self.limitations += 1
+        self.rate = max(TokenBucket.MIN_RATE, self.rate / 2)
+        self.tokens = 0
+        self._last_refill = now
+        self._blocked_until = max(self._blocked_until, now + backoff)
+        return backoff
+
+
+@attr.s()
+class RateLimiter:
+    """
+    The token buckets of the nodes endpoints
+    """
+    _buckets = attr.ib(default=attr.Factory(dict))
+    _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
+
+    def bucket(self, endpoint):
+        """
+        Get the token bucket of an endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        :rtype: TokenBucket
+        """
+        key = str(endpoint)
+        bucket = self._buckets.get(key)
+        if not bucket:
+            bucket = TokenBucket()
+            self._buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, endpoint):
+        """
+        Wait until a request can be sent to the endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        await self.bucket(endpoint).acquire()
+
+    def succeeded(self, endpoint):
+        """
+        Record a successful request to the endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        self.bucket(endpoint).succeeded()
+
+    def limited(self, endpoint):
+        """
+        Record an HTTP_LIMITATION answer of the endpoint
+        :param duniterpy.documents.Endpoint endpoint: the endpoint
+        """
+        bucket = self.bucket(endpoint)
+        backoff = bucket.limited()
+        self._logger.debug("Rate limited by {0} : backing off {1:.0f}s, "
+                           "then {2:.1f} req/s".format(endpoint, backoff, bucket.rate))
@@ -7,4 +7,6 @@ from .connection import Connection
 from .user_parameters import UserParameters
 from .app_data import AppData
 from .source import Source
-from .dividend import Dividend
\ No newline at end of file
+from .dividend import Dividend
+from .block import CachedBlock, BlockHeader, BlocksLists
+from .endpoint_health import EndpointHealth
@@ -0,0 +1,131 @@
+import attr
+
+
+def _optional_int(value):
+    if value is None:
+        return None
+    return int(value)
+
+
+@attr.s()
+class CachedBlock:
+    """
+    A block fetched from the network and kept in the local cache
+
+    :param str currency: the currency of the block
+    :param int number: the number of the block
+    :param str sha_hash: the hash of the block
+    :param str previous_hash: the hash of the previous block
+    :param int median_time: the median time of the block
+    :param int members_count: the number of members
+    :param int monetary_mass: the monetary mass
+    :param int dividend: the universal dividend created in this block, None if no UD
+    :param int unit_base: the unit base of the block
+    :param str raw: the raw document
+    :param str signature: the signature of the block
+    """
+    currency = attr.ib(convert=str)
+    number = attr.ib(convert=int)
+    sha_hash = attr.ib(convert=str, cmp=False, hash=False)
+    previous_hash = attr.ib(convert=str, cmp=False, hash=False)
+    median_time = attr.ib(convert=int, cmp=False, hash=False)
+    members_count = attr.ib(convert=int, cmp=False, hash=False)
+    monetary_mass = attr.ib(convert=int, cmp=False, hash=False)
+    dividend = attr.ib(convert=_optional_int, cmp=False, hash=False)
+    unit_base = attr.ib(convert=int, cmp=False, hash=False)
+    raw = attr.ib(convert=str, cmp=False, hash=False)
+    signature = attr.ib(convert=str, cmp=False, hash=False)
+
+    @classmethod
+    def from_bma(cls, currency, block_data):
+        """
+        Build a cached block from a /blockchain/block answer
+        :param str currency: the currency of the block
+        :param dict block_data: the block in json format
+        :rtype: CachedBlock
+        """
+        return cls(currency=currency,
+                   number=block_data['number'],
+                   sha_hash=block_data['hash'],
+                   previous_hash=block_data['previousHash'] or "",
+                   median_time=block_data['medianTime'],
+                   members_count=block_data['membersCount'],
+                   monetary_mass=block_data['monetaryMass'],
+                   dividend=block_data['dividend'],
+                   unit_base=block_data['unitbase'],
+                   raw=block_data['raw'],
+                   signature=block_data['signature'])
+
+    def bma_data(self):
+        """
+        Get the block in the format of a /blockchain/block answer
+        :rtype: dict
+        """
+        return {'currency': self.currency,
+                'number': self.number,
+                'hash': self.sha_hash,
+                'previousHash': self.previous_hash if self.previous_hash else None,
+                'medianTime': self.median_time,
+                'membersCount': self.members_count,
+                'monetaryMass': self.monetary_mass,
+                'dividend': self.dividend,
+                'unitbase': self.unit_base,
+                'raw': self.raw,
+                'signature': self.signature}
+
+
+@attr.s()
+class BlockHeader:
+    """
+    The header fields of a block needed to compute timestamps, dividends and monetary mass
+
+    :param str currency: the currency of the block
+    :param int number: the number of the block
+    :param str sha_hash: the hash of the block
+    :param int median_time: the median time of the block
+    :param int dividend: the universal dividend created in this block, None if no UD
+    :param int unit_base: the unit base of the block
+    :param int members_count: the number of members
+    :param int monetary_mass: the monetary mass
+    """
+    currency = attr.ib(convert=str)
+    number = attr.ib(convert=int)
+    sha_hash = attr.ib(convert=str, cmp=False, hash=False)
+    median_time = attr.ib(convert=int, cmp=False, hash=False)
+    dividend = attr.ib(convert=_optional_int, cmp=False, hash=False)
+    unit_base = attr.ib(convert=int, cmp=False, hash=False)
+    members_count = attr.ib(convert=int, cmp=False, hash=False)
+    monetary_mass = attr.ib(convert=int, cmp=False, hash=False)
+
+    @classmethod
+    def from_bma(cls, currency, block_data):
+        """
+        Build a block header from a block in json format
+        :param str currency: the currency of the block
+        :param dict block_data: the block in json format
+        :rtype: BlockHeader
+        """
+        return cls(currency=currency,
+                   number=block_data['number'],
+                   sha_hash=block_data['hash'],
+                   median_time=block_data['medianTime'],
+                   dividend=block_data['dividend'],
+                   unit_base=block_data['unitbase'],
+                   members_count=block_data['membersCount'],
+                   monetary_mass=block_data['monetaryMass'])
+
+
+@attr.s()
+class BlocksLists:
+    """
+    The numbers of the blocks with identities and with money data of a currency,
+    known up to the height of the lists
+    """
+    # Fields of the blocks in json format listed by the joiners, leavers, actives, excluded and newcomers requests
+    IDENTITIES_FIELDS = ('joiners', 'leavers', 'actives', 'excluded', 'identities')
+    # Fields of the blocks in json format listed by the ud and tx requests
+    MONEY_FIELDS = ('dividend', 'transactions')
+
+    with_identities = attr.ib(default=attr.Factory(set))
+    with_money = attr.ib(default=attr.Factory(set))
+    height = attr.ib(default=-1)
@@ -0,0 +1,21 @@
+import attr
+
+
+@attr.s()
+class EndpointHealth:
+    """
+    The health of a node endpoint, learned from the outcome of the requests sent to it
+
+    :param str currency: the currency of the node
+    :param str endpoint: the endpoint in its inline format
+    :param float latency: the moving average of the response time, in seconds
+    :param float error_rate: the moving average of failed requests, between 0 and 1
+    :param int limitations: the number of HTTP_LIMITATION answers since the last successful request
+    :param int requests: the number of requests sent to the endpoint
+    """
+    currency = attr.ib(convert=str)
+    endpoint = attr.ib(convert=str)
+    latency = attr.ib(convert=float, cmp=False, hash=False)
+    error_rate = attr.ib(convert=float, default=0, cmp=False, hash=False)
+    limitations = attr.ib(convert=int, default=0, cmp=False, hash=False)
+    requests = attr.ib(convert=int, default=0, cmp=False, hash=False)
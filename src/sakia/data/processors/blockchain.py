@@ -1,8 +1,7 @@
 import attr
-import sqlite3
 import logging
 from sakia.errors import NoPeerAvailable
-from ..entities import Blockchain, BlockchainParameters
+from ..entities import Blockchain, BlockchainParameters, BlockHeader, BlocksLists
 from .nodes import NodesProcessor
 from ..connectors import BmaConnector
 from duniterpy.api import bma, errors
@@ -12,8 +11,14 @@ import asyncio
 
 @attr.s
 class BlockchainProcessor:
-    _repo = attr.ib()  # :type sakia.data.repositories.CertificationsRepo
+    # Depth in blocks of the forks accepted by the network, the forkWindowSize of Duniter
+    MAX_FORK_DEPTH = 100
+
+    _repo = attr.ib()  # :type sakia.data.repositories.BlockchainsRepo
+    _headers_repo = attr.ib()  # :type sakia.data.repositories.BlockHeadersRepo
     _bma_connector = attr.ib()  # :type sakia.data.connectors.bma.BmaConnector
+    _lists_repo = attr.ib()  # :type sakia.data.repositories.BlocksListsRepo
+    _blocks_lists = attr.ib(default=attr.Factory(dict))  # :type dict[str, BlocksLists]
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
     @classmethod
@@ -23,19 +28,72 @@ class BlockchainProcessor:
         :param sakia.app.Application app: the app
         :rtype: sakia.data.processors.BlockchainProcessor
         """
-        return cls(app.db.blockchains_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+        return cls(app.db.blockchains_repo, app.db.block_headers_repo,
+                   app.bma_connector, app.db.blocks_lists_repo)
 
     def initialized(self, currency):
         return self._repo.get_one(currency=currency) is not None
 
+    def index_headers(self, currency, blocks_data):
+        """
+        Add blocks to the local index of block headers
+        :param str currency: the currency of the blocks
+        :param List[dict] blocks_data: the blocks in json format
+        """
+        self._headers_repo.upsert_many([BlockHeader.from_bma(currency, data) for data in blocks_data])
+
+    async def block_header(self, currency, block_number):
+        """
+        Get the header of a block from the local index.
+        If the block is not indexed yet, it is requested to the network and indexed.
+        :param str currency: the currency of the block
+        :param int block_number: the number of the block
+        :rtype: sakia.data.entities.BlockHeader
+        """
+        header = self._headers_repo.get_one(currency, block_number)
+        if not header:
+            block = await self._bma_connector.get(currency, bma.blockchain.block, {'number': block_number})
+            if block:
+                header = BlockHeader.from_bma(currency, block)
+                self._headers_repo.upsert_many([header])
+        return header
+
+    async def fork_point(self, currency, network_blockstamp, previous_blockstamp):
+        """
+        Find the first block of the abandoned branch after a rollback of the network.
+        The indexed headers are compared from the previous head to the chain of the network,
+        walking back its previous hashes, down to the depth of the forks accepted by the network.
+        :param str currency: the currency of the blocks
+        :param duniterpy.documents.BlockUID network_blockstamp: the new current block uid
+        :param duniterpy.documents.BlockUID previous_blockstamp: the previous current block uid
+        :return: the number of the first block which is not in the chain of the network
+        :rtype: int
+        """
+        number = min(network_blockstamp.number, previous_blockstamp.number)
+        lowest = max(0, number - BlockchainProcessor.MAX_FORK_DEPTH)
+        network_hashes = {network_blockstamp.number: network_blockstamp.sha_hash}
+        try:
+            for header in self._headers_repo.get_between(currency, lowest, number):
+                network_hash = network_hashes.get(header.number)
+                if network_hash is None:
+                    block = await self._bma_connector.get_block(currency, header.number, cached=False)
+                    network_hash = block['hash']
+                    network_hashes[header.number - 1] = block['previousHash']
+                if header.sha_hash == network_hash:
+                    return header.number + 1
+        except (NoPeerAvailable, errors.DuniterError) as e:
+            self._logger.debug("Could not find the fork point : {0}".format(str(e)))
+            return lowest
+        return lowest
+
     async def ud_before(self, currency, block_number):
         try:
             udblocks = await self._bma_connector.get(currency, bma.blockchain.ud)
             blocks = udblocks['result']['blocks']
-            ud_block_number = next(b for b in blocks if b <= block_number)
-            block = await self._bma_connector.get(currency, bma.blockchain.block, {'number': ud_block_number})
-            return block['dividend'], block['unitbase']
+            ud_block_number = next(b for b in reversed(blocks) if b <= block_number)
+            header = await self.block_header(currency, ud_block_number)
+            if header:
+                return header.dividend, header.unit_base
         except StopIteration:
             self._logger.debug("No dividend generated before {0}".format(block_number))
         except NoPeerAvailable as e:
@@ -49,9 +107,9 @@ class BlockchainProcessor:
 
     async def timestamp(self, currency, block_number):
         try:
-            block = await self._bma_connector.get(currency, bma.blockchain.block, {'number': block_number})
-            if block:
-                return block['medianTime']
+            header = await self.block_header(currency, block_number)
+            if header:
+                return header.median_time
         except NoPeerAvailable as e:
             self._logger.debug(str(e))
         except errors.DuniterError as e:
@@ -165,58 +223,125 @@ class BlockchainProcessor:
             block_doc = Block.from_signed_raw("{0}{1}\n".format(block['raw'], block['signature']))
             return block_doc
 
+    async def blocks_lists(self, currency):
+        """
+        Get the cached lists of the blocks with identities and with money data.
+        The lists are loaded from the database, or requested to the network when they were
+        never stored, then they are completed with the blocks downloaded above their height.
+        :param str currency: the currency of the blocks
+        :rtype: BlocksLists
+        """
+        lists = self._blocks_lists.get(currency)
+        if not lists:
+            lists = self._lists_repo.get_one(currency)
+            if lists:
+                self._blocks_lists[currency] = lists
+        if not lists:
+            identities_requests = (bma.blockchain.joiners,
+                                   bma.blockchain.leavers,
+                                   bma.blockchain.actives,
+                                   bma.blockchain.excluded,
+                                   bma.blockchain.newcomers)
+            money_requests = (bma.blockchain.ud, bma.blockchain.tx)
+            results = await asyncio.gather(*[self._bma_connector.get(currency, req)
+                                             for req in identities_requests + money_requests])
+            lists = BlocksLists(height=self.current_buid(currency).number)
+            for res in results[:len(identities_requests)]:
+                lists.with_identities.update(res["result"]["blocks"])
+            for res in results[len(identities_requests):]:
+                lists.with_money.update(res["result"]["blocks"])
+            self._lists_repo.add(currency, lists.with_identities, lists.with_money, lists.height)
+            self._blocks_lists[currency] = lists
+        return lists
+
+    def merge_blocks_lists(self, currency, blocks_data):
+        """
+        Add the downloaded blocks above the height of the cached lists to the lists
+        :param str currency: the currency of the blocks
+        :param List[dict] blocks_data: the blocks in json format
+        :return: the numbers of the merged blocks with identities or money data
+        :rtype: set[int]
+        """
+        merged = set()
+        lists = self._blocks_lists.get(currency)
+        if lists:
+            with_identities = set()
+            with_money = set()
+            for data in blocks_data:
+                if data['number'] > lists.height:
+                    if any(data.get(field) for field in BlocksLists.IDENTITIES_FIELDS):
+                        with_identities.add(data['number'])
+                    if any(data.get(field) for field in BlocksLists.MONEY_FIELDS):
+                        with_money.add(data['number'])
+            lists.with_identities.update(with_identities)
+            lists.with_money.update(with_money)
+            lists.height = max([lists.height] + [data['number'] for data in blocks_data])
+            self._lists_repo.add(currency, with_identities, with_money, lists.height)
+            merged = with_identities | with_money
+        return merged
+
+    def invalidate_blocks_lists(self, currency, block_number):
+        """
+        Drop the cached blocks after a rollback
+        :param str currency: the currency of the blocks
+        :param int block_number: the first invalid block number
+        """
+        self._lists_repo.drop_from(currency, block_number)
+        lists = self._blocks_lists.get(currency)
+        if lists:
+            lists.with_identities = set(b for b in lists.with_identities if b < block_number)
+            lists.with_money = set(b for b in lists.with_money if b < block_number)
+            lists.height = min(lists.height, block_number - 1)
+
     async def new_blocks_with_identities(self, currency):
         """
         Get blocks more recent than local blockuid
         with identities
         """
-        with_identities = []
-        future_requests = []
-        for req in (bma.blockchain.joiners,
-                    bma.blockchain.leavers,
-                    bma.blockchain.actives,
-                    bma.blockchain.excluded,
-                    bma.blockchain.newcomers):
-            future_requests.append(self._bma_connector.get(currency, req))
-        results = await asyncio.gather(*future_requests)
-
-        for res in results:
-            with_identities += res["result"]["blocks"]
-
+        lists = await self.blocks_lists(currency)
         local_current_buid = self.current_buid(currency)
-        return sorted([b for b in with_identities if b > local_current_buid.number])
+        return sorted([b for b in lists.with_identities if b > local_current_buid.number])
 
     async def new_blocks_with_money(self, currency):
         """
         Get blocks more recent than local block uid
         with money data (tx and uds)
         """
-        with_money = []
-        future_requests = []
-        for req in (bma.blockchain.ud, bma.blockchain.tx):
-            future_requests.append(self._bma_connector.get(currency, req))
-        results = await asyncio.gather(*future_requests)
-
-        for res in results:
-            with_money += res["result"]["blocks"]
-
+        lists = await self.blocks_lists(currency)
         local_current_buid = self.current_buid(currency)
-        return sorted([b for b in with_money if b > local_current_buid.number])
-
-    async def next_blocks(self, start, filter, currency):
-        """
-        Get blocks from the network
-        :param List[int] numbers: list of blocks numbers to get
-        :return: the list of block documents
+        return sorted([b for b in lists.with_money if b > local_current_buid.number])
+
+    def download_blocks(self, currency, from_buid, to_buid, lookahead=None):
+        """
+        Download the blocks from the network, after the local current block up to a given block
+        :param str currency: the currency of the blocks
+        :param duniterpy.documents.BlockUID from_buid: the local current block uid
+        :param duniterpy.documents.BlockUID to_buid: the last block uid to download
+        :param asyncio.Semaphore lookahead: the semaphore bounding the windows downloaded in advance
+        :return: the futures of the windows of blocks in json format, in the order of the blocks
+        :rtype: List[asyncio.Future]
+        """
+        start = from_buid.number + 1 if from_buid else 0
+        previous_hash = from_buid.sha_hash if from_buid else None
+        return self._bma_connector.download_blocks(currency, start, to_buid.number, previous_hash, to_buid.sha_hash,
+                                                   lookahead)
+
+    def parse_blocks(self, currency, blocks_data, filter):
+        """
+        Index the headers of downloaded blocks, and parse the interesting ones
+        :param str currency: the currency of the blocks
+        :param List[dict] blocks_data: the blocks in json format
+        :param set[int] filter: the numbers of the blocks to parse
+        :return: the documents of the filtered blocks, of the blocks with identities or money data
+        above the height of the cached lists, and of the last block
         :rtype: List[duniterpy.documents.Block]
         """
         blocks = []
-        blocks_data = await self._bma_connector.get(currency, bma.blockchain.blocks, req_args={'count': 100,
-                                                                                 'start': start})
+        self.index_headers(currency, blocks_data)
+        merged = self.merge_blocks_lists(currency, blocks_data)
         for data in blocks_data:
-            if data['number'] in filter or data['number'] == start+99:
+            if data['number'] in filter or data['number'] in merged or data is blocks_data[-1]:
                 blocks.append(Block.from_signed_raw(data["raw"] + data["signature"] + "\n"))
-
         return blocks
 
     async def initialize_blockchain(self, currency, log_stream):
@@ -253,6 +378,7 @@ class BlockchainProcessor:
         log_stream("Requesting current block")
         try:
             current_block = await self._bma_connector.get(currency, bma.blockchain.current)
+            self.index_headers(currency, [current_block])
             signed_raw = "{0}{1}\n".format(current_block['raw'], current_block['signature'])
             block = Block.from_signed_raw(signed_raw)
             blockchain.current_buid = block.blockUID
@@ -274,6 +400,7 @@ class BlockchainProcessor:
                 block_with_ud = await self._bma_connector.get(currency, bma.blockchain.block,
                                                               req_args={'number': block_number})
                 if block_with_ud:
+                    self.index_headers(currency, [block_with_ud])
                     blockchain.last_members_count = block_with_ud['membersCount']
                     blockchain.last_ud = block_with_ud['dividend']
                     blockchain.last_ud_base = block_with_ud['unitbase']
@@ -289,6 +416,7 @@ class BlockchainProcessor:
                 block_number = blocks_with_ud[index]
                 block_with_ud = await self._bma_connector.get(currency, bma.blockchain.block,
                                                               req_args={'number': block_number})
+                self.index_headers(currency, [block_with_ud])
                 blockchain.previous_mass = block_with_ud['monetaryMass']
                 blockchain.previous_members_count = block_with_ud['membersCount']
                 blockchain.previous_ud = block_with_ud['dividend']
@@ -298,10 +426,7 @@ class BlockchainProcessor:
                 if e.ucode != errors.NO_CURRENT_BLOCK:
                     raise
 
-        try:
-            self._repo.insert(blockchain)
-        except sqlite3.IntegrityError:
-            self._repo.update(blockchain)
+        self._repo.upsert_many([blockchain])
 
     def handle_new_blocks(self, currency, blocks):
         """
@@ -5,7 +5,6 @@ from duniterpy.documents import block_uid
 from ..connectors import BmaConnector
 from ..processors import NodesProcessor
 from ..entities import Certification, Identity
-import sqlite3
 import logging
 from sakia.errors import NoPeerAvailable
 
@@ -24,7 +23,7 @@ class CertificationsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.certifications_repo, app.db.identities_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     def certifications_sent(self, currency, pubkey):
         """
@@ -75,10 +74,7 @@ class CertificationsProcessor:
                              timestamp=timestamp,
                              signature=cert.signatures[0],
                              written_on=blockstamp.number)
-        try:
-            self._certifications_repo.insert(cert)
-        except sqlite3.IntegrityError:
-            self._certifications_repo.update(cert)
+        self._certifications_repo.upsert_many([cert])
         return cert
 
     def insert_or_update_certification(self, cert):
@@ -87,10 +83,7 @@ class CertificationsProcessor:
         :param sakia.data.entities.Certification cert:
         :return:
         """
-        try:
-            self._certifications_repo.insert(cert)
-        except sqlite3.IntegrityError:
-            self._certifications_repo.update(cert)
+        self._certifications_repo.upsert_many([cert])
 
     def cleanup_connection(self, connection, connections_pubkeys):
         """
@@ -1,5 +1,4 @@
 import attr
-import sqlite3
 import logging
 
 
@@ -21,10 +20,7 @@ class ConnectionsProcessor:
         Saves a connection state in the db
         :param sakia.data.entities.Connection connection: the connection updated
         """
-        try:
-            self._connections_repo.insert(connection)
-        except sqlite3.IntegrityError:
-            self._connections_repo.update(connection)
+        self._connections_repo.upsert_many([connection])
 
     def remove_connections(self, connection):
         self._connections_repo.drop(connection)
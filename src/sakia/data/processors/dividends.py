@@ -2,11 +2,11 @@ import attr
 import logging
 from ..entities import Dividend
 from .nodes import NodesProcessor
+from .blockchain import BlockchainProcessor
 from ..connectors import BmaConnector
 from duniterpy.api import bma
 from duniterpy.documents import Transaction
 import sqlite3
-import asyncio
 
 
 @attr.s
@@ -14,9 +14,13 @@ class DividendsProcessor:
     """
     :param sakia.data.repositories.DividendsRepo _repo: the repository of the sources
     :param sakia.data.connectors.bma.BmaConnector _bma_connector: the bma connector
+    :param sakia.data.processors.BlockchainProcessor _blockchain_processor: the blockchain processor
+    :param sakia.data.repositories.AsyncRepository _async_repo: the repository read in the database thread
     """
     _repo = attr.ib()
     _bma_connector = attr.ib()
+    _blockchain_processor = attr.ib()
+    _async_repo = attr.ib(default=None)
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
     @classmethod
@@ -26,7 +30,9 @@ class DividendsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.dividends_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector,
+                   BlockchainProcessor.instanciate(app),
+                   async_repo=app.db.async_repo(app.db.dividends_repo))
 
     def commit(self, dividend):
         try:
@@ -57,37 +63,39 @@ class DividendsProcessor:
                                 base=ud_data["base"])
             log_stream("Dividend of block {0}".format(dividend.block_number))
             block_numbers.append(dividend.block_number)
-            try:
-                dividends.append(dividend)
-                self._repo.insert(dividend)
-            except sqlite3.IntegrityError:
-                log_stream("Dividend already registered in database")
+            dividends.append(dividend)
 
         for tx in transactions:
             txdoc = Transaction.from_signed_raw(tx.raw)
             for input in txdoc.inputs:
                 if input.source == "D" and input.origin_id == connection.pubkey and input.index not in block_numbers:
-                    block = await self._bma_connector.get(connection.currency,
-                                                          bma.blockchain.block, req_args={'number': input.index})
-                    await asyncio.sleep(0.5)
+                    header = await self._blockchain_processor.block_header(connection.currency, input.index)
 
                     dividend = Dividend(currency=connection.currency,
                                         pubkey=connection.pubkey,
                                         block_number=input.index,
-                                        timestamp=block["medianTime"],
-                                        amount=block["dividend"],
-                                        base=block["unitbase"])
+                                        timestamp=header.median_time,
+                                        amount=header.dividend,
+                                        base=header.unit_base)
                     log_stream("Dividend of block {0}".format(dividend.block_number))
-                    try:
-                        dividends.append(dividend)
-                        self._repo.insert(dividend)
-                    except sqlite3.IntegrityError:
-                        log_stream("Dividend already registered in database")
+                    dividends.append(dividend)
+        self._repo.insert_many(dividends)
         return dividends
 
     def dividends(self, currency, pubkey):
         return self._repo.get_all(currency=currency, pubkey=pubkey)
 
+    async def load_dividends(self, currency, pubkey):
+        """
+        Get all dividends of a given pubkey, read in the database thread
+        :param str currency:
+        :param str pubkey:
+        :rtype: List[sakia.data.entities.Dividend]
+        """
+        if self._async_repo:
+            return await self._async_repo.get_all(currency=currency, pubkey=pubkey)
+        return self.dividends(currency, pubkey)
+
     def cleanup_connection(self, connection):
         """
         Cleanup connection after removal
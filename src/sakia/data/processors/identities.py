@@ -1,5 +1,4 @@
 import attr
-import sqlite3
 import logging
 import asyncio
 from ..entities import Identity
@@ -27,7 +26,7 @@ class IdentitiesProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.identities_repo, app.db.blockchains_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     async def find_from_pubkey(self, currency, pubkey):
         """
@@ -117,10 +116,14 @@ class IdentitiesProcessor:
         Saves an identity state in the db
         :param sakia.data.entities.Identity identity: the identity updated
         """
-        try:
-            self._identities_repo.insert(identity)
-        except sqlite3.IntegrityError:
-            self._identities_repo.update(identity)
+        self._identities_repo.upsert_many([identity])
+
+    def insert_or_update_identities(self, identities):
+        """
+        Saves identities states in the db
+        :param List[sakia.data.entities.Identity] identities: the identities updated
+        """
+        self._identities_repo.upsert_many(identities)
 
     async def initialize_identity(self, identity, log_stream):
         """
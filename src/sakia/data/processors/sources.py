@@ -24,7 +24,7 @@ class SourcesProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.sources_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector)
 
     def commit(self, source):
         try:
@@ -42,15 +42,16 @@ class SourcesProcessor:
                                                          req_args={'pubkey': pubkey})
 
             log_stream("Found {0} sources".format(len(sources_data['sources'])))
+            sources = []
             for i, s in enumerate(sources_data['sources']):
-                source = Source(currency=currency, pubkey=pubkey,
-                                identifier=s['identifier'],
-                                type=s['type'],
-                                noffset=s['noffset'],
-                                amount=s['amount'],
-                                base=s['base'])
-                self.commit(source)
+                sources.append(Source(currency=currency, pubkey=pubkey,
+                                      identifier=s['identifier'],
+                                      type=s['type'],
+                                      noffset=s['noffset'],
+                                      amount=s['amount'],
+                                      base=s['base']))
                 log_stream("{0}/{1} sources".format(i, len(sources_data['sources'])))
+            self._repo.insert_many(sources)
         except errors.DuniterError as e:
             raise
 
@@ -1,7 +1,5 @@
 import logging
 import attr
-import asyncio
-import sqlite3
 from ..entities import Transaction
 from ..entities.transaction import parse_transaction_doc
 from .nodes import NodesProcessor
@@ -16,6 +14,7 @@ class TransactionsProcessor:
     _repo = attr.ib()  # :type sakia.data.repositories.SourcesRepo
     _bma_connector = attr.ib()  # :type sakia.data.connectors.bma.BmaConnector
     _table_states = attr.ib(default=attr.Factory(dict))
+    _async_repo = attr.ib(default=None)  # :type sakia.data.repositories.AsyncRepository
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
     @classmethod
@@ -25,7 +24,8 @@ class TransactionsProcessor:
         :param sakia.app.Application app: the app
         """
         return cls(app.db.transactions_repo,
-                   BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters))
+                   app.bma_connector,
+                   async_repo=app.db.async_repo(app.db.transactions_repo))
 
     def next_txid(self, currency, block_number):
         """
@@ -46,6 +46,18 @@ class TransactionsProcessor:
         """
         return self._repo.get_transfers(currency, pubkey)
 
+    async def load_transfers(self, currency, pubkey):
+        """
+        Get all transfers from or to a given pubkey, read in the database thread
+        :param str currency:
+        :param str pubkey:
+        :return: the list of Transaction entities
+        :rtype: List[sakia.data.entities.Transaction]
+        """
+        if self._async_repo:
+            return await self._async_repo.get_transfers(currency, pubkey)
+        return self.transfers(currency, pubkey)
+
     def _try_transition(self, tx, transition_key, *inputs):
         """
         Try the transition defined by the given transition_key
@@ -77,10 +89,7 @@ class TransactionsProcessor:
         return False
 
     def commit(self, tx):
-        try:
-            self._repo.insert(tx)
-        except sqlite3.IntegrityError:
-            self._repo.update(tx)
+        self._repo.upsert_many([tx])
 
     def find_by_hash(self, sha_hash):
         return self._repo.get_one(sha_hash=sha_hash)
@@ -142,15 +151,11 @@ class TransactionsProcessor:
         for sent_data in history_data["history"]["sent"] + history_data["history"]["received"]:
             sent = TransactionDoc.from_bma_history(history_data["currency"], sent_data)
             log_stream("{0}/{1} transactions".format(txid, nb_tx))
-            try:
-                tx = parse_transaction_doc(sent, connection.pubkey, sent_data["block_number"],
-                                           sent_data["time"], txid)
-                transactions.append(tx)
-                self._repo.insert(tx)
-            except sqlite3.IntegrityError:
-                log_stream("Transaction already registered in database")
-            await asyncio.sleep(0)
+            tx = parse_transaction_doc(sent, connection.pubkey, sent_data["block_number"],
+                                       sent_data["time"], txid)
+            transactions.append(tx)
             txid += 1
+        self._repo.insert_many([tx for tx in transactions if tx])
         return transactions
 
     def cleanup_connection(self, connection, connections_pubkeys):
@@ -3,7 +3,13 @@ from .blockchains import BlockchainsRepo
 from .meta import SakiaDatabase
 from .certifications import CertificationsRepo
 from .transactions import TransactionsRepo
-from .nodes import NodesRepo
+from .nodes import NodesRepo, NodesStore
 from .connections import ConnectionsRepo
 from .sources import SourcesRepo
 from .dividends import DividendsRepo
+from .blocks import BlocksRepo
+from .block_headers import BlockHeadersRepo
+from .endpoints_health import EndpointsHealthRepo
+from .blocks_lists import BlocksListsRepo
+from .executor import DatabaseExecutor, AsyncRepository
+from .storage import StorageProfile, STORAGE_PROFILES
@@ -0,0 +1,280 @@
+from operator import attrgetter, itemgetter
+import sqlite3
+
+import attr
+
+# INSERT ... ON CONFLICT DO UPDATE needs SQLite 3.24
+UPSERT_SUPPORTED = sqlite3.sqlite_version_info >= (3, 24, 0)
+
+
+def primary_key(conn, table):
+    """
+    Get the columns of a table, and the columns of its primary key
+    :param sqlite3.Connection conn: the connection to the database
+    :param str table: the name of the table
+    :return: the columns, the primary key columns
+    :rtype: Tuple[List[str], List[str]]
+    """
+    table_info = conn.execute("PRAGMA table_info({0})".format(table)).fetchall()
+    columns = [c[1] for c in table_info]
+    keys = [c[1] for c in sorted(table_info, key=lambda c: c[5]) if c[5]]
+    return columns, keys
+
+
+def itemgetter_tuple(indexes):
+    """
+    Get the function returning the items of a sequence at given indexes, as a tuple
+    :param List[int] indexes: the indexes
+    :rtype: function
+    """
+    getter = itemgetter(*indexes)
+    if len(indexes) == 1:
+        return lambda row: (getter(row),)
+    return getter
+
+
+# Converters returning their argument when it already has their type
+_TYPES_CONVERTERS = (str, int, float, bool)
+
+
+def row_decoder(entity, nb_columns):
+    """
+    Compile the function building an entity from a row of its table, the columns
+    being the arguments of the constructor of the entity, in order.
+
+    The decoder does what the constructor of the entity does, without its calls :
+    the converters are inlined and only called on the values which need them,
+    the defaults are used for the attributes without column, then the validators
+    and __attrs_post_init__ are run.
+    :param type entity: the attrs class of the entity
+    :param int nb_columns: the number of columns of the rows
+    :return: the function decoding a row
+    """
+    globs = {'new': object.__new__, 'entity': entity, 'validate': attr.validate}
+    items = []
+    column = 0
+    for i, a in enumerate(attr.fields(entity)):
+        value = None
+        if a.init and column < nb_columns:
+            value = "row[{0}]".format(column)
+            column += 1
+        elif a.default is not attr.NOTHING:
+            if isinstance(a.default, attr.Factory):
+                globs['factory_{0}'.format(i)] = a.default.factory
+                value = "factory_{0}()".format(i)
+            else:
+                globs['default_{0}'.format(i)] = a.default
+                value = "default_{0}".format(i)
+        elif a.init:
+            raise TypeError("{0} has no column for {1}".format(entity.__name__, a.name))
+        if value is None:
+            continue
+        if a.convert in _TYPES_CONVERTERS:
+            value = "({v} if type({v}) is {t} else {t}({v}))".format(v=value, t=a.convert.__name__)
+        elif a.convert:
+            globs['convert_{0}'.format(i)] = a.convert
+            value = "convert_{0}({1})".format(i, value)
+        items.append("'{0}': {1}".format(a.name, value))
+    lines = ["def decode(row):",
+             "    obj = new(entity)",
+             "    obj.__dict__ = {{{0}}}".format(", ".join(items))]
+    if any(a.validator for a in attr.fields(entity)):
+        lines.append("    validate(obj)")
+    if getattr(entity, "__attrs_post_init__", None):
+        lines.append("    obj.__attrs_post_init__()")
+    lines.append("    return obj")
+    exec(compile("\n".join(lines) + "\n", "<{0} row decoder>".format(entity.__name__), "exec"), globs)
+    return globs['decode']
+
+
+@attr.s(frozen=True)
+class Repository:
+    """
+    Base of the repositories of entities stored in one table,
+    the columns of the table being in the order of the attributes of the entities.
+
+    The statements are generated once per set of filtered columns, from the schema
+    of the table read on the connection of the repository, and the rows are decoded
+    by a function compiled once per entity.
+
+    The entities can be read from a view projecting the columns of a stored table :
+    they are then written to the columns of the stored table.
+    """
+    _conn = attr.ib()  # :type sqlite3.Connection
+    # The layout of the table and the generated statements
+    _cache = attr.ib(default=attr.Factory(dict), init=False, cmp=False, hash=False, repr=False)
+
+    # The table and the attrs class of its entities, defined by the repositories
+    _table = None
+    _entity = None
+    # The attributes of the entities which are not stored
+    _not_stored = ()
+    # The table written when the entities are read from a view, None if they are read from their table
+    _stored_table = None
+
+    # The decoders and the getters of the rows of the entities, shared by all the repositories
+    _decoders = {}
+    _encoders = {}
+
+    def clear_statements(self):
+        """
+        Forget the layout of the table and the generated statements, after a change of the schema
+        """
+        self._cache.clear()
+
+    def _layout(self):
+        """
+        Get the columns of the table, and the getters of the values of the primary key
+        and of the values of an update in a row
+        :rtype: Tuple[List[str], List[str], function, function]
+        """
+        layout = self._cache.get("layout")
+        if layout is None:
+            columns, keys = primary_key(self._conn, self._table)
+            if self._stored_table:
+                keys = primary_key(self._conn, self._stored_table)[1]
+            keys_indexes = [columns.index(k) for k in keys]
+            values_indexes = [i for i in range(0, len(columns)) if i not in keys_indexes]
+            layout = (columns, keys, itemgetter_tuple(keys_indexes), itemgetter_tuple(values_indexes + keys_indexes))
+            self._cache["layout"] = layout
+        return layout
+
+    def _statement(self, kind, keys=()):
+        """
+        Get a statement on the table
+        :param str kind: SELECT, DELETE, UPDATE, INSERT, INSERT OR IGNORE, INSERT OR REPLACE or UPSERT
+        :param tuple keys: the filtered columns of a SELECT or a DELETE
+        :rtype: str
+        """
+        statement = self._cache.get((kind, keys))
+        if statement is None:
+            stored_table = self._stored_table or self._table
+            if kind == "UPDATE":
+                columns, primary_keys, _, _ = self._layout()
+                statement = "UPDATE {0} SET {1} WHERE {2}".format(
+                    stored_table,
+                    ",".join("{0}=?".format(c) for c in columns if c not in primary_keys),
+                    " AND ".join("{0}=?".format(k) for k in primary_keys))
+            elif kind in ("INSERT", "INSERT OR IGNORE", "INSERT OR REPLACE", "UPSERT"):
+                columns, primary_keys, _, _ = self._layout()
+                statement = "{0} INTO {1}({2}) VALUES ({3})".format("INSERT" if kind == "UPSERT" else kind,
+                                                                    stored_table, ",".join(columns),
+                                                                    ",".join(['?'] * len(columns)))
+                if kind == "UPSERT":
+                    statement += " ON CONFLICT ({0}) DO UPDATE SET {1}".format(
+                        ",".join(primary_keys),
+                        ",".join("{0}=excluded.{0}".format(c) for c in columns if c not in primary_keys))
+            else:
+                if kind == "SELECT":
+                    statement = "SELECT * FROM {0}".format(self._table)
+                else:
+                    statement = "{0} FROM {1}".format(kind, stored_table)
+                if keys:
+                    statement += " WHERE " + " AND ".join("{0}=?".format(k) for k in keys)
+            self._cache[(kind, keys)] = statement
+        return statement
+
+    def _decoder(self, nb_columns):
+        """
+        Get the function building an entity from a row of the table
+        :param int nb_columns: the number of columns of the rows
+        :rtype: function
+        """
+        decoder = Repository._decoders.get((self._entity, nb_columns))
+        if decoder is None:
+            decoder = row_decoder(self._entity, nb_columns)
+            Repository._decoders[(self._entity, nb_columns)] = decoder
+        return decoder
+
+    def _decode(self, row):
+        """
+        Build an entity from a row of the table
+        :param tuple row: the row
+        """
+        return self._decoder(len(row))(row)
+
+    def _decode_all(self, rows):
+        """
+        Build the entities of rows of the table
+        :param List[tuple] rows: the rows
+        :rtype: list
+        """
+        if rows:
+            decoder = self._decoder(len(rows[0]))
+            return [decoder(row) for row in rows]
+        return []
+
+    def _row(self, entity):
+        """
+        Get the row of an entity
+        :rtype: tuple
+        """
+        encoder = Repository._encoders.get(self._entity)
+        if encoder is None:
+            encoder = attrgetter(*[a.name for a in attr.fields(self._entity) if a.name not in self._not_stored])
+            Repository._encoders[self._entity] = encoder
+        return encoder(entity)
+
+    def insert(self, entity):
+        """
+        Commit an entity to the database
+        :param entity: the entity to commit
+        """
+        self._conn.execute(self._statement("INSERT"), self._row(entity))
+
+    def insert_many(self, entities):
+        """
+        Commit entities to the database in one statement, ignoring the known ones
+        :param list entities: the entities to commit
+        """
+        if entities:
+            self._conn.executemany(self._statement("INSERT OR IGNORE"), [self._row(e) for e in entities])
+
+    def upsert_many(self, entities):
+        """
+        Commit entities to the database in one statement, updating the known ones.
+        Without upsert support, the known entities are updated then the other entities are inserted.
+        :param list entities: the entities to commit
+        """
+        if entities:
+            rows = [self._row(e) for e in entities]
+            if UPSERT_SUPPORTED:
+                self._conn.executemany(self._statement("UPSERT"), rows)
+            else:
+                update_getter = self._layout()[3]
+                self._conn.executemany(self._statement("UPDATE"), [update_getter(r) for r in rows])
+                self._conn.executemany(self._statement("INSERT OR IGNORE"), rows)
+
+    def update(self, entity):
+        """
+        Update an existing entity in the database
+        :param entity: the entity to update
+        """
+        self._conn.execute(self._statement("UPDATE"), self._layout()[3](self._row(entity)))
+
+    def get_one(self, **search):
+        """
+        Get an existing entity in the database
+        :param dict search: the criterions of the lookup
+        """
+        c = self._conn.execute(self._statement("SELECT", tuple(search)), tuple(search.values()))
+        data = c.fetchone()
+        if data:
+            return self._decode(data)
+
+    def get_all(self, **search):
+        """
+        Get all existing entities in the database corresponding to the search
+        :param dict search: the criterions of the lookup
+        :rtype: list
+        """
+        c = self._conn.execute(self._statement("SELECT", tuple(search)), tuple(search.values()))
+        return self._decode_all(c.fetchall())
+
+    def drop(self, entity):
+        """
+        Drop an existing entity from the database
+        :param entity: the entity to drop
+        """
+        _, primary_keys, keys_getter, _ = self._layout()
+        self._conn.execute(self._statement("DELETE", tuple(primary_keys)), keys_getter(self._row(entity)))
@@ -0,0 +1,36 @@
+import attr
+
+from .base import Repository
+from ..entities import BlockHeader
+
+
+@attr.s(frozen=True)
+class BlockHeadersRepo(Repository):
+    """The repository for the index of block headers.
+    The headers are the header columns of the blocks table, read through the block_headers view :
+    they are dropped with the cached blocks.
+    """
+    _table = "block_headers"
+    _stored_table = "blocks"
+    _entity = BlockHeader
+
+    def get_one(self, currency, number):
+        """
+        Get the header of a block
+        :param str currency: the currency of the block
+        :param int number: the number of the block
+        :rtype: sakia.data.entities.BlockHeader
+        """
+        return super().get_one(currency=currency, number=number)
+
+    def get_between(self, currency, start, end):
+        """
+        Get the headers of the blocks between two numbers, from the highest block
+        :param str currency: the currency of the blocks
+        :param int start: the number of the first block
+        :param int end: the number of the last block
+        :rtype: List[sakia.data.entities.BlockHeader]
+        """
+        c = self._conn.execute("SELECT * FROM block_headers WHERE currency=? AND number>=? AND number<=? "
+                               "ORDER BY number DESC", (currency, start, end))
+        return self._decode_all(c.fetchall())
@@ -0,0 +1,44 @@
+import attr
+
+from .base import Repository
+from ..entities import CachedBlock
+
+
+@attr.s(frozen=True)
+class BlocksRepo(Repository):
+    """The repository for cached blocks.
+    Blocks are addressed by their number or by their hash.
+    The rows of the blocks table without raw document are indexed headers, they are not cached blocks.
+    """
+    _table = "blocks"
+    _entity = CachedBlock
+
+    def _statement(self, kind, keys=()):
+        """
+        Get a statement on the table, the selected rows being the cached blocks
+        :param str kind: the kind of statement
+        :param tuple keys: the filtered columns of a SELECT or a DELETE
+        :rtype: str
+        """
+        if kind != "SELECT":
+            return super()._statement(kind, keys)
+        statement = self._cache.get(("SELECT CACHED", keys))
+        if statement is None:
+            statement = super()._statement(kind, keys) + (" AND " if keys else " WHERE ") + "raw IS NOT NULL"
+            self._cache[("SELECT CACHED", keys)] = statement
+        return statement
+
+    def insert(self, block):
+        """
+        Commit a block to the database, replacing a known one
+        :param sakia.data.entities.CachedBlock block: the block to commit
+        """
+        self._conn.execute(self._statement("INSERT OR REPLACE"), self._row(block))
+
+    def drop_from(self, currency, number):
+        """
+        Drop all blocks and headers from a given number, when a rollback happens
+        :param str currency: the currency of the blocks
+        :param int number: the first block number to drop
+        """
+        self._conn.execute("DELETE FROM blocks WHERE currency=? AND number>=?", (currency, number))
@@ -0,0 +1,56 @@
+import attr
+
+from ..entities import BlocksLists
+
+
+@attr.s(frozen=True)
+class BlocksListsRepo:
+    """The repository for the lists of the blocks with identities and with money data.
+    The numbers of the blocks are stored per list, and the height of the lists per currency.
+    """
+    _conn = attr.ib()  # :type sqlite3.Connection
+
+    IDENTITIES = "identities"
+    MONEY = "money"
+
+    def get_one(self, currency):
+        """
+        Get the lists of the blocks of a currency
+        :param str currency: the currency of the blocks
+        :return: the lists, None if they were never stored
+        :rtype: sakia.data.entities.BlocksLists
+        """
+        data = self._conn.execute("SELECT height FROM blocks_lists_heights WHERE currency=?", (currency,)).fetchone()
+        if data:
+            lists = BlocksLists(height=data[0])
+            c = self._conn.execute("SELECT list, number FROM blocks_lists WHERE currency=?", (currency,))
+            for name, number in c.fetchall():
+                if name == BlocksListsRepo.IDENTITIES:
+                    lists.with_identities.add(number)
+                else:
+                    lists.with_money.add(number)
+            return lists
+
+    def add(self, currency, with_identities, with_money, height):
+        """
+        Add blocks to the lists of a currency, and set their height
+        :param str currency: the currency of the blocks
+        :param iterable[int] with_identities: the numbers of the blocks with identities data
+        :param iterable[int] with_money: the numbers of the blocks with money data
+        :param int height: the height of the lists
+        """
+        rows = [(currency, BlocksListsRepo.IDENTITIES, n) for n in with_identities]
+        rows += [(currency, BlocksListsRepo.MONEY, n) for n in with_money]
+        if rows:
+            self._conn.executemany("INSERT OR IGNORE INTO blocks_lists VALUES (?,?,?)", rows)
+        self._conn.execute("INSERT OR REPLACE INTO blocks_lists_heights VALUES (?,?)", (currency, height))
+
+    def drop_from(self, currency, number):
+        """
+        Drop the blocks from a given number, when a rollback happens
+        :param str currency: the currency of the blocks
+        :param int number: the first block number to drop
+        """
+        self._conn.execute("DELETE FROM blocks_lists WHERE currency=? AND number>=?", (currency, number))
+        self._conn.execute("UPDATE blocks_lists_heights SET height=? WHERE currency=? AND height>=?",
+                           (number - 1, currency, number))
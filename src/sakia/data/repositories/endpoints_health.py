@@ -0,0 +1,20 @@
+import attr
+
+from .base import Repository
+from ..entities import EndpointHealth
+
+
+@attr.s(frozen=True)
+class EndpointsHealthRepo(Repository):
+    """The repository for the health of the nodes endpoints.
+    """
+    _table = "endpoints_health"
+    _entity = EndpointHealth
+
+    def get_all(self, currency):
+        """
+        Get the health of all the endpoints of a currency
+        :param str currency: the currency of the endpoints
+        :rtype: List[sakia.data.entities.EndpointHealth]
+        """
+        return super().get_all(currency=currency)
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DatabaseExecutor:
+    """
+    Runs the methods of the repositories in a dedicated database thread,
+    so that large reads and writes never block the event loop.
+
+    The thread owns its own connection to the database file : a job sees the data
+    committed by the main connection, and the writes of a job are committed when it ends.
+    The thread is started by the first job, and started again by the first job after a shutdown.
+    Without a connection factory (in-memory databases), the jobs run inline.
+    """
+    def __init__(self, connect=None):
+        """
+        :param connect: the factory of the connection of the database thread
+        """
+        self._connect = connect
+        self._executor = None
+        # Only used from the database thread
+        self._conn = None
+        self._repos = {}
+        self._logger = logging.getLogger('sakia')
+
+    def _repo(self, repo_class):
+        """
+        Get the repository bound to the connection of the database thread
+        :param type repo_class: the class of the repository
+        """
+        if self._conn is None:
+            self._conn = self._connect()
+        if repo_class not in self._repos:
+            self._repos[repo_class] = repo_class(self._conn)
+        return self._repos[repo_class]
+
+    def _call(self, repo_class, method, args, kwargs):
+        """
+        Run a method of a repository in the database thread
+        """
+        repo = self._repo(repo_class)
+        try:
+            result = getattr(repo, method)(*args, **kwargs)
+            self._conn.commit()
+            return result
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    async def run(self, repo, method, *args, **kwargs):
+        """
+        Run a method of a repository without blocking the event loop
+        :param repo: the repository of the main connection
+        :param str method: the name of the method
+        :return: the result of the method
+        """
+        if self._connect is None:
+            return getattr(repo, method)(*args, **kwargs)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor,
+                                          functools.partial(self._call, type(repo), method, args, kwargs))
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._repos = {}
+
+    def shutdown(self):
+        """
+        Wait for the pending jobs, stop the database thread and close its connection.
+        The next job starts a new thread.
+        """
+        if self._executor is not None:
+            self._executor.submit(self._close)
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class AsyncRepository:
+    """
+    Awaitable view of a repository : its methods run in the database thread.
+
+    >>> transfers = await db.async_repo(db.transactions_repo).get_transfers(currency, pubkey)
+    """
+    def __init__(self, repo, executor, commit=None):
+        """
+        :param repo: the repository of the main connection
+        :param DatabaseExecutor executor: the executor of the database
+        :param commit: the function committing the pending writes of the main connection
+        """
+        self._repo = repo
+        self._executor = executor
+        self._commit = commit
+
+    async def _run(self, method, *args, **kwargs):
+        """
+        Commit the pending writes of the main connection and run a method of the repository
+        in the database thread. The connection of the thread only sees the committed data,
+        and its writes would wait for the transaction of the main connection.
+        Without pending writes, nothing is committed on the event loop.
+        :param str method: the name of the method
+        :return: the result of the method
+        """
+        if self._commit:
+            self._commit()
+        return await self._executor.run(self._repo, method, *args, **kwargs)
+
+    def __getattr__(self, name):
+        if not callable(getattr(self._repo, name)):
+            raise AttributeError(name)
+        return functools.partial(self._run, name)
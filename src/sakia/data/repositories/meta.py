@@ -1,4 +1,5 @@
 import attr
+import functools
 import os
 import logging
 import sqlite3
@@ -9,8 +10,14 @@ from .blockchains import BlockchainsRepo
 from .certifications import CertificationsRepo
 from .transactions import TransactionsRepo
 from .dividends import DividendsRepo
-from .nodes import NodesRepo
+from .nodes import NodesRepo, NodesStore
 from .sources import SourcesRepo
+from .blocks import BlocksRepo
+from .block_headers import BlockHeadersRepo
+from .endpoints_health import EndpointsHealthRepo
+from .blocks_lists import BlocksListsRepo
+from .executor import DatabaseExecutor, AsyncRepository
+from .storage import StorageProfile, STORAGE_PROFILES
 
 
 @attr.s(frozen=True)
@@ -27,18 +34,40 @@ class SakiaDatabase:
     nodes_repo = attr.ib(default=None)
     sources_repo = attr.ib(default=None)
     dividends_repo = attr.ib(default=None)
+    blocks_repo = attr.ib(default=None)
+    block_headers_repo = attr.ib(default=None)
+    endpoints_health_repo = attr.ib(default=None)
+    blocks_lists_repo = attr.ib(default=None)
+    executor = attr.ib(default=attr.Factory(DatabaseExecutor))  # :type DatabaseExecutor
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
-    @classmethod
-    def load_or_init(cls, options, profile_name):
+    @staticmethod
+    def connect(path, storage_profile=None):
+        """
+        Open a connection to a database file
+        :param str path: the path of the database file
+        :param StorageProfile storage_profile: the settings of the storage engine, SQLite defaults if None
+        :rtype: sqlite3.Connection
+        """
         sqlite3.register_adapter(BlockUID, str)
         sqlite3.register_adapter(bool, int)
         sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
-        con = sqlite3.connect(os.path.join(options.config_path, profile_name, options.currency + ".db"),
-                              detect_types=sqlite3.PARSE_DECLTYPES)
+        con = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+        if storage_profile:
+            storage_profile.apply(con)
+        return con
+
+    @classmethod
+    def load_or_init(cls, options, profile_name):
+        path = os.path.join(options.config_path, profile_name, options.currency + ".db")
+        storage_profile = STORAGE_PROFILES[options.storage]
+        con = SakiaDatabase.connect(path, storage_profile)
         meta = SakiaDatabase(con, ConnectionsRepo(con), IdentitiesRepo(con),
                              BlockchainsRepo(con), CertificationsRepo(con), TransactionsRepo(con),
-                             NodesRepo(con), SourcesRepo(con), DividendsRepo(con))
+                             NodesStore(NodesRepo(con)), SourcesRepo(con), DividendsRepo(con), BlocksRepo(con),
+                             BlockHeadersRepo(con), EndpointsHealthRepo(con), BlocksListsRepo(con),
+                             executor=DatabaseExecutor(functools.partial(SakiaDatabase.connect, path,
+                                                                         storage_profile)))
         meta.prepare()
         meta.upgrade_database()
         return meta
@@ -60,6 +89,11 @@ class SakiaDatabase:
     def upgrades(self):
         return [
             self.create_all_tables,
+            self.add_blocks_cache,
+            self.add_block_headers,
+            self.add_endpoints_health,
+            self.add_secondary_indexes,
+            self.add_blocks_lists,
         ]
 
     def upgrade_database(self):
@@ -73,7 +107,14 @@ class SakiaDatabase:
             self._logger.debug("Upgrading to version {0}...".format(v))
             self.upgrades[v]()
             with self.conn:
-                self.conn.execute("UPDATE meta SET version=? WHERE id=1", (version + 1,))
+                self.conn.execute("UPDATE meta SET version=? WHERE id=1", (v + 1,))
+        if version < nb_versions:
+            # The statements of the repositories were generated on the previous schema
+            for repo in (self.connections_repo, self.identities_repo, self.blockchains_repo,
+                         self.certifications_repo, self.transactions_repo, self.nodes_repo, self.sources_repo,
+                         self.dividends_repo, self.blocks_repo, self.block_headers_repo, self.endpoints_health_repo):
+                if repo:
+                    repo.clear_statements()
         self._logger.debug("End upgrade of database...")
 
     def create_all_tables(self):
@@ -86,6 +127,112 @@ class SakiaDatabase:
         with self.conn:
             self.conn.executescript(sql_file.read())
 
+    def add_blocks_cache(self):
+        """
+        Create the table of the blocks cache
+        """
+        self._logger.debug("Adding blocks cache")
+        with self.conn:
+            self.conn.executescript("""CREATE TABLE IF NOT EXISTS blocks(
+                                       currency          VARCHAR(30),
+                                       number            INT,
+                                       sha_hash          VARCHAR(100),
+                                       previous_hash     VARCHAR(100),
+                                       median_time       INT,
+                                       members_count     INT,
+                                       monetary_mass     INT,
+                                       dividend          INT,
+                                       unit_base         INT,
+                                       raw               TEXT,
+                                       signature         VARCHAR(100),
+                                       PRIMARY KEY (currency, number)
+                                       );
+                                       CREATE INDEX IF NOT EXISTS blocks_hash ON blocks(sha_hash);
+                                       """)
+
+    def add_block_headers(self):
+        """
+        Create the view of the block headers index, the headers being stored in the blocks table
+        """
+        self._logger.debug("Adding block headers")
+        with self.conn:
+            self.conn.executescript("""CREATE VIEW IF NOT EXISTS block_headers AS
+                                       SELECT currency, number, sha_hash, median_time, dividend,
+                                              unit_base, members_count, monetary_mass
+                                       FROM blocks;
+                                       """)
+
+    def add_endpoints_health(self):
+        """
+        Create the table of the health of the nodes endpoints
+        """
+        self._logger.debug("Adding endpoints health")
+        with self.conn:
+            self.conn.executescript("""CREATE TABLE IF NOT EXISTS endpoints_health(
+                                       currency          VARCHAR(30),
+                                       endpoint          VARCHAR(255),
+                                       latency           FLOAT,
+                                       error_rate        FLOAT,
+                                       limitations       INT,
+                                       requests          INT,
+                                       PRIMARY KEY (currency, endpoint)
+                                       );
+                                       """)
+
+    def add_secondary_indexes(self):
+        """
+        Index the columns filtered by the frequent queries
+        and store the block numbers of the dividends as integers
+        """
+        self._logger.debug("Adding secondary indexes")
+        with self.conn:
+            self.conn.executescript("""BEGIN;
+                                       CREATE TABLE dividends_v2(
+                                       currency           VARCHAR(30),
+                                       pubkey             VARCHAR(50),
+                                       block_number       INT,
+                                       timestamp          INT,
+                                       amount             INT,
+                                       base               INT,
+                                       PRIMARY KEY (currency, pubkey, block_number)
+                                       );
+                                       INSERT OR IGNORE INTO dividends_v2
+                                       SELECT currency, pubkey, CAST(block_number AS INTEGER), timestamp, amount, base
+                                       FROM dividends;
+                                       DROP TABLE dividends;
+                                       ALTER TABLE dividends_v2 RENAME TO dividends;
+                                       CREATE INDEX IF NOT EXISTS transactions_issuer ON transactions(currency, issuer);
+                                       CREATE INDEX IF NOT EXISTS transactions_receiver
+                                       ON transactions(currency, receiver);
+                                       CREATE INDEX IF NOT EXISTS transactions_state ON transactions(currency, state);
+                                       CREATE INDEX IF NOT EXISTS transactions_written_on
+                                       ON transactions(currency, written_on);
+                                       CREATE INDEX IF NOT EXISTS certifications_certified
+                                       ON certifications(currency, certified);
+                                       CREATE INDEX IF NOT EXISTS nodes_state ON nodes(currency, state, member);
+                                       CREATE INDEX IF NOT EXISTS nodes_root ON nodes(currency, root);
+                                       COMMIT;
+                                       """)
+
+    def add_blocks_lists(self):
+        """
+        Create the tables of the lists of the blocks with identities and with money data
+        """
+        self._logger.debug("Adding blocks lists")
+        with self.conn:
+            self.conn.executescript("""CREATE TABLE IF NOT EXISTS blocks_lists(
+                                       currency          VARCHAR(30),
+                                       list              VARCHAR(10),
+                                       number            INT,
+                                       PRIMARY KEY (currency, list, number)
+                                       );
+                                       CREATE TABLE IF NOT EXISTS blocks_lists_heights(
+                                       currency          VARCHAR(30),
+                                       height            INT,
+                                       PRIMARY KEY (currency)
+                                       );
+                                       """)
+
     def version(self):
         with self.conn:
             c = self.conn.execute("SELECT * FROM meta WHERE id=1")
@@ -97,4 +244,34 @@ class SakiaDatabase:
                 return 0
 
     def commit(self):
+        """
+        Write the changes of the nodes store and commit the database
+        """
+        if isinstance(self.nodes_repo, NodesStore):
+            self.nodes_repo.flush()
         self.conn.commit()
+
+    def commit_pending(self):
+        """
+        Commit the database only if it has pending writes.
+        The changes of the nodes store are not written : they are not read by the database thread.
+        """
+        if self.conn.in_transaction:
+            self.conn.commit()
+
+    def async_repo(self, repo):
+        """
+        Get the awaitable view of a repository, running its methods in the database thread.
+        The pending writes of the database are committed before every call.
+        :param repo: a repository of this database
+        :rtype: AsyncRepository
+        """
+        if isinstance(repo, NodesStore):
+            raise TypeError("The nodes store is written behind : its nodes are only read from the store")
+        return AsyncRepository(repo, self.executor, self.commit_pending)
+
+    def shutdown(self):
+        """
+        Stop the database thread, the next call of an awaitable repository starts it again
+        """
+        self.executor.shutdown()
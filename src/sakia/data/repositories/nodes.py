@@ -1,110 +1,126 @@
 import attr
+import sqlite3
 
+from .base import Repository
 from ..entities import Node
 
 
 @attr.s(frozen=True)
-class NodesRepo:
+class NodesRepo(Repository):
     """The repository for Communities entities.
     """
-    _conn = attr.ib()  # :type sqlite3.Connection
-    _primary_keys = (Node.currency, Node.pubkey)
+    _table = "nodes"
+    _entity = Node
 
-    def insert(self, node):
+    def _row(self, node):
         """
-        Commit a node to the database
-        :param sakia.data.entities.Node node: the node to commit
+        Get the row of a node
+        :param sakia.data.entities.Node node: the node
+        :rtype: list
         """
-        node_tuple = attr.astuple(node, tuple_factory=list)
+        node_tuple = list(super()._row(node))
         node_tuple[2] = "\n".join([str(n) for n in node_tuple[2]])
         node_tuple[12] = "\n".join([str(n) for n in node_tuple[12]])
-        values = ",".join(['?'] * len(node_tuple))
-        self._conn.execute("INSERT INTO nodes VALUES ({0})".format(values), node_tuple)
+        return node_tuple
+
+
+@attr.s()
+class NodesStore:
+    """
+    The authoritative in-memory table of the nodes, written behind to the nodes repository.
+    The nodes are loaded once from the database, and the changes are written
+    to the database by batches when the store is flushed.
+
+    The nodes returned by the store are the ones it holds : they must be changed through
+    insert and update to be written to the database.
+    """
+    _repo = attr.ib()  # :type sakia.data.repositories.NodesRepo
+    _nodes = attr.ib(default=None)
+    _inserted = attr.ib(default=attr.Factory(set))
+    _updated = attr.ib(default=attr.Factory(set))
+    _dropped = attr.ib(default=attr.Factory(dict))
+
+    def _table(self):
+        """
+        Get the table of the nodes, loaded from the database on the first call
+        :rtype: dict[(str, str), sakia.data.entities.Node]
+        """
+        if self._nodes is None:
+            self._nodes = {(n.currency, n.pubkey): n for n in self._repo.get_all()}
+        return self._nodes
+
+    def clear_statements(self):
+        """
+        Forget the statements generated by the nodes repository, after a change of the schema
+        """
+        self._repo.clear_statements()
+
+    def insert(self, node):
+        """
+        Insert a node in the store
+        :param sakia.data.entities.Node node: the node to insert
+        """
+        key = (node.currency, node.pubkey)
+        if key in self._table():
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: nodes.currency, nodes.pubkey")
+        self._nodes[key] = node
+        self._inserted.add(key)
 
     def update(self, node):
         """
-        Update an existing node in the database
+        Update an existing node in the store
         :param sakia.data.entities.Node node: the node to update
         """
-        updated_fields = attr.astuple(node, tuple_factory=list,
-                                      filter=attr.filters.exclude(*NodesRepo._primary_keys))
-        updated_fields[0] = "\n".join([str(n) for n in updated_fields[0]])
-        updated_fields[10] = "\n".join([str(n) for n in updated_fields[9]])
-        where_fields = attr.astuple(node, tuple_factory=list,
-                                    filter=attr.filters.include(*NodesRepo._primary_keys))
-        self._conn.execute("""UPDATE nodes SET
-                                    endpoints=?,
-                                    peer_buid=?,
-                                    uid=?,
-                                    current_buid=?,
-                                    current_ts=?,
-                                    previous_buid=?,
-                                    state=?,
-                                    software=?,
-                                    version=?,
-                                    merkle_peers_root=?,
-                                    merkle_peers_leaves=?,
-                                    root=?,
-                                    member=?
-                                   WHERE
-                                   currency=? AND
-                                   pubkey=?""",
-                                   updated_fields + where_fields)
+        key = (node.currency, node.pubkey)
+        if key in self._table():
+            self._nodes[key] = node
+            self._updated.add(key)
 
     def get_one(self, **search):
         """
-        Get an existing node in the database
+        Get an existing node in the store
         :param dict search: the criterions of the lookup
         :rtype: sakia.data.entities.Node
         """
-        filters = []
-        values = []
-        for k, v in search.items():
-            if isinstance(v, bool):
-                v = int(v)
-            filters.append("{k}=?".format(k=k))
-            values.append(v)
-
-        request = "SELECT * FROM nodes WHERE {filters}".format(filters=" AND ".join(filters))
-
-        c = self._conn.execute(request, tuple(values))
-        data = c.fetchone()
-        if data:
-            return Node(*data)
+        if search.keys() == {'currency', 'pubkey'}:
+            return self._table().get((search['currency'], search['pubkey']))
+        for node in self._table().values():
+            if all(getattr(node, k) == v for k, v in search.items()):
+                return node
 
     def get_all(self, **search):
         """
-        Get all existing node in the database corresponding to the search
+        Get all existing nodes in the store corresponding to the search
         :param dict search: the criterions of the lookup
-        :rtype: sakia.data.entities.Node
+        :rtype: List[sakia.data.entities.Node]
         """
-        filters = []
-        values = []
-        for k, v in search.items():
-            if isinstance(v, bool):
-                value = int(v)
-            else:
-                value = v
-            filters.append("{key} = ?".format(key=k))
-            values.append(value)
-
-        if filters:
-            request = "SELECT * FROM nodes WHERE {filters}".format(filters=" AND ".join(filters))
-        else:
-            request = "SELECT * FROM nodes"
-
-        c = self._conn.execute(request, tuple(values))
-        datas = c.fetchall()
-        if datas:
-            return [Node(*data) for data in datas]
-        return []
+        return [node for node in self._table().values()
+                if all(getattr(node, k) == v for k, v in search.items())]
 
     def drop(self, node):
         """
-        Drop an existing node from the database
-        :param sakia.data.entities.Node node: the node to update
+        Drop an existing node from the store
+        :param sakia.data.entities.Node node: the node to drop
+        """
+        key = (node.currency, node.pubkey)
+        dropped = self._table().pop(key, None)
+        self._updated.discard(key)
+        if key in self._inserted:
+            self._inserted.discard(key)
+        elif dropped:
+            self._dropped[key] = dropped
+
+    def flush(self):
+        """
+        Write the changes of the store to the database
+        :return: the number of nodes written
+        :rtype: int
         """
-        where_fields = attr.astuple(node, filter=attr.filters.include(*NodesRepo._primary_keys))
-        self._conn.execute("""DELETE FROM nodes
-                              WHERE
-                              currency=? AND pubkey=?""", where_fields)
+        for node in self._dropped.values():
+            self._repo.drop(node)
+        self._repo.upsert_many([self._nodes[key] for key in self._inserted | self._updated])
+        written = len(self._dropped) + len(self._inserted | self._updated)
+        self._dropped.clear()
+        self._inserted.clear()
+        self._updated.clear()
+        return written
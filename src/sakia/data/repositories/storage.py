@@ -0,0 +1,47 @@
+import attr
+
+
+@attr.s(frozen=True)
+class StorageProfile:
+    """
+    The settings of the SQLite storage engine applied to the connections of the database
+    """
+    name = attr.ib(convert=str)
+    # DELETE : rollback journal, every commit rewrites the modified pages in the database file.
+    # WAL : commits are appended to a write-ahead log, readers and the writer do not block each other.
+    # The journal mode is persistent in the database file.
+    journal_mode = attr.ib(convert=str, default="DELETE")
+    # FULL : fsync at every commit, a commit survives a power loss.
+    # NORMAL : in WAL mode, fsync at checkpoints only. The last commits can be lost on a power loss
+    # or an OS crash, but the database is never corrupted, and a crash of sakia loses nothing.
+    synchronous = attr.ib(convert=str, default="FULL")
+    # Page cache of each connection, in KiB when negative. A bigger cache costs memory only.
+    cache_size = attr.ib(convert=int, default=-2000)
+    # Bytes of the database file read through memory mapping, 0 to disable.
+    # An I/O error on a mapped page crashes the process instead of raising an error.
+    mmap_size = attr.ib(convert=int, default=0)
+    # MEMORY : temporary tables and indexes of sorts and joins are kept in memory. Costs memory only.
+    temp_store = attr.ib(convert=str, default="DEFAULT")
+
+    def apply(self, conn):
+        """
+        Apply the settings to a connection
+        :param sqlite3.Connection conn: the connection
+        """
+        conn.execute("PRAGMA journal_mode={0}".format(self.journal_mode))
+        conn.execute("PRAGMA synchronous={0}".format(self.synchronous))
+        conn.execute("PRAGMA cache_size={0}".format(self.cache_size))
+        conn.execute("PRAGMA mmap_size={0}".format(self.mmap_size))
+        conn.execute("PRAGMA temp_store={0}".format(self.temp_store))
+
+
+STORAGE_PROFILES = {p.name: p for p in (
+    # SQLite defaults : the most durable, the slowest commits
+    StorageProfile("safe"),
+    # Interactive use : fast commits and reads during the synchronization of the blockchain
+    StorageProfile("desktop", journal_mode="WAL", synchronous="NORMAL", cache_size=-16000,
+                   mmap_size=64 * 1024 * 1024, temp_store="MEMORY"),
+    # Long running instances with large wallets : bigger caches
+    StorageProfile("server", journal_mode="WAL", synchronous="NORMAL", cache_size=-64000,
+                   mmap_size=256 * 1024 * 1024, temp_store="MEMORY"),
+)}
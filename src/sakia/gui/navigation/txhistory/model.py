@@ -1,3 +1,4 @@
+import functools
 from PyQt5.QtCore import QObject
 from .table_model import HistoryTableModel, TxFilterProxyModel
 from PyQt5.QtCore import Qt, QDateTime, QTime, pyqtSignal, QModelIndex
@@ -46,14 +47,25 @@ class TxHistoryModel(QObject):
         self._proxy.setSourceModel(self._model)
         self._proxy.setDynamicSortFilter(True)
         self._proxy.setSortRole(Qt.DisplayRole)
-        self._model.init_transfers()
-        self.app.new_transfer.connect(self._model.add_transfer)
-        self.app.new_dividend.connect(self._model.add_dividend)
-        self.app.transaction_state_changed.connect(self._model.change_transfer)
+        # The changes are followed once the history is loaded : the reset of the model would drop them
+        self._model.init_transfers().add_done_callback(functools.partial(self._connect_history_changes,
+                                                                         self._model))
         self.app.referential_changed.connect(self._model.modelReset)
 
         return self._proxy
 
+    def _connect_history_changes(self, model, task):
+        """
+        Update a history table model with the new and changed transfers
+        :param HistoryTableModel model: the history table model
+        :param asyncio.Task task: the task loading the history
+        """
+        if task.cancelled():
+            return
+        self.app.new_transfer.connect(model.add_transfer)
+        self.app.new_dividend.connect(model.add_dividend)
+        self.app.transaction_state_changed.connect(model.change_transfer)
+
     def table_data(self, index):
         """
         Gets available table data at given index
@@ -7,6 +7,7 @@ from PyQt5.QtGui import QFont, QColor
 from sakia.data.entities import Transaction
 from sakia.constants import MAX_CONFIRMATIONS
 from sakia.data.processors import BlockchainProcessor
+from sakia.decorators import asyncify
 
 
 class TxFilterProxyModel(QSortFilterProxyModel):
@@ -304,17 +305,17 @@ class HistoryTableModel(QAbstractTableModel):
         return (date_ts, receiver, amount, "", HistoryTableModel.DIVIDEND, 0,
                 dividend.pubkey, block_number, "", dividend)
 
-    def init_transfers(self):
+    @asyncify
+    async def init_transfers(self):
+        transfers, dividends = await self.transactions_service.load_history(self.connection.pubkey)
         self.beginResetModel()
         self.transfers_data = []
-        transfers = self.transfers()
         for transfer in transfers:
             if transfer.state != Transaction.DROPPED:
                 if transfer.issuer == self.connection.pubkey:
                     self.transfers_data.append(self.data_sent(transfer))
                 if transfer.receiver == self.connection.pubkey:
                     self.transfers_data.append(self.data_received(transfer))
-        dividends = self.dividends()
         for dividend in dividends:
             self.transfers_data.append(self.data_dividend(dividend))
         self.endResetModel()
@@ -1,6 +1,7 @@
 import attr
 import logging
 from sakia.constants import ROOT_SERVERS
+from sakia.data.repositories.storage import STORAGE_PROFILES
 from logging import FileHandler, StreamHandler
 from logging.handlers import RotatingFileHandler
 from optparse import OptionParser
@@ -23,6 +24,7 @@ def config_path_factory():
 class SakiaOptions:
     config_path = attr.ib(default=attr.Factory(config_path_factory))
     currency = attr.ib(default="gtest")
+    storage = attr.ib(default="desktop")
     _logger = attr.ib(default=attr.Factory(lambda: logging.getLogger('sakia')))
 
     @classmethod
@@ -49,8 +51,16 @@ class SakiaOptions:
         parser.add_option("--currency",  dest="currency", default="gtest",
                           help="Select a currency between {0}".format(",".join(ROOT_SERVERS.keys())))
 
+        parser.add_option("--storage",  dest="storage", default="desktop",
+                          help="Select a storage profile between {0}".format(",".join(STORAGE_PROFILES.keys())))
+
         (options, args) = parser.parse_args(argv)
 
+        if options.storage not in STORAGE_PROFILES.keys():
+            raise RuntimeError("{0} is not a valid storage profile".format(options.storage))
+        else:
+            self.storage = options.storage
+
         if options.currency not in ROOT_SERVERS.keys():
             raise RuntimeError("{0} is not a valid currency".format(options.currency))
         else:
@@ -1,6 +1,7 @@
 import asyncio
 from PyQt5.QtCore import QObject
 import math
+import time
 import logging
 from duniterpy.api.errors import DuniterError
 from sakia.errors import NoPeerAvailable
@@ -11,6 +12,11 @@ class BlockchainService(QObject):
     Blockchain service is managing new blocks received
     to update data locally
     """
+    # Windows of blocks downloaded in advance of the window being handled
+    PREFETCH_WINDOWS = 4
+    # Windows of blocks parsed in advance of the window being handled
+    PARSED_WINDOWS = 2
+
     def __init__(self, app, currency, blockchain_processor, bma_connector,
                  identities_service, transactions_service, sources_service):
         """
@@ -33,7 +39,11 @@ class BlockchainService(QObject):
         self._transactions_service = transactions_service
         self._sources_service = sources_service
         self._logger = logging.getLogger('sakia')
-        self._update_lock = False
+        self._target_head = None
+        # The new and the previous current block uids of the rollback to handle
+        self._rollback = None
+        self._target_changed = asyncio.Event()
+        self._catch_up_task = None
 
     def initialized(self):
         return self._blockchain_processor.initialized(self.app.currency)
@@ -49,41 +59,184 @@ class BlockchainService(QObject):
             block_numbers += [network_blockstamp.number]
         return block_numbers
 
-    async def handle_blockchain_progress(self, network_blockstamp):
+    def handle_blockchain_progress(self, network_blockstamp):
         """
-        Handle a new current block uid
+        Handle a new current block uid : raise the target head of the catch-up worker,
+        which is started if it is not running yet
 
         :param duniterpy.documents.BlockUID network_blockstamp:
         """
-        if self._blockchain_processor.initialized(self.currency) and not self._update_lock:
+        if not self._target_head or network_blockstamp > self._target_head:
+            self._target_head = network_blockstamp
+        self._target_changed.set()
+        if not self._catch_up_task or self._catch_up_task.done():
+            self._catch_up_task = asyncio.ensure_future(self.catch_up_worker())
+
+    async def catch_up_worker(self):
+        """
+        Catch-up worker of the currency : loops until the local head reaches the target head.
+        Targets raised during a catch-up are handled right after it,
+        so no new head is missed and a single catch-up runs at a time.
+        """
+        while True:
+            await self._target_changed.wait()
+            self._target_changed.clear()
+            if self._rollback:
+                rollback, self._rollback = self._rollback, None
+                try:
+                    await self.invalidate_fork(*rollback)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._logger.error(str(e))
+            while self._blockchain_processor.initialized(self.currency) \
+                    and self._target_head > self.current_buid():
+                local_head = self.current_buid()
+                try:
+                    if not await self.catch_up(self._target_head) or self.current_buid() == local_head:
+                        break
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._logger.error(str(e))
+                    break
+
+    async def stop_coroutines(self):
+        """
+        Stop the catch-up worker
+        """
+        if self._catch_up_task:
+            self._catch_up_task.cancel()
             try:
-                self._update_lock = True
-                block_numbers = await self.new_blocks(network_blockstamp)
-                while block_numbers:
-                    start = self.current_buid().number
-                    self._logger.debug("Parsing from {0}".format(start))
-                    blocks = await self._blockchain_processor.next_blocks(start, block_numbers, self.currency)
+                await self._catch_up_task
+            except asyncio.CancelledError:
+                pass
+            self._catch_up_task = None
+
+    async def catch_up(self, network_blockstamp):
+        """
+        Download and handle the blocks from the local head up to a given block uid
+
+        The blocks are handled through a pipeline : the next windows of blocks
+        are downloaded and parsed while the current one is handled and committed.
+
+        :param duniterpy.documents.BlockUID network_blockstamp:
+        :return: False if the blocks could not be downloaded
+        :rtype: bool
+        """
+        windows = []
+        parsing = None
+        parsed_windows = None
+        try:
+            block_numbers = set(await self.new_blocks(network_blockstamp))
+            if block_numbers:
+                start = self.current_buid()
+                self._logger.debug("Parsing from {0}".format(start.number))
+                start_time = time.monotonic()
+                lookahead = asyncio.Semaphore(BlockchainService.PREFETCH_WINDOWS)
+                parsed_windows = asyncio.Queue(maxsize=BlockchainService.PARSED_WINDOWS)
+                windows = self._blockchain_processor.download_blocks(self.currency, start, network_blockstamp,
+                                                                     lookahead)
+                parsing = asyncio.ensure_future(self._parse_windows(windows, block_numbers,
+                                                                    lookahead, parsed_windows))
+                blocks = await parsed_windows.get()
+                while blocks is not None:
+                    if isinstance(blocks, BaseException):
+                        raise blocks
                     if len(blocks) > 0:
-                        identities = await self._identities_service.handle_new_blocks(blocks)
-                        changed_tx, new_tx, new_dividends = await self._transactions_service.handle_new_blocks(blocks)
-                        new_tx += await self._sources_service.refresh_sources(new_tx, new_dividends)
-                        self.handle_new_blocks(blocks)
-                        self.app.db.commit()
-                        for tx in changed_tx:
-                            self.app.transaction_state_changed.emit(tx)
-                        for tx in new_tx:
-                            self.app.new_transfer.emit(tx)
-                        for ud in new_dividends:
-                            self.app.new_dividend.emit(ud)
-                        for idty in identities:
-                            self.app.identity_changed.emit(idty)
-                        self.app.new_blocks_handled.emit()
-                        block_numbers = await self.new_blocks(network_blockstamp)
-                self.app.sources_refreshed.emit()
-            except (NoPeerAvailable, DuniterError) as e:
-                self._logger.debug(str(e))
-            finally:
-                self._update_lock = False
+                        await self._handle_blocks(blocks)
+                    blocks = await parsed_windows.get()
+                nb_blocks = network_blockstamp.number - start.number
+                elapsed = time.monotonic() - start_time
+                self._logger.debug("Handled {0} blocks in {1:.1f}s ({2:.1f} blocks/s)"
+                                   .format(nb_blocks, elapsed, nb_blocks / max(elapsed, 0.001)))
+            self.app.sources_refreshed.emit()
+            return True
+        except (NoPeerAvailable, DuniterError) as e:
+            self._logger.debug(str(e))
+            return False
+        finally:
+            if parsing:
+                parsing.cancel()
+                # Free the queue so that the producer can put the end of the pipeline and stop
+                while not parsed_windows.empty():
+                    parsed_windows.get_nowait()
+            for window in windows:
+                window.cancel()
+
+    async def _parse_windows(self, windows, block_numbers, lookahead, parsed_windows):
+        """
+        Producer of the blocks pipeline : parse the windows of blocks in order as they are downloaded
+        :param List[asyncio.Future] windows: the windows of blocks in json format
+        :param set[int] block_numbers: the numbers of the blocks to parse
+        :param asyncio.Semaphore lookahead: the semaphore bounding the windows downloaded in advance
+        :param asyncio.Queue parsed_windows: the queue of parsed blocks. None is put after the last window,
+        and the error is put if a window could not be downloaded or parsed.
+        """
+        end = None
+        try:
+            for window in windows:
+                blocks_data = await window
+                lookahead.release()
+                blocks = self._blockchain_processor.parse_blocks(self.currency, blocks_data, block_numbers)
+                await parsed_windows.put(blocks)
+        except asyncio.CancelledError as e:
+            end = e
+            raise
+        except Exception as e:
+            end = e
+        finally:
+            # The consumer waits for the end of the pipeline, whatever stopped the producer
+            await parsed_windows.put(end)
+
+    async def _handle_blocks(self, blocks):
+        """
+        Consumer of the blocks pipeline : update the local data from a window of parsed blocks
+        :param List[duniterpy.documents.Block] blocks: the parsed blocks
+        """
+        identities = await self._identities_service.handle_new_blocks(blocks)
+        changed_tx, new_tx, new_dividends = await self._transactions_service.handle_new_blocks(blocks)
+        new_tx += await self._sources_service.refresh_sources(new_tx, new_dividends)
+        self.handle_new_blocks(blocks)
+        self.app.db.commit()
+        for tx in changed_tx:
+            self.app.transaction_state_changed.emit(tx)
+        for tx in new_tx:
+            self.app.new_transfer.emit(tx)
+        for ud in new_dividends:
+            self.app.new_dividend.emit(ud)
+        for idty in identities:
+            self.app.identity_changed.emit(idty)
+        self.app.new_blocks_handled.emit()
+
+    def handle_rollback(self, network_blockstamp, previous_blockstamp):
+        """
+        Handle a rollback of the network : cached blocks, headers and blocks lists from the fork point
+        are not valid anymore. They are invalidated by the catch-up worker before its next catch-up.
+
+        :param duniterpy.documents.BlockUID network_blockstamp: the new current block uid
+        :param duniterpy.documents.BlockUID previous_blockstamp: the previous current block uid
+        """
+        self._target_head = network_blockstamp
+        if not self._rollback or previous_blockstamp > self._rollback[1]:
+            self._rollback = (network_blockstamp, previous_blockstamp)
+        else:
+            self._rollback = (network_blockstamp, self._rollback[1])
+        self._target_changed.set()
+        if not self._catch_up_task or self._catch_up_task.done():
+            self._catch_up_task = asyncio.ensure_future(self.catch_up_worker())
+
+    async def invalidate_fork(self, network_blockstamp, previous_blockstamp):
+        """
+        Invalidate the cached blocks, headers and blocks lists from the fork point of a rollback
+        :param duniterpy.documents.BlockUID network_blockstamp: the new current block uid
+        :param duniterpy.documents.BlockUID previous_blockstamp: the previous current block uid
+        """
+        fork_number = await self._blockchain_processor.fork_point(self.currency, network_blockstamp,
+                                                                  previous_blockstamp)
+        self._logger.debug("Invalidating the fork from {0}".format(fork_number))
+        self._bma_connector.invalidate_blocks(self.currency, fork_number)
+        self._blockchain_processor.invalidate_blocks_lists(self.currency, fork_number)
 
     def current_buid(self):
         return self._blockchain_processor.current_buid(self.currency)
@@ -43,7 +43,7 @@ class DocumentsService:
         Instanciate a blockchain processor
         :param sakia.app.Application app: the app
         """
-        return cls(BmaConnector(NodesProcessor(app.db.nodes_repo), app.parameters),
+        return cls(app.bma_connector,
                    BlockchainProcessor.instanciate(app),
                    IdentitiesProcessor.instanciate(app),
                    CertificationsProcessor.instanciate(app),
@@ -268,8 +268,7 @@ class IdentitiesService(QObject):
                 identities.append(certified)
 
         log_stream("Commiting identities...")
-        for idty in identities:
-            self._identities_processor.insert_or_update_identity(idty)
+        self._identities_processor.insert_or_update_identities(identities)
 
     def _parse_revocations(self, block):
         """
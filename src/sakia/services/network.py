@@ -1,17 +1,239 @@
 import asyncio
 import logging
+import random
 import time
-from collections import Counter
+import heapq
+from collections import Counter, OrderedDict
 
 from PyQt5.QtCore import pyqtSignal, pyqtSlot, QObject
 from duniterpy.api import errors
 from duniterpy.key import VerifyingKey
-from sakia.data.connectors import NodeConnector
+from sakia.data.connectors import NodeConnector, BlocksFanIn, PeersLeaves
 from sakia.data.entities import Node
 from sakia.decorators import asyncify
 from sakia.errors import InvalidNodeCurrency
 
 
+class DiscoveryQueue:
+    """
+    The queue of the peers documents to discover.
+    A single document is kept per pubkey, the one with the most recent blockstamp,
+    and the documents already handled are ignored.
+    """
+    # Peers documents waiting in the queue
+    MAX_PEERS = 1000
+    # Signatures of the handled documents kept to ignore them
+    MAX_HANDLED = 10000
+
+    def __init__(self):
+        self._peers = {}
+        self._handled = OrderedDict()
+
+    def __len__(self):
+        return len(self._peers)
+
+    def push(self, peer):
+        """
+        Add a peer document to the queue
+        :param duniterpy.documents.Peer peer: the peer document
+        :return: True if the document was queued
+        :rtype: bool
+        """
+        if peer.signatures[0] in self._handled:
+            return False
+        queued = self._peers.get(peer.pubkey)
+        if queued:
+            if not queued.blockUID < peer.blockUID:
+                return False
+        elif len(self._peers) >= DiscoveryQueue.MAX_PEERS:
+            return False
+        self._peers[peer.pubkey] = peer
+        return True
+
+    def pop_batch(self, size):
+        """
+        Remove the peers documents with the most recent blockstamps from the queue
+        :param int size: the maximum number of documents
+        :rtype: List[duniterpy.documents.Peer]
+        """
+        peers = heapq.nlargest(size, self._peers.values(), key=lambda p: p.blockUID.number)
+        for peer in peers:
+            del self._peers[peer.pubkey]
+            self._handled[peer.signatures[0]] = True
+            if len(self._handled) > DiscoveryQueue.MAX_HANDLED:
+                self._handled.popitem(last=False)
+        return peers
+
+
+class HeadTracker:
+    """
+    Tracks the consensus head of the network : the block of the majority of the online nodes.
+    The votes are updated when the head of a node changes, and only the nodes whose
+    sync state flips are returned to be saved.
+    """
+    def __init__(self):
+        self._nodes = {}
+        self._heads = {}
+        self._voters = {}
+        self._votes = Counter()
+        self._majority = None
+
+    @property
+    def majority(self):
+        """
+        :return: the hash of the block of the majority of the online nodes, None if no node has a block
+        :rtype: str
+        """
+        return self._majority
+
+    def _elect(self):
+        """
+        Elect the hash of the majority. The current majority is kept while it is not outnumbered.
+        """
+        if not self._votes:
+            return None
+        most_votes = max(self._votes.values())
+        if self._majority and self._votes[self._majority] == most_votes:
+            return self._majority
+        return next(h for h, count in self._votes.items() if count == most_votes)
+
+    def update(self, node):
+        """
+        Update the vote of a node after a change of its state or of its head
+        :param sakia.data.entities.Node node: the node
+        :return: the nodes whose sync state flipped
+        :rtype: List[sakia.data.entities.Node]
+        """
+        pubkey = node.pubkey
+        if pubkey in self._heads:
+            previous_head = self._heads.pop(pubkey)
+            self._voters[previous_head].discard(pubkey)
+            if previous_head:
+                self._votes[previous_head] -= 1
+                if self._votes[previous_head] == 0:
+                    del self._votes[previous_head]
+            del self._nodes[pubkey]
+
+        candidates = set()
+        if node.state in (Node.ONLINE, Node.DESYNCED):
+            head = node.current_buid.sha_hash if node.current_buid else None
+            self._nodes[pubkey] = node
+            self._heads[pubkey] = head
+            self._voters.setdefault(head, set()).add(pubkey)
+            if head:
+                self._votes[head] += 1
+            candidates.add(pubkey)
+
+        majority = self._elect()
+        if majority != self._majority:
+            for head in (self._majority, majority):
+                candidates.update(self._voters.get(head, ()))
+            if self._majority is None or majority is None:
+                candidates.update(self._voters.get(None, ()))
+            self._majority = majority
+
+        flipped = []
+        for pubkey in candidates:
+            voter = self._nodes[pubkey]
+            if self._majority is None or self._heads[pubkey] == self._majority:
+                state = Node.ONLINE
+            else:
+                state = Node.DESYNCED
+            if voter.state != state:
+                voter.state = state
+                flipped.append(voter)
+        return flipped
+
+
+def verify_peers(peers):
+    """
+    Verify the signatures of peers documents.
+    A document whose verification fails, for example because of a malformed public key, is invalid.
+    :param List[duniterpy.documents.Peer] peers: the peers documents
+    :return: the verdicts, in the order of the documents
+    :rtype: List[bool]
+    """
+    verdicts = []
+    for peer in peers:
+        try:
+            verdicts.append(VerifyingKey(peer.pubkey).verify_document(peer))
+        except Exception as e:
+            logging.getLogger('sakia').debug("Could not verify peer {0} : {1}".format(peer.pubkey[:5], str(e)))
+            verdicts.append(False)
+    return verdicts
+
+
+class PeersVerifier:
+    """
+    Verifies the signatures of the peers documents out of the event loop thread.
+    The documents received together are verified by batches, and the verdicts are remembered
+    so a document received again is not verified twice.
+    """
+    # Verdicts kept
+    MAX_VERDICTS = 10000
+    # Delay in seconds during which the received documents are grouped in a batch
+    BATCH_DELAY = 0.1
+
+    def __init__(self, verified, executor=None):
+        """
+        :param verified: the function called with each verified document and its verdict
+        :param concurrent.futures.Executor executor: the executor running the verifications,
+        the default executor of the event loop if None
+        """
+        self._verified = verified
+        self._executor = executor
+        self._verdicts = OrderedDict()
+        self._pending = OrderedDict()
+        self._batches_task = None
+
+    def verdict(self, peer):
+        """
+        Get the remembered verdict of a peer document
+        :param duniterpy.documents.Peer peer: the peer document
+        :return: the verdict, None if the document was never verified
+        :rtype: bool
+        """
+        key = (peer.pubkey, peer.signatures[0])
+        if key in self._verdicts:
+            self._verdicts.move_to_end(key)
+            return self._verdicts[key]
+
+    def submit(self, peer):
+        """
+        Submit a peer document to the verification.
+        The verdict is passed to the verified function, directly if it is remembered.
+        :param duniterpy.documents.Peer peer: the peer document
+        """
+        verdict = self.verdict(peer)
+        if verdict is not None:
+            self._verified(peer, verdict)
+            return
+        key = (peer.pubkey, peer.signatures[0])
+        if key not in self._pending:
+            self._pending[key] = peer
+            if not self._batches_task or self._batches_task.done():
+                self._batches_task = asyncio.ensure_future(self._verify_batches())
+
+    async def _verify_batches(self):
+        """
+        Verify the pending documents in the executor, by batches
+        """
+        await asyncio.sleep(PeersVerifier.BATCH_DELAY)
+        while self._pending:
+            batch = list(self._pending.items())
+            try:
+                verdicts = await asyncio.get_event_loop().run_in_executor(self._executor, verify_peers,
+                                                                          [peer for key, peer in batch])
+            finally:
+                for key, peer in batch:
+                    self._pending.pop(key, None)
+            for (key, peer), verdict in zip(batch, verdicts):
+                self._verdicts[key] = verdict
+                if len(self._verdicts) > PeersVerifier.MAX_VERDICTS:
+                    self._verdicts.popitem(last=False)
+                self._verified(peer, verdict)
+
+
 class NetworkService(QObject):
     """
     A network is managing nodes polling and crawling of a
@@ -20,7 +242,27 @@ class NetworkService(QObject):
     nodes_changed = pyqtSignal()
     root_nodes_changed = pyqtSignal()
 
-    def __init__(self, app, currency, node_processor, connectors, blockchain_service, identities_service):
+    # Delay in seconds between two refreshes of a node
+    REFRESH_INTERVAL = 60
+    MIN_REFRESH_INTERVAL = 15
+    MAX_REFRESH_INTERVAL = 600
+    # Part of the refresh delay drawn at random
+    REFRESH_JITTER = 0.2
+    # Nodes refreshed at the same time
+    REFRESH_CONCURRENCY = 8
+    # Delay in seconds after which the requests of a refresh are cancelled
+    REFRESH_TIMEOUT = 10
+    # Delay in seconds between two checks of the nodes to refresh
+    SCHEDULER_TICK = 1
+    # Peers of the discovery queue handled at a time
+    DISCOVERY_BATCH = 20
+    # Delay in seconds between two checks of an empty discovery queue
+    DISCOVERY_DELAY = 1
+    # Delay in seconds between two writes of the changes of the nodes to the database
+    NODES_FLUSH_INTERVAL = 30
+
+    def __init__(self, app, currency, node_processor, connectors, blockchain_service, identities_service,
+                 blocks_fan_in=None, peers_leaves=None):
         """
         Constructor of a network
 
@@ -30,21 +272,29 @@ class NetworkService(QObject):
         :param list connectors: The connectors to nodes of the network
         :param sakia.services.BlockchainService blockchain_service: the blockchain service
         :param sakia.services.IdentitiesService identities_service: the identities service
+        :param sakia.data.connectors.BlocksFanIn blocks_fan_in: the fan-in of the blocks notified by the connectors
+        :param sakia.data.connectors.PeersLeaves peers_leaves: the merkle leaves of peers fetched by the connectors
         """
         super().__init__()
         self._app = app
         self._logger = logging.getLogger('sakia')
         self._processor = node_processor
+        self._head_tracker = HeadTracker()
+        self._blocks_fan_in = blocks_fan_in if blocks_fan_in else BlocksFanIn()
+        self._blocks_fan_in.nodes_changed.connect(self.handle_blocks_changes)
+        self._peers_leaves = peers_leaves if peers_leaves else PeersLeaves()
         self._connectors = []
         for c in connectors:
             self.add_connector(c)
         self.currency = currency
         self._must_crawl = False
         self._block_found = self._processor.current_buid(self.currency)
-        self._discovery_stack = []
+        self._discovery_queue = DiscoveryQueue()
+        self._peers_verifier = PeersVerifier(self.handle_verified_peer)
         self._blockchain_service = blockchain_service
         self._identities_service = identities_service
         self._discovery_loop_task = None
+        self._next_refresh = {}
 
     @classmethod
     def create(cls, node_processor, node_connector):
@@ -74,9 +324,15 @@ class NetworkService(QObject):
         """
 
         connectors = []
+        blocks_fan_in = BlocksFanIn()
+        peers_leaves = PeersLeaves()
         for node in node_processor.nodes(currency):
-            connectors.append(NodeConnector(node, app.parameters))
-        network = cls(app, currency, node_processor, connectors, blockchain_service, identities_service)
+            connectors.append(NodeConnector(node, app.parameters,
+                                            circuit_breakers=app.bma_connector.circuit_breakers,
+                                            blocks_fan_in=blocks_fan_in,
+                                            peers_leaves=peers_leaves))
+        network = cls(app, currency, node_processor, connectors, blockchain_service, identities_service,
+                      blocks_fan_in, peers_leaves)
         return network
 
     def start_coroutines(self):
@@ -114,49 +370,28 @@ class NetworkService(QObject):
     def continue_crawling(self):
         return self._must_crawl
 
-    def _check_nodes_sync(self):
-        """
-        Check nodes sync with the following rules :
-        1 : The block of the majority
-        2 : The more last different issuers
-        3 : The more difficulty
-        4 : The biggest number or timestamp
-        """
-        online_nodes = self._processor.online_nodes(self.currency)
-        # rule number 1 : block of the majority
-        blocks = [n.current_buid.sha_hash for n in online_nodes if n.current_buid.sha_hash]
-        blocks_occurences = Counter(blocks)
-        blocks_by_occurences = {}
-        for key, value in blocks_occurences.items():
-            the_block = [n.current_buid.sha_hash
-                         for n in online_nodes if n.current_buid.sha_hash == key][0]
-            if value not in blocks_by_occurences:
-                blocks_by_occurences[value] = [the_block]
-            else:
-                blocks_by_occurences[value].append(the_block)
-
-        if len(blocks_by_occurences) == 0:
-            for n in [n for n in online_nodes if n.state in (Node.ONLINE, Node.DESYNCED)]:
-                n.state = Node.ONLINE
-                self._processor.update_node(n)
-            return
-
-        most_present = max(blocks_by_occurences.keys())
-
-        synced_block_hash = blocks_by_occurences[most_present][0]
-
-        for n in online_nodes:
-            if n.current_buid.sha_hash == synced_block_hash:
-                n.state = Node.ONLINE
-            else:
-                n.state = Node.DESYNCED
-            self._processor.update_node(n)
+    def _track_heads(self, nodes):
+        """
+        Update the consensus head tracker with changed nodes
+        and save the other nodes whose sync state flipped
+        :param List[sakia.data.entities.Node] nodes: the changed nodes
+        """
+        flipped = {}
+        for node in nodes:
+            for flipped_node in self._head_tracker.update(node):
+                flipped[flipped_node.pubkey] = flipped_node
+        for node in nodes:
+            flipped.pop(node.pubkey, None)
+        for node in flipped.values():
+            self._processor.update_node(node)
 
     def add_connector(self, node_connector):
         """
         Add a nod to the network.
         """
         self._connectors.append(node_connector)
+        for node in self._head_tracker.update(node_connector.node):
+            self._processor.update_node(node)
         node_connector.changed.connect(self.handle_change)
         node_connector.error.connect(self.handle_error)
         node_connector.identity_changed.connect(self.handle_identity_change)
@@ -174,66 +409,149 @@ class NetworkService(QObject):
         """
         Start crawling which never stops.
         To stop this crawling, call "stop_crawling" method.
+
+        The nodes are refreshed concurrently, each one at its own interval,
+        with at most REFRESH_CONCURRENCY refreshes running at a time.
         """
         self._must_crawl = True
-        first_loop = True
         asyncio.ensure_future(self.discovery_loop())
+        asyncio.ensure_future(self.flush_loop())
+        semaphore = asyncio.Semaphore(NetworkService.REFRESH_CONCURRENCY)
+        refreshing = {}
         while self.continue_crawling():
+            now = time.monotonic()
             for connector in self._connectors:
+                if connector not in refreshing and self._next_refresh.get(connector, 0) <= now:
+                    task = asyncio.ensure_future(self.refresh_connector(connector, semaphore))
+                    task.add_done_callback(lambda t, c=connector: refreshing.pop(c, None))
+                    refreshing[connector] = task
+            await asyncio.sleep(NetworkService.SCHEDULER_TICK)
+
+        for task in list(refreshing.values()):
+            task.cancel()
+        self._logger.debug("End of network discovery")
+
+    async def refresh_connector(self, connector, semaphore):
+        """
+        Refresh a node and schedule its next refresh
+        :param sakia.data.connectors.NodeConnector connector: the connector of the node
+        :param asyncio.Semaphore semaphore: the semaphore bounding the concurrent refreshes
+        """
+        try:
+            async with semaphore:
                 if self.continue_crawling():
                     await connector.init_session()
-                    connector.refresh()
-                    if not first_loop:
-                        await asyncio.sleep(15)
-            first_loop = False
-            await asyncio.sleep(15)
-
-        self._logger.debug("End of network discovery")
+                    tasks = connector.refresh()
+                    if tasks:
+                        _, pending = await asyncio.wait(tasks, timeout=NetworkService.REFRESH_TIMEOUT)
+                        # The refresh slot is released only once the late requests are cancelled
+                        for task in pending:
+                            task.cancel()
+                        if pending:
+                            await asyncio.wait(pending)
+        finally:
+            self._next_refresh[connector] = time.monotonic() + self.refresh_interval(connector)
+
+    def refresh_interval(self, connector):
+        """
+        Compute the delay before the next refresh of a node.
+        It is shorter for the nodes on the consensus head and with a connected websocket,
+        and longer for the offline or corrupted nodes. A random jitter spreads the refreshes.
+        :param sakia.data.connectors.NodeConnector connector: the connector of the node
+        :return: the delay in seconds
+        :rtype: float
+        """
+        node = connector.node
+        interval = NetworkService.REFRESH_INTERVAL
+        if node.state in (Node.OFFLINE, Node.CORRUPTED):
+            interval *= 4
+        else:
+            if node.current_buid and abs(self._block_found.number - node.current_buid.number) <= 1:
+                interval /= 2
+            if connector.block_ws_connected():
+                interval /= 2
+        interval = max(NetworkService.MIN_REFRESH_INTERVAL, min(NetworkService.MAX_REFRESH_INTERVAL, interval))
+        return interval * random.uniform(1 - NetworkService.REFRESH_JITTER, 1 + NetworkService.REFRESH_JITTER)
+
+    async def flush_loop(self):
+        """
+        Write the changes of the nodes to the database at regular intervals.
+        The nodes changes are kept in memory in between.
+        """
+        while self.continue_crawling():
+            await asyncio.sleep(NetworkService.NODES_FLUSH_INTERVAL)
+            self._app.db.commit()
 
     async def discovery_loop(self):
         """
-        Handle poping of nodes in discovery stack
+        Handle the peers of the discovery queue, by batches
         :return:
         """
         while self.continue_crawling():
-            try:
-                await asyncio.sleep(1)
-                peer = self._discovery_stack.pop()
+            peers = self._discovery_queue.pop_batch(NetworkService.DISCOVERY_BATCH)
+            if not peers:
+                await asyncio.sleep(NetworkService.DISCOVERY_DELAY)
+                continue
+            nodes = []
+            new_connectors = []
+            for peer in peers:
                 node = self._processor.update_peer(self.currency, peer)
                 if not node:
                     self._logger.debug("New node found : {0}".format(peer.pubkey[:5]))
                     try:
-                        connector = NodeConnector.from_peer(self.currency, peer, self._app.parameters)
+                        connector = NodeConnector.from_peer(self.currency, peer, self._app.parameters,
+                                                            self._app.bma_connector.circuit_breakers,
+                                                            self._blocks_fan_in, self._peers_leaves)
                         node = connector.node
                         self._processor.insert_node(connector.node)
-                        await connector.init_session()
-                        connector.refresh(manual=True)
-                        self.add_connector(connector)
-                        self.nodes_changed.emit()
+                        new_connectors.append(connector)
                     except InvalidNodeCurrency as e:
                         self._logger.debug(str(e))
-                if node and self._blockchain_service.initialized():
-                    try:
-                        identity = await self._identities_service.find_from_pubkey(node.pubkey)
-                        identity = await self._identities_service.load_requirements(identity)
-                        node.member = identity.member
-                        node.uid = identity.uid
-                        self._processor.update_node(node)
-                        self.nodes_changed.emit()
-                    except errors.DuniterError as e:
-                        self._logger.error(e.message)
-
-                self._app.db.commit()
-            except IndexError:
-                await asyncio.sleep(2)
+                if node:
+                    nodes.append(node)
+
+            for connector in new_connectors:
+                await connector.init_session()
+                connector.refresh(manual=True)
+                self.add_connector(connector)
+
+            if nodes and self._blockchain_service.initialized():
+                results = await asyncio.gather(*[self.load_node_identity(node) for node in nodes],
+                                               return_exceptions=True)
+                for node, result in zip(nodes, results):
+                    if isinstance(result, Exception):
+                        self._logger.debug("Could not load the identity of node {0} : {1}"
+                                           .format(node.pubkey[:5], str(result)))
+                    self._processor.update_node(node)
+
+            self._app.db.commit()
+            self.nodes_changed.emit()
+
+    async def load_node_identity(self, node):
+        """
+        Load the identity of the owner of a node
+        :param sakia.data.entities.Node node: the node
+        """
+        try:
+            identity = await self._identities_service.find_from_pubkey(node.pubkey)
+            identity = await self._identities_service.load_requirements(identity)
+            node.member = identity.member
+            node.uid = identity.uid
+        except errors.DuniterError as e:
+            self._logger.error(e.message)
 
     def handle_new_node(self, peer):
-        key = VerifyingKey(peer.pubkey)
-        if key.verify_document(peer):
-            if len(self._discovery_stack) < 1000 \
-            and peer.signatures[0] not in [p.signatures[0] for p in self._discovery_stack]:
+        self._peers_verifier.submit(peer)
+
+    def handle_verified_peer(self, peer, valid):
+        """
+        Handle a peer document after the verification of its signature
+        :param duniterpy.documents.Peer peer: the peer document
+        :param bool valid: True if the signature is valid
+        """
+        if valid:
+            if self._discovery_queue.push(peer):
                 self._logger.debug("Stacking new peer document : {0}".format(peer.pubkey))
-                self._discovery_stack.append(peer)
         else:
             self._logger.debug("Wrong document received : {0}".format(peer.signed_raw()))
 
@@ -255,25 +573,49 @@ class NetworkService(QObject):
     def handle_change(self):
         node_connector = self.sender()
 
-        if node_connector.node.state in (Node.ONLINE, Node.DESYNCED):
-            self._check_nodes_sync()
+        self._track_heads([node_connector.node])
         self.nodes_changed.emit()
         self._processor.update_node(node_connector.node)
 
         if node_connector.node.state == Node.ONLINE:
-            current_buid = self._processor.current_buid(self.currency)
-            self._logger.debug("{0} -> {1}".format(self._block_found.sha_hash[:10], current_buid.sha_hash[:10]))
-            if self._block_found.sha_hash != current_buid.sha_hash:
-                self._logger.debug("Latest block changed : {0}".format(current_buid.number))
-                # If new latest block is lower than the previously found one
-                # or if the previously found block is different locally
-                # than in the main chain, we declare a rollback
-                if current_buid < self._block_found \
-                   or node_connector.node.previous_buid != self._block_found:
-                    self._logger.debug("Start rollback")
-                    self._block_found = current_buid
-                    #TODO: self._blockchain_service.rollback()
-                else:
-                    self._logger.debug("Start refresh")
-                    self._block_found = current_buid
-                    asyncio.ensure_future(self._blockchain_service.handle_blockchain_progress(self._block_found))
+            self._check_current_block([node_connector.node])
+
+    @pyqtSlot(list)
+    def handle_blocks_changes(self, node_connectors):
+        """
+        Handle the nodes updated in one batch by a block notified to the blocks fan-in
+        :param List[sakia.data.connectors.NodeConnector] node_connectors: the connectors of the updated nodes
+        """
+        nodes = [c.node for c in node_connectors]
+        self._track_heads(nodes)
+        for node in nodes:
+            self._processor.update_node(node)
+        self.nodes_changed.emit()
+
+        online_nodes = [n for n in nodes if n.state == Node.ONLINE]
+        if online_nodes:
+            self._check_current_block(online_nodes)
+
+    def _check_current_block(self, nodes):
+        """
+        Check if the current block of the network changed after a change of online nodes
+        :param List[sakia.data.entities.Node] nodes: the changed online nodes
+        """
+        current_buid = self._processor.current_buid(self.currency)
+        self._logger.debug("{0} -> {1}".format(self._block_found.sha_hash[:10], current_buid.sha_hash[:10]))
+        if self._block_found.sha_hash != current_buid.sha_hash:
+            self._logger.debug("Latest block changed : {0}".format(current_buid.number))
+            # If new latest block is not above the previously found one
+            # or if the block following the previously found one is not linked to it, we declare a rollback.
+            # When the latest block skipped blocks, the catch-up checks the links of the chain from the local head.
+            successors = [n for n in nodes if n.current_buid == current_buid and n.previous_buid
+                          and n.previous_buid.number == self._block_found.number]
+            if current_buid <= self._block_found \
+               or any(n.previous_buid != self._block_found for n in successors):
+                self._logger.debug("Start rollback")
+                self._blockchain_service.handle_rollback(current_buid, self._block_found)
+                self._block_found = current_buid
+            else:
+                self._logger.debug("Start refresh")
+                self._block_found = current_buid
+                self._blockchain_service.handle_blockchain_progress(self._block_found)
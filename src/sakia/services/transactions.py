@@ -1,7 +1,7 @@
 from PyQt5.QtCore import QObject
 from sakia.data.entities.transaction import parse_transaction_doc
 from duniterpy.documents import Transaction as TransactionDoc
-from duniterpy.documents import SimpleTransaction, Block
+from duniterpy.documents import SimpleTransaction
 from sakia.data.entities import Dividend
 from duniterpy.api import bma
 import logging
@@ -14,7 +14,7 @@ class TransactionsService(QObject):
     to update data locally
     """
     def __init__(self, currency, transactions_processor, dividends_processor,
-                 identities_processor, connections_processor, bma_connector):
+                 identities_processor, connections_processor, blockchain_processor, bma_connector):
         """
         Constructor the identities service
 
@@ -23,6 +23,7 @@ class TransactionsService(QObject):
         :param sakia.data.processors.TransactionsProcessor transactions_processor: the transactions processor for given currency
         :param sakia.data.processors.DividendsProcessor dividends_processor: the dividends processor for given currency
         :param sakia.data.processors.ConnectionsProcessor connections_processor: the connections processor for given currency
+        :param sakia.data.processors.BlockchainProcessor blockchain_processor: the blockchain processor for given currency
         :param sakia.data.connectors.BmaConnector bma_connector: The connector to BMA API
         """
         super().__init__()
@@ -30,6 +31,7 @@ class TransactionsService(QObject):
         self._dividends_processor = dividends_processor
         self._identities_processor = identities_processor
         self._connections_processor = connections_processor
+        self._blockchain_processor = blockchain_processor
         self._bma_connector = bma_connector
         self.currency = currency
         self._logger = logging.getLogger('sakia')
@@ -116,16 +118,16 @@ class TransactionsService(QObject):
                         try:
                             # we try to get the block of the dividend
                             block = next((b for b in blocks if b.number == input.index))
+                            timestamp, amount, base = block.mediantime, block.ud, block.unit_base
                         except StopIteration:
-                            block_data = await self._bma_connector.get(self.currency, bma.blockchain.block,
-                                                                  req_args={'number': input.index})
-                            block = Block.from_signed_raw(block_data["raw"] + block_data["signature"] + "\n")
+                            header = await self._blockchain_processor.block_header(self.currency, input.index)
+                            timestamp, amount, base = header.median_time, header.dividend, header.unit_base
                         dividend = Dividend(currency=self.currency,
                                             pubkey=pubkey,
                                             block_number=input.index,
-                                            timestamp=block.mediantime,
-                                            amount=block.ud,
-                                            base=block.unit_base)
+                                            timestamp=timestamp,
+                                            amount=amount,
+                                            base=base)
                         self._logger.debug("Dividend of block {0}".format(dividend.block_number))
                         if self._dividends_processor.commit(dividend):
                             dividends.append(dividend)
@@ -147,4 +149,15 @@ class TransactionsService(QObject):
         :return: the list of Dividend entities
         :rtype: List[sakia.data.entities.Dividend]
         """
-        return self._dividends_processor.dividends(self.currency, pubkey)
\ No newline at end of file
+        return self._dividends_processor.dividends(self.currency, pubkey)
+
+    async def load_history(self, pubkey):
+        """
+        Get all transfers and dividends of a given pubkey, read in the database thread
+        :param str pubkey:
+        :return: the list of Transaction entities and the list of Dividend entities
+        :rtype: Tuple[List[sakia.data.entities.Transaction], List[sakia.data.entities.Dividend]]
+        """
+        transfers = await self._transactions_processor.load_transfers(self.currency, pubkey)
+        dividends = await self._dividends_processor.load_dividends(self.currency, pubkey)
+        return transfers, dividends
@@ -0,0 +1,105 @@
+"""
+Benchmark of the comparison of the answers of the nodes in verified requests :
+deepcopy filtering and make_hash (previous behaviour) versus the canonical digest.
+
+Reports the CPU time spent per answer on tx.history and wot.requirements
+payloads of 10k entries.
+
+Usage : python tests/benchmarks/bench_answer_digest.py [nb_entries]
+"""
+import copy
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from duniterpy.api import bma
+from sakia.data.connectors.bma import answer_digest
+
+
+def make_hash(o):
+    if isinstance(o, (set, tuple, list)):
+        return tuple(sorted([make_hash(e) for e in o]))
+    elif not isinstance(o, dict):
+        return hash(o)
+
+    new_o = copy.deepcopy(o)
+    for k, v in new_o.items():
+        new_o[k] = make_hash(v)
+
+    return hash(tuple(frozenset(sorted(new_o.items()))))
+
+
+def filter_data(request, data):
+    filtered = data
+    if request is bma.tx.history:
+        filtered = copy.deepcopy(data)
+        filtered["history"].pop("sending")
+        filtered["history"].pop("receiving")
+        filtered["history"].pop("pending")
+    elif request is bma.wot.requirements:
+        filtered = copy.deepcopy(data)
+        for idty in filtered["identities"]:
+            for c in idty["certifications"]:
+                c.pop("expiresIn")
+            idty.pop('membershipPendingExpiresIn')
+    return filtered
+
+
+def transaction(i):
+    return {"version": 10,
+            "locktime": 0,
+            "blockstamp": "{0}-00000A7E18E5E9C7C4C1B2D8E1D1A3F43F8DF9A6F2B4C1B9D7E4A1F6B0C3E2D5".format(i),
+            "blockstampTime": 1488987127 + i,
+            "issuers": ["7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ"],
+            "inputs": ["{0}:0:D:7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ:{1}".format(1000 + i, i)],
+            "outputs": ["{0}:0:SIG(FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn)".format(i),
+                        "{0}:0:SIG(7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ)".format(1000 - i)],
+            "unlocks": ["0:SIG(0)"],
+            "signatures": ["42yQm4hGTJYWkPg39hQAUgP6S6EQ4vTfXdJuxKEHL1ih6YHiDL2hcwrFgBHjXLRgxRhj2VNVqqc6b4JayKqTE14r"],
+            "comment": "Transaction {0}".format(i),
+            "hash": "{0:064X}".format(i),
+            "time": 1488987127 + i,
+            "block_number": i}
+
+
+def tx_history(nb_entries):
+    return {"currency": "test_currency",
+            "pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+            "history": {"sent": [transaction(i) for i in range(0, nb_entries // 2)],
+                        "received": [transaction(i) for i in range(nb_entries // 2, nb_entries)],
+                        "sending": [],
+                        "receiving": [],
+                        "pending": []}}
+
+
+def requirements(nb_entries):
+    return {"identities": [{"pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                            "uid": "john",
+                            "meta": {"timestamp": "0-E3B0C44298FC1C149AFBF4C8996FB92427AE41E4649B934CA495991B7852B855"},
+                            "outdistanced": False,
+                            "certifications": [{"from": "{0:044d}".format(i),
+                                                "to": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                                                "expiresIn": 4000 + i} for i in range(0, nb_entries)],
+                            "membershipPendingExpiresIn": 0,
+                            "membershipExpiresIn": 1000}]}
+
+
+def run(name, function, request, data, nb_runs=5):
+    start = time.process_time()
+    for _ in range(nb_runs):
+        function(request, data)
+    elapsed = (time.process_time() - start) / nb_runs
+    print("{0:<45} {1:>10.1f} ms CPU per answer".format(name, elapsed * 1000))
+    return elapsed
+
+
+if __name__ == '__main__':
+    nb_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, request, data in (("tx.history", bma.tx.history, tx_history(nb_entries)),
+                                ("wot.requirements", bma.wot.requirements, requirements(nb_entries))):
+        before = run("{0} : deepcopy and make_hash".format(name),
+                     lambda r, d: make_hash(filter_data(r, d)), request, data)
+        after = run("{0} : canonical digest".format(name), answer_digest, request, data)
+        print("{0:<45} {1:>10.1f} ms CPU saved per answer".format("", (before - after) * 1000))
@@ -0,0 +1,170 @@
+"""
+Benchmark of the blocks catch-up on a replayed chain :
+the serial loop (previous behaviour) versus the pipeline of BlockchainService.catch_up.
+
+The chain is served by fake nodes answering after a given latency, and the handling
+of each window of blocks by the identities, transactions and sources services is
+simulated by a given delay. The parsing of the blocks, the headers index and the
+commits to the database are the real ones.
+
+Reports the end-to-end blocks per second.
+
+Usage : python tests/benchmarks/bench_blockchain_progress.py [nb_blocks] [latency] [handling_delay]
+"""
+import asyncio
+import hashlib
+import sqlite3
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from duniterpy.api import bma
+from duniterpy.documents import Block, BlockUID
+from sakia.data.connectors import BmaConnector
+from sakia.data.entities import Blockchain, Node, UserParameters
+from sakia.data.processors import BlockchainProcessor, NodesProcessor
+from sakia.data.repositories import SakiaDatabase, BlockchainsRepo, BlockHeadersRepo, BlocksListsRepo, NodesRepo
+from sakia.services import BlockchainService
+
+CURRENCY = "test_currency"
+ISSUER = "HnFcSms8jzwngtVomTTnzudZx7SHUQY8sVE1y8yBmULk"
+SIGNATURE = "1eubHHbuNfilHMM0G2bI30iZzebQ2cQ1PC7uPAw08FGMMmQCRerlF/3pc4sAcsnexsxBseA/3lY03KlONqJBAg=="
+
+
+def forge_chain(nb_blocks):
+    chain = []
+    previous_hash = None
+    for number in range(0, nb_blocks + 1):
+        block = Block(10, CURRENCY, number, 0, 1488987127 + number * 300, 1488987127 + number * 300,
+                      100 if number % 10 == 0 else None, 0, ISSUER, 0, 0, 0,
+                      previous_hash, ISSUER if previous_hash else None,
+                      [0] * 20 if number == 0 else None, 10,
+                      [], [], [], [], [], [], [], [], "0" * 64, 0, SIGNATURE)
+        raw = block.raw()
+        block.inner_hash = hashlib.sha256(raw[:raw.rindex("InnerHash: ")].encode("ascii")).hexdigest().upper()
+        sha_hash = block.proof_of_work()
+        chain.append({"number": number,
+                      "hash": sha_hash,
+                      "previousHash": previous_hash,
+                      "medianTime": block.mediantime,
+                      "membersCount": 10,
+                      "monetaryMass": number * 1000,
+                      "dividend": block.ud,
+                      "unitbase": 0,
+                      "raw": block.raw(),
+                      "signature": SIGNATURE})
+        previous_hash = sha_hash
+    return chain
+
+
+class ReplayBmaConnector(BmaConnector):
+    """
+    Nodes serving the replayed chain after the given latency
+    """
+    def __init__(self, nodes_processor, chain, latency):
+        super().__init__(nodes_processor, UserParameters())
+        self.chain = chain
+        self.latency = latency
+
+    async def _request(self, currency, request, endpoint, req_args, proxy=None):
+        await asyncio.sleep(self.latency)
+        if request is bma.blockchain.blocks:
+            return self.chain[req_args['start']:req_args['start'] + req_args['count']]
+        elif request is bma.blockchain.block:
+            return self.chain[req_args['number']]
+        elif request is bma.blockchain.ud:
+            return {"result": {"blocks": [b['number'] for b in self.chain if b['dividend']]}}
+        else:
+            return {"result": {"blocks": []}}
+
+
+class Signal:
+    def emit(self, *args):
+        pass
+
+
+class FakeApp:
+    def __init__(self, db):
+        self.db = db
+        self.transaction_state_changed = self.new_transfer = self.new_dividend = Signal()
+        self.identity_changed = self.new_blocks_handled = self.sources_refreshed = Signal()
+
+
+class FakeService:
+    """
+    Simulates the handling of the blocks by the identities, transactions and sources services
+    """
+    def __init__(self, handling_delay):
+        self.handling_delay = handling_delay
+
+    async def handle_new_blocks(self, blocks):
+        await asyncio.sleep(self.handling_delay / 3)
+        return [], [], []
+
+    async def refresh_sources(self, new_tx, new_dividends):
+        await asyncio.sleep(self.handling_delay / 3)
+        return []
+
+
+def blockchain_service(chain, latency, handling_delay):
+    sqlite3.register_adapter(BlockUID, str)
+    sqlite3.register_adapter(bool, int)
+    sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
+    con = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    db = SakiaDatabase(con, blockchains_repo=BlockchainsRepo(con), nodes_repo=NodesRepo(con),
+                       block_headers_repo=BlockHeadersRepo(con), blocks_lists_repo=BlocksListsRepo(con))
+    db.prepare()
+    db.upgrade_database()
+    for i in range(0, 4):
+        db.nodes_repo.insert(Node(currency=CURRENCY,
+                                  pubkey="{0}{1}".format(ISSUER[:-1], i),
+                                  endpoints=["BASIC_MERKLED_API node{0}.duniter.org 80".format(i)],
+                                  peer_blockstamp=BlockUID.empty(),
+                                  current_buid=BlockUID(chain[-1]['number'], chain[-1]['hash']),
+                                  state=Node.ONLINE))
+    db.blockchains_repo.insert(Blockchain(currency=CURRENCY,
+                                          current_buid=BlockUID(chain[0]['number'], chain[0]['hash'])))
+    connector = ReplayBmaConnector(NodesProcessor(db.nodes_repo), chain, latency)
+    processor = BlockchainProcessor(db.blockchains_repo, db.block_headers_repo, connector, db.blocks_lists_repo)
+    service = FakeService(handling_delay)
+    blockchain_service = BlockchainService(FakeApp(db), CURRENCY, processor, connector, service, service, service)
+    return blockchain_service, processor, connector
+
+
+async def serial_progress(service, processor, connector, network_blockstamp):
+    """
+    The previous catch-up loop : one verified window after another,
+    and the interesting blocks requested again after each window
+    """
+    block_numbers = await service.new_blocks(network_blockstamp)
+    while block_numbers:
+        start = service.current_buid().number
+        blocks_data = await connector.get(CURRENCY, bma.blockchain.blocks, req_args={'count': 100, 'start': start})
+        blocks = processor.parse_blocks(CURRENCY, blocks_data, set(block_numbers))
+        await service._handle_blocks(blocks)
+        block_numbers = await service.new_blocks(network_blockstamp)
+
+
+def run(loop, name, nb_blocks, latency, handling_delay, serial):
+    chain = forge_chain(nb_blocks)
+    service, processor, connector = blockchain_service(chain, latency, handling_delay)
+    network_blockstamp = BlockUID(chain[-1]['number'], chain[-1]['hash'])
+    start = time.perf_counter()
+    if serial:
+        loop.run_until_complete(serial_progress(service, processor, connector, network_blockstamp))
+    else:
+        loop.run_until_complete(service.catch_up(network_blockstamp))
+    elapsed = time.perf_counter() - start
+    assert service.current_buid().number == network_blockstamp.number
+    print("{0:<20} {1:>10.1f} blocks/s".format(name, nb_blocks / elapsed))
+
+
+if __name__ == '__main__':
+    nb_blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+    handling_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.1
+    loop = asyncio.get_event_loop()
+    run(loop, "Serial", nb_blocks, latency, handling_delay, serial=True)
+    run(loop, "Pipeline", nb_blocks, latency, handling_delay, serial=False)
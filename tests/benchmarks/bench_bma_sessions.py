@@ -0,0 +1,92 @@
+"""
+Benchmark of BMA requests against a local mirage node :
+one session per request (previous behaviour) versus the pooled sessions of BmaConnector.
+
+Reports the requests per second and the number of TCP handshakes.
+
+Usage : python tests/benchmarks/bench_bma_sessions.py [nb_requests]
+"""
+import asyncio
+import sqlite3
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+import aiohttp
+import mirage
+from duniterpy.api import bma
+from duniterpy.documents import BlockUID
+from sakia.data.connectors import BmaConnector
+from sakia.data.entities import Node, UserParameters
+from sakia.data.processors import NodesProcessor
+from sakia.data.repositories import SakiaDatabase, NodesRepo
+
+
+class HandshakesCounter:
+    """
+    Counts the TCP connections opened by the event loop
+    """
+    def __init__(self, loop):
+        self.count = 0
+        self._create_connection = loop.create_connection
+        loop.create_connection = self.create_connection
+
+    async def create_connection(self, *args, **kwargs):
+        self.count += 1
+        return await self._create_connection(*args, **kwargs)
+
+
+def nodes_processor(server):
+    sqlite3.register_adapter(BlockUID, str)
+    sqlite3.register_adapter(bool, int)
+    sqlite3.register_converter("BOOLEAN", lambda v: bool(int(v)))
+    con = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    db = SakiaDatabase(con, nodes_repo=NodesRepo(con))
+    db.prepare()
+    db.upgrade_database()
+    db.nodes_repo.insert(Node(currency=server.forge.currency,
+                              pubkey=server.forge.key.pubkey,
+                              endpoints=server.peer_doc().endpoints,
+                              peer_blockstamp=server.peer_doc().blockUID,
+                              current_buid=BlockUID.empty(),
+                              state=Node.ONLINE,
+                              software="duniter",
+                              version="0.40.2"))
+    return NodesProcessor(db.nodes_repo)
+
+
+async def session_per_request(server, nb_requests):
+    endpoint = server.peer_doc().endpoints[0]
+    for _ in range(nb_requests):
+        with aiohttp.ClientSession() as session:
+            await bma.blockchain.current(endpoint.conn_handler(session))
+
+
+async def pooled_sessions(server, nb_requests):
+    connector = BmaConnector(nodes_processor(server), UserParameters())
+    for _ in range(nb_requests):
+        await connector.get(server.forge.currency, bma.blockchain.current, verify=False)
+    await connector.close_sessions()
+
+
+def run(loop, counter, name, coroutine, nb_requests):
+    counter.count = 0
+    start = time.perf_counter()
+    loop.run_until_complete(coroutine)
+    elapsed = time.perf_counter() - start
+    print("{0:<22} {1:>10.1f} req/s {2:>6} handshakes".format(name, nb_requests / elapsed, counter.count))
+
+
+if __name__ == '__main__':
+    nb_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    loop = asyncio.get_event_loop()
+    server = loop.run_until_complete(mirage.Node.start(None, "test_currency", "12356", "123456", loop))
+    server.forge.forge_block()
+    counter = HandshakesCounter(loop)
+
+    run(loop, counter, "Session per request", session_per_request(server, nb_requests), nb_requests)
+    run(loop, counter, "Pooled sessions", pooled_sessions(server, nb_requests), nb_requests)
+
+    loop.run_until_complete(server.close())
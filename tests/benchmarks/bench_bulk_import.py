@@ -0,0 +1,78 @@
+"""
+Benchmark of the import of the transactions history of an account :
+one insert per row falling back to an update on IntegrityError, yielding to the
+event loop after every row (previous behaviour), versus insert_many / upsert_many.
+
+The import is run twice : on an empty database (inserts), then on the same rows
+with a changed state (updates).
+
+Reports the rows per second of each import.
+
+Usage : python tests/benchmarks/bench_bulk_import.py [nb_transactions]
+"""
+import asyncio
+import sqlite3
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from sakia.data.entities import Transaction
+from sakia.data.repositories import SakiaDatabase, TransactionsRepo, STORAGE_PROFILES
+
+CURRENCY = "test_currency"
+PUBKEY = "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ"
+
+
+def forge_transactions(nb_transactions, state):
+    return [Transaction(CURRENCY, "{0:064X}".format(i), i // 10,
+                        "{0}-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(i // 10),
+                        1473108382 + i, "SIGNATURE{0}".format(i),
+                        PUBKEY if i % 2 else "issuer{0}".format(i % 100),
+                        "receiver{0}".format(i % 100) if i % 2 else PUBKEY,
+                        100 + i, 0, "comment {0}".format(i), i, state) for i in range(0, nb_transactions)]
+
+
+async def row_by_row(db, transactions):
+    for tx in transactions:
+        try:
+            db.transactions_repo.insert(tx)
+        except sqlite3.IntegrityError:
+            db.transactions_repo.update(tx)
+        await asyncio.sleep(0)
+    db.commit()
+
+
+async def bulk(db, transactions):
+    if db.transactions_repo.get_one(sha_hash=transactions[0].sha_hash):
+        db.transactions_repo.upsert_many(transactions)
+    else:
+        db.transactions_repo.insert_many(transactions)
+    db.commit()
+
+
+def run(loop, directory, name, nb_transactions, importer):
+    path = os.path.join(directory, "{0}.db".format(name))
+    con = SakiaDatabase.connect(path, STORAGE_PROFILES["desktop"])
+    db = SakiaDatabase(con, transactions_repo=TransactionsRepo(con))
+    db.prepare()
+    db.upgrade_database()
+    results = []
+    for state in (Transaction.VALIDATED, Transaction.REFUSED):
+        transactions = forge_transactions(nb_transactions, state)
+        start = time.perf_counter()
+        loop.run_until_complete(importer(db, transactions))
+        results.append(nb_transactions / (time.perf_counter() - start))
+    assert len(db.transactions_repo.get_all(currency=CURRENCY, state=Transaction.REFUSED)) == nb_transactions
+    con.close()
+    print("{0:<12} insert {1:>9.0f} rows/s   update {2:>9.0f} rows/s".format(name, *results))
+
+
+if __name__ == '__main__':
+    nb_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        run(loop, directory, "Row by row", nb_transactions, row_by_row)
+        run(loop, directory, "Bulk", nb_transactions, bulk)
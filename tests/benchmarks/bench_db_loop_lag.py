@@ -0,0 +1,86 @@
+"""
+Benchmark of the event loop lag during large reads of the database :
+the repositories called on the loop thread (previous behaviour) versus the
+awaitable repositories of the database thread.
+
+A ticker coroutine wakes up every TICK seconds while all the transactions of the
+currency are read several times ; the delay of its wake-ups is the time during which
+the GUI would be frozen.
+
+Reports the maximum and mean loop lag and the total reading time.
+
+Usage : python tests/benchmarks/bench_db_loop_lag.py [nb_transactions] [nb_reads]
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from sakia.data.entities import Transaction
+from sakia.data.repositories import SakiaDatabase, DatabaseExecutor, TransactionsRepo
+
+CURRENCY = "test_currency"
+PUBKEY = "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ"
+TICK = 0.005
+
+
+def forge_database(path, nb_transactions):
+    con = SakiaDatabase.connect(path)
+    db = SakiaDatabase(con, transactions_repo=TransactionsRepo(con),
+                       executor=DatabaseExecutor(lambda: SakiaDatabase.connect(path)))
+    db.prepare()
+    db.upgrade_database()
+    for i in range(0, nb_transactions):
+        issuer, receiver = (PUBKEY, "receiver{0}".format(i % 100)) if i % 2 else ("issuer{0}".format(i % 100), PUBKEY)
+        db.transactions_repo.insert(Transaction(CURRENCY, "{0:064X}".format(i), i // 10,
+                                                "{0}-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(i // 10),
+                                                1473108382 + i, "SIGNATURE{0}".format(i), issuer, receiver,
+                                                100 + i, 0, "comment {0}".format(i), i % 5, Transaction.VALIDATED))
+    db.commit()
+    return db
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def read_sync(db, nb_reads):
+    for _ in range(0, nb_reads):
+        db.transactions_repo.get_all(currency=CURRENCY)
+        await asyncio.sleep(0)
+
+
+async def read_async(db, nb_reads):
+    transactions = db.async_repo(db.transactions_repo)
+    for _ in range(0, nb_reads):
+        await transactions.get_all(currency=CURRENCY)
+
+
+def run(loop, name, db, nb_reads, reader):
+    lags = []
+    stop = asyncio.Event()
+    ticking = asyncio.ensure_future(ticker(lags, stop))
+    start = time.perf_counter()
+    loop.run_until_complete(reader(db, nb_reads))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    loop.run_until_complete(ticking)
+    print("{0:<20} max lag {1:>8.1f} ms   mean lag {2:>6.1f} ms   {3:>6.2f} s".format(
+        name, max(lags) * 1000, sum(lags) / len(lags) * 1000, elapsed))
+
+
+if __name__ == '__main__':
+    nb_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    nb_reads = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    loop = asyncio.get_event_loop()
+    with tempfile.TemporaryDirectory() as directory:
+        db = forge_database(os.path.join(directory, CURRENCY + ".db"), nb_transactions)
+        run(loop, "Loop thread", db, nb_reads, read_sync)
+        run(loop, "Database thread", db, nb_reads, read_async)
+        db.shutdown()
@@ -0,0 +1,120 @@
+"""
+Benchmark of the Python overhead of the repositories on an in-memory database :
+the statements built from strings at every call, the rows built with attr.astuple
+and the entities built with Entity(*row) (previous behaviour), versus the statements
+cached by the repository base, its attribute getters and its compiled row decoders.
+The decoding of the transactions is dominated by the parsing of their blockstamps,
+so get_one and get_all are expected to stay close.
+
+Reports the microseconds per call of insert, update, get_one and get_all of the transactions,
+and the speedup of the best of three runs.
+
+Usage : python tests/benchmarks/bench_repository_overhead.py [nb_transactions]
+"""
+import sys
+import os
+import time
+
+import attr
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from sakia.data.entities import Transaction
+from sakia.data.repositories import SakiaDatabase, TransactionsRepo
+
+CURRENCY = "test_currency"
+PUBKEY = "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ"
+
+
+def forge_transactions(nb_transactions):
+    return [Transaction(CURRENCY, "{0:064X}".format(i), i // 10,
+                        "{0}-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(i // 10),
+                        1473108382 + i, "SIGNATURE{0}".format(i),
+                        PUBKEY if i % 2 else "issuer{0}".format(i % 100),
+                        "receiver{0}".format(i % 100) if i % 2 else PUBKEY,
+                        100 + i, 0, "comment {0}".format(i), i, Transaction.VALIDATED) for i in range(0, nb_transactions)]
+
+
+@attr.s(frozen=True)
+class StringsRepo:
+    """
+    The transactions repository before the repository base
+    """
+    _conn = attr.ib()
+
+    def insert(self, transaction):
+        transaction_tuple = attr.astuple(transaction)
+        values = ",".join(['?'] * len(transaction_tuple))
+        self._conn.execute("INSERT INTO transactions VALUES ({0})".format(values), transaction_tuple)
+
+    def update(self, transaction):
+        updated_fields = attr.astuple(transaction, filter=attr.filters.exclude(Transaction.sha_hash))
+        where_fields = attr.astuple(transaction, filter=attr.filters.include(Transaction.sha_hash))
+        self._conn.execute("""UPDATE transactions SET
+                           currency=?, written_on=?, blockstamp=?, ts=?, signature=?, issuer = ?,
+                           receiver = ?, amount = ?, amountbase = ?, comment = ?, txid = ?, state = ?,
+                           local = ?, raw = ?
+                           WHERE sha_hash=?""", updated_fields + where_fields)
+
+    def get_one(self, **search):
+        filters = []
+        values = []
+        for k, v in search.items():
+            filters.append("{k}=?".format(k=k))
+            values.append(v)
+        request = "SELECT * FROM transactions WHERE {filters}".format(filters=" AND ".join(filters))
+        data = self._conn.execute(request, tuple(values)).fetchone()
+        if data:
+            return Transaction(*data)
+
+    def get_all(self, **search):
+        filters = []
+        values = []
+        for k, v in search.items():
+            filters.append("{k}=?".format(k=k))
+            values.append(v)
+        request = "SELECT * FROM transactions WHERE {filters}".format(filters=" AND ".join(filters))
+        datas = self._conn.execute(request, tuple(values)).fetchall()
+        if datas:
+            return [Transaction(*data) for data in datas]
+        return []
+
+
+def timed(function, calls):
+    start = time.perf_counter()
+    for args, search in calls:
+        function(*args, **search)
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def run(name, repo_class, transactions):
+    con = SakiaDatabase.connect(":memory:")
+    db = SakiaDatabase(con)
+    db.prepare()
+    db.upgrade_database()
+    repo = repo_class(con)
+
+    insert = timed(repo.insert, [((t,), {}) for t in transactions])
+    update = timed(repo.update, [((t,), {}) for t in transactions])
+    get_one = timed(repo.get_one, [((), {'sha_hash': t.sha_hash}) for t in transactions])
+    get_all = timed(repo.get_all, [((), {'currency': CURRENCY, 'written_on': i})
+                                   for i in range(0, len(transactions) // 10)])
+    assert repo.get_one(sha_hash=transactions[-1].sha_hash) == transactions[-1]
+    assert len(repo.get_all(currency=CURRENCY, issuer=PUBKEY)) == len(transactions) // 2
+    con.close()
+    print("{0:<16} insert {1:>6.2f} us   update {2:>6.2f} us   get_one {3:>6.2f} us   get_all (10 rows) {4:>6.2f} us"
+          .format(name, insert, update, get_one, get_all))
+    return insert, update, get_one, get_all
+
+
+if __name__ == '__main__':
+    nb_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    transactions = forge_transactions(nb_transactions)
+    results = {StringsRepo: [], TransactionsRepo: []}
+    for i in range(0, 3):
+        results[StringsRepo].append(run("String building", StringsRepo, transactions))
+        results[TransactionsRepo].append(run("Repository base", TransactionsRepo, transactions))
+    before = [min(r) for r in zip(*results[StringsRepo])]
+    after = [min(r) for r in zip(*results[TransactionsRepo])]
+    print("Speedup          insert {0:>6.2f} x    update {1:>6.2f} x    get_one {2:>6.2f} x    get_all (10 rows) {3:>6.2f} x"
+          .format(*[b / a for b, a in zip(before, after)]))
@@ -0,0 +1,89 @@
+"""
+Benchmark of the repositories under each storage profile
+on a synthetic database of transactions.
+
+- insert : the transactions are inserted, with a commit every COMMIT_EVERY rows
+  as during the synchronization of the blockchain
+- update : the state of random transactions is updated, with the same commits
+- select : random transactions are read by hash, and the transfers of random pubkeys
+
+Reports the rows per second of each operation.
+The fsync costs depend on the disk : run it in a directory of the disk of the profiles.
+
+Usage : python tests/benchmarks/bench_storage_profiles.py [nb_transactions] [directory]
+"""
+import random
+import sys
+import os
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'src')))
+
+from sakia.data.entities import Transaction
+from sakia.data.repositories import SakiaDatabase, TransactionsRepo, STORAGE_PROFILES
+
+CURRENCY = "test_currency"
+COMMIT_EVERY = 100
+NB_PUBKEYS = 1000
+
+
+def forge_transaction(i):
+    return Transaction(CURRENCY, "{0:064X}".format(i), i // 10,
+                       "{0}-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(i // 10),
+                       1473108382 + i, "SIGNATURE{0}".format(i),
+                       "pubkey{0}".format(i % NB_PUBKEYS), "pubkey{0}".format((i * 7) % NB_PUBKEYS),
+                       100 + i, 0, "comment {0}".format(i), i % 5, Transaction.VALIDATED)
+
+
+def insert(db, transactions):
+    for i, transaction in enumerate(transactions):
+        db.transactions_repo.insert(transaction)
+        if i % COMMIT_EVERY == 0:
+            db.commit()
+    db.commit()
+    return len(transactions)
+
+
+def update(db, transactions):
+    for i, transaction in enumerate(random.sample(transactions, len(transactions) // 10)):
+        transaction.state = Transaction.REFUSED
+        db.transactions_repo.update(transaction)
+        if i % COMMIT_EVERY == 0:
+            db.commit()
+    db.commit()
+    return len(transactions) // 10
+
+
+def select(db, transactions):
+    rows = 0
+    for transaction in random.sample(transactions, len(transactions) // 10):
+        db.transactions_repo.get_one(sha_hash=transaction.sha_hash)
+        rows += 1
+    for i in random.sample(range(0, NB_PUBKEYS), NB_PUBKEYS // 10):
+        rows += len(db.transactions_repo.get_transfers(CURRENCY, "pubkey{0}".format(i)))
+    return rows
+
+
+def run(directory, profile, transactions):
+    path = os.path.join(directory, "{0}.db".format(profile.name))
+    con = SakiaDatabase.connect(path, profile)
+    db = SakiaDatabase(con, transactions_repo=TransactionsRepo(con))
+    db.prepare()
+    db.upgrade_database()
+    results = []
+    for operation in (insert, update, select):
+        start = time.perf_counter()
+        rows = operation(db, transactions)
+        results.append(rows / (time.perf_counter() - start))
+    con.close()
+    print("{0:<10} insert {1:>9.0f} rows/s   update {2:>9.0f} rows/s   select {3:>9.0f} rows/s"
+          .format(profile.name, *results))
+
+
+if __name__ == '__main__':
+    nb_transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    transactions = [forge_transaction(i) for i in range(0, nb_transactions)]
+    with tempfile.TemporaryDirectory(dir=sys.argv[2] if len(sys.argv) > 2 else None) as directory:
+        for profile in STORAGE_PROFILES.values():
+            run(directory, profile, transactions)
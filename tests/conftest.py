@@ -44,7 +44,8 @@ def meta_repo():
     meta_repo = SakiaDatabase(con,
                               ConnectionsRepo(con), IdentitiesRepo(con),
                               BlockchainsRepo(con), CertificationsRepo(con), TransactionsRepo(con),
-                              NodesRepo(con), SourcesRepo(con), DividendsRepo(con))
+                              NodesStore(NodesRepo(con)), SourcesRepo(con), DividendsRepo(con), BlocksRepo(con),
+                              BlockHeadersRepo(con), EndpointsHealthRepo(con), BlocksListsRepo(con))
     meta_repo.prepare()
     meta_repo.upgrade_database()
     return meta_repo
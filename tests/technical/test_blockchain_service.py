@@ -1,4 +1,7 @@
+import asyncio
 from sakia.data.entities import Identity
+from sakia.services import BlockchainService
+from duniterpy.documents import BlockUID
 from duniterpy.documents.certification import Certification
 import pytest
 
@@ -16,4 +19,98 @@ async def test_new_block_with_ud(application_with_one_connection, fake_server):
         new_blocks)
     previous_ud_after_parse = application_with_one_connection.blockchain_service.previous_ud()
     assert previous_ud_after_parse > previous_ud
-    await fake_server.close()
\ No newline at end of file
+    await fake_server.close()
+
+
+class HeadProcessor:
+    def __init__(self):
+        self.head = BlockUID(0, "7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
+
+    def initialized(self, currency):
+        return True
+
+    def current_buid(self, currency):
+        return self.head
+
+
+class CatchUpBlockchainService(BlockchainService):
+    def __init__(self):
+        super().__init__(None, "test_currency", HeadProcessor(), None, None, None, None)
+        self.targets = []
+
+    async def catch_up(self, network_blockstamp):
+        self.targets.append(network_blockstamp.number)
+        await asyncio.sleep(0.1)
+        self._blockchain_processor.head = network_blockstamp
+        return True
+
+
+def blockstamp(number):
+    return BlockUID(number, "{0}518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number))
+
+
+@pytest.mark.asyncio
+async def test_catch_up_worker_coalesces_heads():
+    service = CatchUpBlockchainService()
+    service.handle_blockchain_progress(blockstamp(5))
+    await asyncio.sleep(0.05)
+    worker = service._catch_up_task
+    # Heads found during a catch-up only raise the target
+    for number in (6, 8, 7):
+        service.handle_blockchain_progress(blockstamp(number))
+    assert service._catch_up_task is worker
+    await asyncio.sleep(0.3)
+    assert service.targets == [5, 8]
+    assert service.current_buid() == blockstamp(8)
+
+    service.handle_blockchain_progress(blockstamp(8))
+    await asyncio.sleep(0.05)
+    assert service.targets == [5, 8]
+    await service.stop_coroutines()
+    assert worker.cancelled()
+
+
+class FailingProcessor(HeadProcessor):
+    def __init__(self):
+        super().__init__()
+        self.parsed = 0
+
+    async def new_blocks_with_identities(self, currency):
+        return []
+
+    async def new_blocks_with_money(self, currency):
+        return []
+
+    def download_blocks(self, currency, from_buid, to_buid, lookahead=None):
+        windows = []
+        for i in range(0, 3):
+            window = asyncio.Future()
+            window.set_result([{"number": i}])
+            windows.append(window)
+        return windows
+
+    def parse_blocks(self, currency, blocks_data, filter):
+        self.parsed += 1
+        if self.parsed == 2:
+            raise ValueError("Could not parse block")
+        return []
+
+
+class FailingBlockchainService(BlockchainService):
+    def __init__(self):
+        super().__init__(None, "test_currency", FailingProcessor(), None, None, None, None)
+
+
+@pytest.mark.asyncio
+async def test_catch_up_parse_error():
+    service = FailingBlockchainService()
+    # The error of the producer of the pipeline is raised by the catch-up instead of waiting forever
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(service.catch_up(blockstamp(5)), 1)
+    assert service._blockchain_processor.parsed == 2
+
+    # The catch-up worker keeps running
+    service.handle_blockchain_progress(blockstamp(5))
+    await asyncio.sleep(0.05)
+    assert not service._catch_up_task.done()
+    await service.stop_coroutines()
@@ -0,0 +1,283 @@
+import asyncio
+import pytest
+from duniterpy.documents import BlockUID, Peer
+from sakia.data.connectors import NodeConnector
+from sakia.data.entities import Identity, Node, UserParameters
+from sakia.services import NetworkService
+from sakia.services import network
+from sakia.services.network import DiscoveryQueue, HeadTracker, PeersVerifier
+
+
+def blockstamp(number):
+    return BlockUID(number, "{0}518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number))
+
+
+class HeadNodesProcessor:
+    def current_buid(self, currency):
+        return blockstamp(100)
+
+    def update_node(self, node):
+        pass
+
+
+class PolledNodeConnector(NodeConnector):
+    running = 0
+    max_running = 0
+
+    def __init__(self, pubkey, state, current_number, ws_connected=False):
+        super().__init__(Node(currency="test_currency", pubkey=pubkey, endpoints=[],
+                              peer_blockstamp=BlockUID.empty(), current_buid=blockstamp(current_number),
+                              state=state), UserParameters())
+        self._connected['block'] = ws_connected
+        self.refreshes = 0
+
+    async def init_session(self):
+        pass
+
+    def refresh(self, manual=False):
+        self.refreshes += 1
+        return [asyncio.ensure_future(self.poll())]
+
+    async def poll(self):
+        PolledNodeConnector.running += 1
+        PolledNodeConnector.max_running = max(PolledNodeConnector.max_running, PolledNodeConnector.running)
+        await asyncio.sleep(0.05)
+        PolledNodeConnector.running -= 1
+
+
+def network_service(connectors):
+    return NetworkService(None, "test_currency", HeadNodesProcessor(), connectors, None, None)
+
+
+def test_refresh_interval():
+    synced = PolledNodeConnector("A", Node.ONLINE, 100, ws_connected=True)
+    polled = PolledNodeConnector("B", Node.ONLINE, 100)
+    late = PolledNodeConnector("C", Node.ONLINE, 50)
+    offline = PolledNodeConnector("D", Node.OFFLINE, 100)
+    service = network_service([synced, polled, late, offline])
+    intervals = [service.refresh_interval(c) for c in (synced, polled, late, offline)]
+    assert intervals == sorted(intervals)
+    assert intervals[0] >= NetworkService.MIN_REFRESH_INTERVAL * (1 - NetworkService.REFRESH_JITTER)
+    assert intervals[-1] <= NetworkService.MAX_REFRESH_INTERVAL * (1 + NetworkService.REFRESH_JITTER)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes(monkeypatch):
+    monkeypatch.setattr(NetworkService, "REFRESH_CONCURRENCY", 4)
+    monkeypatch.setattr(NetworkService, "SCHEDULER_TICK", 0.01)
+    monkeypatch.setattr(NetworkService, "discovery_loop", lambda self: asyncio.sleep(0))
+    monkeypatch.setattr(NetworkService, "flush_loop", lambda self: asyncio.sleep(0))
+    connectors = [PolledNodeConnector("{0}".format(i), Node.ONLINE, 100) for i in range(0, 20)]
+    service = network_service(connectors)
+    discovery = asyncio.ensure_future(service.discover_network())
+    await asyncio.sleep(0.5)
+    service._must_crawl = False
+    await discovery
+    # All the nodes are refreshed at once, REFRESH_CONCURRENCY at a time
+    assert all(c.refreshes == 1 for c in connectors)
+    assert PolledNodeConnector.max_running == 4
+
+
+class StalledNodeConnector(PolledNodeConnector):
+    def refresh(self, manual=False):
+        self.refreshes += 1
+        self.request = asyncio.ensure_future(asyncio.sleep(60))
+        return [self.request]
+
+
+@pytest.mark.asyncio
+async def test_refresh_timeout(monkeypatch):
+    monkeypatch.setattr(NetworkService, "REFRESH_TIMEOUT", 0.05)
+    connector = StalledNodeConnector("A", Node.ONLINE, 100)
+    service = network_service([connector])
+    service._must_crawl = True
+    semaphore = asyncio.Semaphore(1)
+    await asyncio.wait_for(service.refresh_connector(connector, semaphore), 1)
+    # The stalled request is cancelled before the refresh slot is released
+    assert connector.request.cancelled()
+    assert not semaphore.locked()
+
+
+def peer(pubkey, number, signature):
+    return Peer(2, "test_currency", pubkey, blockstamp(number), [], signature)
+
+
+def test_discovery_queue():
+    queue = DiscoveryQueue()
+    assert queue.push(peer("A", 10, "SIGA10"))
+    assert queue.push(peer("B", 12, "SIGB12"))
+    # Same document from another node
+    assert not queue.push(peer("A", 10, "SIGA10"))
+    # A fresher document replaces the queued one, an older one is ignored
+    assert queue.push(peer("A", 15, "SIGA15"))
+    assert not queue.push(peer("A", 11, "SIGA11"))
+    assert queue.push(peer("C", 5, "SIGC5"))
+    assert len(queue) == 3
+
+    batch = queue.pop_batch(2)
+    assert [(p.pubkey, p.blockUID.number) for p in batch] == [("A", 15), ("B", 12)]
+    assert [p.pubkey for p in queue.pop_batch(2)] == ["C"]
+    assert queue.pop_batch(2) == []
+    # Handled documents are not queued again
+    assert not queue.push(peer("B", 12, "SIGB12"))
+    assert queue.push(peer("B", 13, "SIGB13"))
+
+
+@pytest.mark.asyncio
+async def test_peers_verifier(monkeypatch):
+    verified_batches = []
+
+    def fake_verify_peers(peers):
+        verified_batches.append([p.pubkey for p in peers])
+        return [p.pubkey != "WRONG" for p in peers]
+
+    monkeypatch.setattr(network, "verify_peers", fake_verify_peers)
+    verdicts = []
+    verifier = PeersVerifier(lambda p, valid: verdicts.append((p.pubkey, valid)))
+    for document in (peer("A", 10, "SIGA"), peer("WRONG", 10, "SIGW"), peer("A", 10, "SIGA")):
+        verifier.submit(document)
+    await asyncio.sleep(0.2)
+    assert verified_batches == [["A", "WRONG"]]
+    assert verdicts == [("A", True), ("WRONG", False)]
+
+    # Documents received again are not verified twice
+    verifier.submit(peer("A", 10, "SIGA"))
+    verifier.submit(peer("WRONG", 10, "SIGW"))
+    verifier.submit(peer("B", 10, "SIGB"))
+    await asyncio.sleep(0.2)
+    assert verified_batches == [["A", "WRONG"], ["B"]]
+    assert verdicts[2:] == [("A", True), ("WRONG", False), ("B", True)]
+
+
+@pytest.mark.asyncio
+async def test_peers_verifier_errors(monkeypatch):
+    class FakeVerifyingKey:
+        def __init__(self, pubkey):
+            if pubkey == "MALFORMED":
+                raise ValueError("Invalid public key")
+            self.pubkey = pubkey
+
+        def verify_document(self, document):
+            return True
+
+    monkeypatch.setattr(network, "VerifyingKey", FakeVerifyingKey)
+    verdicts = []
+    verifier = PeersVerifier(lambda p, valid: verdicts.append((p.pubkey, valid)))
+    for document in (peer("A", 10, "SIGA"), peer("MALFORMED", 10, "SIGM"), peer("B", 10, "SIGB")):
+        verifier.submit(document)
+    await asyncio.sleep(0.2)
+    # The other documents of the batch are still verified
+    assert verdicts == [("A", True), ("MALFORMED", False), ("B", True)]
+
+
+class DiscoveryNodesProcessor(HeadNodesProcessor):
+    def __init__(self):
+        self.updated = []
+
+    def update_peer(self, currency, peer):
+        return Node(currency=currency, pubkey=peer.pubkey, endpoints=[], peer_blockstamp=peer.blockUID)
+
+    def update_node(self, node):
+        self.updated.append(node.pubkey)
+
+
+class FakeIdentitiesService:
+    async def find_from_pubkey(self, pubkey):
+        if pubkey == "BROKEN":
+            raise RuntimeError("Connection reset")
+        return Identity(currency="test_currency", pubkey=pubkey, uid=pubkey.lower(), member=True)
+
+    async def load_requirements(self, identity):
+        return identity
+
+
+class InitializedBlockchainService:
+    def initialized(self):
+        return True
+
+
+class FakeDatabase:
+    def commit(self):
+        pass
+
+
+class FakeApp:
+    db = FakeDatabase()
+
+
+@pytest.mark.asyncio
+async def test_discovery_loop_identity_errors(monkeypatch):
+    monkeypatch.setattr(NetworkService, "DISCOVERY_DELAY", 0.01)
+    processor = DiscoveryNodesProcessor()
+    service = NetworkService(FakeApp(), "test_currency", processor, [], InitializedBlockchainService(),
+                             FakeIdentitiesService())
+    service._must_crawl = True
+    service._discovery_queue.push(peer("A", 10, "SIGA"))
+    service._discovery_queue.push(peer("BROKEN", 10, "SIGB"))
+    loop_task = asyncio.ensure_future(service.discovery_loop())
+    await asyncio.sleep(0.1)
+    # The nodes are updated, and the loop goes on after the failure of one identity
+    assert sorted(processor.updated) == ["A", "BROKEN"]
+    assert not loop_task.done()
+    service._discovery_queue.push(peer("C", 10, "SIGC"))
+    await asyncio.sleep(0.1)
+    assert "C" in processor.updated
+    service._must_crawl = False
+    await asyncio.wait_for(loop_task, 1)
+
+
+class HeadsBlockchainService:
+    def __init__(self):
+        self.calls = []
+
+    def handle_rollback(self, network_blockstamp, previous_blockstamp):
+        self.calls.append(("rollback", network_blockstamp.number, previous_blockstamp.number))
+
+    def handle_blockchain_progress(self, network_blockstamp):
+        self.calls.append(("progress", network_blockstamp.number))
+
+
+def test_check_current_block():
+    blockchain_service = HeadsBlockchainService()
+    service = NetworkService(None, "test_currency", HeadNodesProcessor(), [], blockchain_service, None)
+    head = Node(currency="test_currency", pubkey="A", endpoints=[], peer_blockstamp=BlockUID.empty(),
+                current_buid=blockstamp(100), previous_buid=blockstamp(99), state=Node.ONLINE)
+    # The head skipped blocks : it is a progress
+    service._block_found = blockstamp(97)
+    service._check_current_block([head])
+    # The block following the previously found one is not linked to it : it is a rollback
+    service._block_found = BlockUID(99, "00" + blockstamp(99).sha_hash[2:])
+    service._check_current_block([head])
+    assert blockchain_service.calls == [("progress", 100), ("rollback", 100, 99)]
+
+
+def tracked_node(pubkey, number, state=Node.ONLINE):
+    return Node(currency="test_currency", pubkey=pubkey, endpoints=[], peer_blockstamp=BlockUID.empty(),
+                current_buid=blockstamp(number) if number else BlockUID.empty(), state=state)
+
+
+def test_head_tracker():
+    tracker = HeadTracker()
+    nodes = [tracked_node("A", 10), tracked_node("B", 10), tracked_node("C", 11, Node.DESYNCED)]
+    flipped = [n.pubkey for node in nodes for n in tracker.update(node)]
+    assert tracker.majority == blockstamp(10).sha_hash
+    assert flipped == []
+    assert [n.state for n in nodes] == [Node.ONLINE, Node.ONLINE, Node.DESYNCED]
+
+    # Only the nodes whose sync state flips are returned
+    d = tracked_node("D", 11)
+    assert tracker.update(d) == [d]
+    assert d.state == Node.DESYNCED
+    nodes[0].current_buid = blockstamp(11)
+    flipped = tracker.update(nodes[0])
+    assert tracker.majority == blockstamp(11).sha_hash
+    assert sorted(n.pubkey for n in flipped) == ["B", "C", "D"]
+    assert [n.state for n in nodes + [d]] == [Node.ONLINE, Node.DESYNCED, Node.ONLINE, Node.ONLINE]
+
+    # Offline nodes do not vote
+    for node in nodes + [d]:
+        if node is not nodes[1]:
+            node.state = Node.OFFLINE
+            tracker.update(node)
+    assert tracker.majority == blockstamp(10).sha_hash
+    assert nodes[1].state == Node.ONLINE
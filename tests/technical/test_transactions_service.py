@@ -1,5 +1,6 @@
 import pytest
 from sakia.data.entities import Transaction
+from sakia.gui.navigation.txhistory.table_model import HistoryTableModel
 
 
 @pytest.mark.asyncio
@@ -57,3 +58,23 @@ async def test_issue_dividend(application_with_one_connection, fake_server, bob)
     assert len(dividends_before_send) + 2 == len(dividends_after_parse)
     await fake_server.close()
 
+
+@pytest.mark.asyncio
+async def test_load_history(application_with_one_connection, fake_server, bob):
+    fake_server.forge.forge_block()
+    fake_server.forge.generate_dividend()
+    fake_server.forge.forge_block()
+    new_blocks = fake_server.forge.blocks[-2:]
+    await application_with_one_connection.transactions_service.handle_new_blocks(new_blocks)
+    transactions_service = application_with_one_connection.transactions_service
+    transfers, dividends = await transactions_service.load_history(bob.key.pubkey)
+    assert transfers == transactions_service.transfers(bob.key.pubkey)
+    assert dividends == transactions_service.dividends(bob.key.pubkey)
+
+    bob_connection = application_with_one_connection.db.connections_repo.get_one(pubkey=bob.key.pubkey)
+    history_model = HistoryTableModel(None, application_with_one_connection, bob_connection,
+                                      application_with_one_connection.identities_service, transactions_service)
+    await history_model.init_transfers()
+    assert history_model.rowCount(None) == len([t for t in transfers if t.state != Transaction.DROPPED]) \
+                                           + len(dividends)
+    await fake_server.close()
@@ -0,0 +1,40 @@
+from sakia.data.repositories import BlockHeadersRepo, BlocksRepo
+from sakia.data.entities import BlockHeader, CachedBlock
+
+
+def test_add_get_drop_headers(meta_repo):
+    headers_repo = BlockHeadersRepo(meta_repo.conn)
+    headers_repo.insert_many([BlockHeader("testcurrency", number,
+                                          "{0}7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D6".format(number),
+                                          1346543453 + number * 300,
+                                          100 if number % 2 == 0 else None, 0, 10, 1000 + number)
+                              for number in range(0, 5)])
+    header = headers_repo.get_one("testcurrency", 2)
+    assert header.median_time == 1346544053
+    assert header.dividend == 100
+    assert header.monetary_mass == 1002
+    assert headers_repo.get_one("testcurrency", 3).dividend is None
+
+    # The headers are dropped with the cached blocks
+    blocks_repo = BlocksRepo(meta_repo.conn)
+    blocks_repo.drop_from("testcurrency", 3)
+    assert headers_repo.get_one("testcurrency", 2) is not None
+    assert headers_repo.get_one("testcurrency", 3) is None
+    assert headers_repo.get_one("testcurrency", 4) is None
+
+
+def test_headers_of_cached_blocks(meta_repo):
+    headers_repo = BlockHeadersRepo(meta_repo.conn)
+    blocks_repo = BlocksRepo(meta_repo.conn)
+    sha_hash = "27518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D6"
+    headers_repo.upsert_many([BlockHeader("testcurrency", 2, sha_hash, 1346544053, 100, 0, 10, 1002)])
+    # An indexed header is not a cached block
+    assert blocks_repo.get_one(currency="testcurrency", number=2) is None
+
+    blocks_repo.insert(CachedBlock("testcurrency", 2, sha_hash, "", 1346544053, 10, 1002, 100, 0,
+                                   "Version: 5\nType: Block\n", "SIGNATURE"))
+    headers_repo.upsert_many([BlockHeader("testcurrency", 2, sha_hash, 1346544053, 100, 0, 11, 1002)])
+    block = blocks_repo.get_one(currency="testcurrency", number=2)
+    assert block.raw == "Version: 5\nType: Block\n"
+    assert block.members_count == 11
+    assert meta_repo.conn.execute("SELECT COUNT(*) FROM blocks").fetchone()[0] == 1
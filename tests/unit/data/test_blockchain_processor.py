@@ -0,0 +1,106 @@
+import pytest
+from duniterpy.api import bma
+
+from duniterpy.documents import BlockUID
+
+from sakia.data.entities import Blockchain, BlockHeader
+from sakia.data.processors import BlockchainProcessor
+from sakia.data.repositories import BlockchainsRepo, BlockHeadersRepo, BlocksListsRepo
+
+
+class ListsBmaConnector:
+    def __init__(self):
+        self.requests = []
+
+    async def get(self, currency, request, req_args={}, verify=True):
+        self.requests.append(request)
+        blocks = {bma.blockchain.joiners: [2, 12],
+                  bma.blockchain.newcomers: [2, 12],
+                  bma.blockchain.ud: [5, 15],
+                  bma.blockchain.tx: [14]}.get(request, [])
+        return {"result": {"blocks": blocks}}
+
+
+def block_data(number, **fields):
+    data = {"number": number,
+            "hash": "{0}518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number),
+            "medianTime": 1346543453,
+            "membersCount": 10,
+            "monetaryMass": 1000,
+            "dividend": None,
+            "unitbase": 0,
+            "joiners": [],
+            "transactions": []}
+    data.update(fields)
+    return data
+
+
+@pytest.mark.asyncio
+async def test_incremental_blocks_lists(meta_repo):
+    connector = ListsBmaConnector()
+    blockchains_repo = BlockchainsRepo(meta_repo.conn)
+    blockchains_repo.insert(Blockchain(currency="testcurrency",
+                                       current_buid="10-7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67"))
+    processor = BlockchainProcessor(blockchains_repo, BlockHeadersRepo(meta_repo.conn), connector,
+                                    BlocksListsRepo(meta_repo.conn))
+
+    assert await processor.new_blocks_with_identities("testcurrency") == [12]
+    assert await processor.new_blocks_with_money("testcurrency") == [14, 15]
+    assert len(connector.requests) == 7
+
+    # Blocks downloaded above the height of the lists are merged
+    merged = processor.merge_blocks_lists("testcurrency", [block_data(11),
+                                                           block_data(16, joiners=["JOINER"]),
+                                                           block_data(17, dividend=100),
+                                                           block_data(18)])
+    assert merged == {16, 17}
+    assert await processor.new_blocks_with_identities("testcurrency") == [12, 16]
+    assert await processor.new_blocks_with_money("testcurrency") == [14, 15, 17]
+    assert len(connector.requests) == 7
+
+    processor.invalidate_blocks_lists("testcurrency", 15)
+    assert await processor.new_blocks_with_identities("testcurrency") == [12]
+    assert await processor.new_blocks_with_money("testcurrency") == [14]
+    assert processor.merge_blocks_lists("testcurrency", [block_data(15, transactions=[{}])]) == {15}
+    assert len(connector.requests) == 7
+
+    # The lists are loaded from the database after a restart
+    processor = BlockchainProcessor(blockchains_repo, BlockHeadersRepo(meta_repo.conn), connector,
+                                    BlocksListsRepo(meta_repo.conn))
+    assert await processor.new_blocks_with_identities("testcurrency") == [12]
+    assert await processor.new_blocks_with_money("testcurrency") == [14, 15]
+    assert (await processor.blocks_lists("testcurrency")).height == 15
+    assert len(connector.requests) == 7
+
+
+def block_hash(number, fork=0):
+    return "{0}{1}8C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number, fork)
+
+
+class ForkBmaConnector:
+    """
+    The network forked from the block 6 : its blocks 6 and above have the hashes of the fork 1
+    """
+    def __init__(self):
+        self.requests = []
+
+    async def get_block(self, currency, number, verify=True, cached=True):
+        self.requests.append((number, cached))
+        return {"number": number,
+                "hash": block_hash(number, 1 if number >= 6 else 0),
+                "previousHash": block_hash(number - 1, 1 if number >= 7 else 0)}
+
+
+@pytest.mark.asyncio
+async def test_fork_point(meta_repo):
+    connector = ForkBmaConnector()
+    headers_repo = BlockHeadersRepo(meta_repo.conn)
+    headers_repo.insert_many([BlockHeader("testcurrency", number, block_hash(number), 1346543453, None, 0, 10, 1000)
+                              for number in range(0, 10) if number != 8])
+    processor = BlockchainProcessor(BlockchainsRepo(meta_repo.conn), headers_repo, connector,
+                                    BlocksListsRepo(meta_repo.conn))
+    # The fork goes deeper than the new head
+    fork_number = await processor.fork_point("testcurrency", BlockUID(9, block_hash(9, 1)), BlockUID(10, block_hash(10)))
+    assert fork_number == 6
+    # The hash of the block 6 is the previous hash of the block 7, the missing header 8 is skipped
+    assert connector.requests == [(7, False), (5, False)]
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from duniterpy.documents import BlockUID
+from sakia.data.connectors import BlocksFanIn
+from sakia.data.entities import Node
+
+
+def block_hash(number):
+    return "{0}518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number)
+
+
+class FakeNodeConnector:
+    def __init__(self, pubkey, current_number, available=True):
+        self.node = Node(currency="test_currency", pubkey=pubkey,
+                         endpoints=[], peer_blockstamp=BlockUID.empty(),
+                         current_buid=BlockUID(current_number, block_hash(current_number))
+                         if current_number is not None else None,
+                         state=Node.ONLINE)
+        self.available = available
+        self.requests = 0
+
+    async def request_block(self, number):
+        self.requests += 1
+        if self.available:
+            return {"number": number, "hash": block_hash(number)}
+
+
+@pytest.mark.asyncio
+async def test_fan_in_dedups_blocks(monkeypatch):
+    monkeypatch.setattr(BlocksFanIn, "DELAY", 0.05)
+    fan_in = BlocksFanIn()
+    batches = []
+    fan_in.nodes_changed.connect(lambda connectors: batches.append(connectors))
+    block_data = {"number": 10, "hash": block_hash(10), "previousHash": block_hash(9), "medianTime": 1346543453}
+
+    lagging = [FakeNodeConnector("pubkey{0}".format(i), 8) for i in range(0, 5)]
+    synced = [FakeNodeConnector("pubkey{0}".format(i), 9) for i in range(5, 10)]
+    for connector in lagging + synced + lagging:
+        fan_in.receive(connector, block_data)
+    await asyncio.sleep(0.1)
+
+    assert len(batches) == 1
+    assert batches[0] == lagging + synced
+    # The block 8 is requested once for all the lagging nodes, the block 9 is the previous hash
+    assert sum(c.requests for c in lagging + synced) == 1
+    for connector in lagging:
+        assert connector.node.previous_buid == BlockUID(8, block_hash(8))
+        assert connector.node.current_buid == BlockUID(10, block_hash(10))
+    for connector in synced:
+        assert connector.node.previous_buid == BlockUID(9, block_hash(9))
+
+    # Nodes already on the block are not updated again
+    fan_in.receive(synced[0], block_data)
+    await asyncio.sleep(0.1)
+    assert len(batches) == 1
+
+
+
+@pytest.mark.asyncio
+async def test_fan_in_failed_nodes(monkeypatch):
+    monkeypatch.setattr(BlocksFanIn, "DELAY", 0.05)
+    fan_in = BlocksFanIn()
+    batches = []
+    fan_in.nodes_changed.connect(lambda connectors: batches.append(connectors))
+    block_data = {"number": 10, "hash": block_hash(10), "previousHash": block_hash(9), "medianTime": 1346543453}
+
+    failing = FakeNodeConnector("pubkey0", 8, available=False)
+    answering = FakeNodeConnector("pubkey1", 7)
+    new = FakeNodeConnector("pubkey2", None)
+    for connector in (failing, answering, new):
+        fan_in.receive(connector, block_data)
+    await asyncio.sleep(0.1)
+
+    assert batches == [[failing, answering, new]]
+    # The failing node is not requested again once it failed
+    assert (failing.requests, answering.requests) == (1, 2)
+    assert failing.node.state == Node.ONLINE
+    assert failing.node.previous_buid == BlockUID(8, block_hash(8))
+    assert new.node.previous_buid == BlockUID(9, block_hash(9))
+    assert new.node.current_buid == BlockUID(10, block_hash(10))
+
+    block_data = {"number": 11, "hash": block_hash(11), "previousHash": block_hash(10), "medianTime": 1346543454}
+    lagging = [FakeNodeConnector("pubkey{0}".format(i), 8, available=False) for i in range(3, 5)]
+    for connector in lagging:
+        fan_in.receive(connector, block_data)
+    await asyncio.sleep(0.1)
+    assert batches[1] == lagging
+    for connector in lagging:
+        assert connector.requests == 1
+        assert connector.node.state == Node.OFFLINE
@@ -0,0 +1,25 @@
+from sakia.data.repositories import BlocksRepo
+from sakia.data.entities import CachedBlock
+
+
+def test_add_get_drop_blocks(meta_repo):
+    blocks_repo = BlocksRepo(meta_repo.conn)
+    for number in range(0, 5):
+        blocks_repo.insert(CachedBlock("testcurrency", number,
+                                       "{0}7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D6".format(number),
+                                       "",
+                                       1346543453 + number * 300, 10, 1000, None, 0,
+                                       "Version: 5\nType: Block\n", "SIGNATURE"))
+    block = blocks_repo.get_one(currency="testcurrency", number=3)
+    assert block.sha_hash == "37518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D6"
+    assert block.median_time == 1346544353
+    assert block.dividend is None
+    assert block.bma_data()['medianTime'] == 1346544353
+
+    block = blocks_repo.get_one(sha_hash="27518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D6")
+    assert block.number == 2
+
+    blocks_repo.drop_from("testcurrency", 2)
+    assert blocks_repo.get_one(currency="testcurrency", number=1) is not None
+    assert blocks_repo.get_one(currency="testcurrency", number=2) is None
+    assert blocks_repo.get_one(currency="testcurrency", number=4) is None
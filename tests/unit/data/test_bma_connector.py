@@ -0,0 +1,351 @@
+import asyncio
+import hashlib
+import pytest
+from aiohttp.errors import ClientError
+from duniterpy.api import bma
+from duniterpy.documents import Block, BlockUID, endpoint
+from sakia.data.connectors import BmaConnector, EndpointsHealthTracker
+from sakia.data.connectors.bma import answer_digest, _check_blocks_chain
+from sakia.data.entities import Node, UserParameters
+from sakia.data.repositories import BlocksRepo
+from sakia.errors import NoPeerAvailable
+
+
+class FakeNodesProcessor:
+    def __init__(self, nodes=()):
+        self.nodes = list(nodes)
+
+    def synced_members_nodes(self, currency):
+        return self.nodes
+
+    def synced_nodes(self, currency):
+        return self.nodes
+
+    def current_buid(self, currency):
+        return BlockUID(10, "7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
+
+
+class FakeBmaConnector(BmaConnector):
+    def __init__(self, blocks_repo=None):
+        super().__init__(FakeNodesProcessor(), None, blocks_repo)
+        self.requests = 0
+
+    async def simple_get(self, currency, request, req_args):
+        self.requests += 1
+        await asyncio.sleep(0.1)
+        return {"number": req_args['number']}
+
+    async def verified_get(self, currency, request, req_args):
+        self.requests += 1
+        number = req_args.get('number', 10)
+        return {"currency": currency,
+                "number": number,
+                "hash": "{0}518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67".format(number),
+                "previousHash": None,
+                "medianTime": 1346543453,
+                "membersCount": 10,
+                "monetaryMass": 1000,
+                "dividend": None,
+                "unitbase": 0,
+                "raw": "Version: 5\nType: Block\n",
+                "signature": "SIGNATURE"}
+
+
+@pytest.mark.asyncio
+async def test_coalesce_identical_requests():
+    connector = FakeBmaConnector()
+    results = await asyncio.gather(connector.get("test_currency", bma.blockchain.block, {'number': 3}, verify=False),
+                                   connector.get("test_currency", bma.blockchain.block, {'number': 3}, verify=False),
+                                   connector.get("test_currency", bma.blockchain.block, {'number': 4}, verify=False))
+    assert results == [{"number": 3}, {"number": 3}, {"number": 4}]
+    assert connector.requests == 2
+    assert connector.coalesced_calls == 1
+
+    await connector.get("test_currency", bma.blockchain.block, {'number': 3}, verify=False)
+    assert connector.requests == 3
+    assert connector.coalesced_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_blocks_cache(meta_repo):
+    connector = FakeBmaConnector(BlocksRepo(meta_repo.conn))
+    block = await connector.get("test_currency", bma.blockchain.block, {'number': 3})
+    cached_block = await connector.get("test_currency", bma.blockchain.block, {'number': 3})
+    assert cached_block == block
+    assert connector.requests == 1
+    assert connector.blocks_cache_hits == 1
+    assert connector.blocks_cache_misses == 1
+
+    # The current block is not immutable yet
+    await connector.get("test_currency", bma.blockchain.block, {'number': 10})
+    await connector.get("test_currency", bma.blockchain.block, {'number': 10})
+    assert connector.requests == 3
+
+    connector.invalidate_blocks("test_currency", 2)
+    await connector.get("test_currency", bma.blockchain.block, {'number': 3})
+    assert connector.requests == 4
+
+    # The request without number, of the current block, bypasses the cache
+    block = await connector.get("test_currency", bma.blockchain.block)
+    assert block['number'] == 10
+    assert connector.requests == 5
+    assert connector.blocks_cache_misses == 4
+
+    # The blocks requested without cache are not read nor written in the cache
+    await connector.get_block("test_currency", 4, cached=False)
+    await connector.get_block("test_currency", 4, cached=False)
+    assert connector.requests == 7
+    assert connector.blocks_cache_misses == 4
+
+
+class OrderedHealthTracker(EndpointsHealthTracker):
+    def order(self, currency, items, endpoints_of=None):
+        return list(items)
+
+
+class QuorumBmaConnector(BmaConnector):
+    """
+    Nodes answer after the given delays, or fail if the delay is None
+    """
+    def __init__(self, delays):
+        nodes = [Node("test_currency", "pubkey{0}".format(i),
+                      endpoints=[endpoint("BASIC_MERKLED_API node{0}.duniter.org 80".format(i))],
+                      peer_blockstamp=BlockUID.empty())
+                 for i in range(0, len(delays))]
+        super().__init__(FakeNodesProcessor(nodes), UserParameters(), None, OrderedHealthTracker(None))
+        self.delays = delays
+        self.requested = []
+        self.cancelled = []
+
+    async def _request(self, currency, request, endpoint, req_args, proxy=None):
+        index = int(endpoint.server[4:endpoint.server.index(".")])
+        self.requested.append(index)
+        if self.delays[index] is None:
+            raise ClientError("Connection refused")
+        try:
+            await asyncio.sleep(self.delays[index])
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        return {"number": req_args['number']}
+
+
+@pytest.mark.asyncio
+async def test_verified_get_early_exit():
+    # 3 nodes : 2 agreeing nodes are needed
+    connector = QuorumBmaConnector([0.01, 5, 0.02])
+    data = await asyncio.wait_for(connector.verified_get("test_currency", bma.blockchain.block, {'number': 3}), 1)
+    assert data == {"number": 3}
+    assert connector.requested == [0, 1, 2]
+    assert connector.cancelled == [1]
+
+
+@pytest.mark.asyncio
+async def test_verified_get_quorum():
+    # 16 nodes : more than 10 agreeing nodes are needed
+    connector = QuorumBmaConnector([0.01] * 11 + [5] * 5)
+    data = await asyncio.wait_for(connector.verified_get("test_currency", bma.blockchain.block, {'number': 3}), 1)
+    assert data == {"number": 3}
+    assert connector.requested == list(range(0, 12))
+    assert connector.cancelled == [11]
+
+
+@pytest.mark.asyncio
+async def test_verified_get_replaces_failures():
+    # 6 nodes : 4 agreeing nodes are needed
+    connector = QuorumBmaConnector([None, 0.01, None, 0.02, 0.01, 0.01])
+    data = await connector.verified_get("test_currency", bma.blockchain.block, {'number': 3})
+    assert data == {"number": 3}
+    assert connector.requested == [0, 1, 2, 3, 4, 5]
+    assert connector.cancelled == []
+
+    connector = QuorumBmaConnector([None, None])
+    with pytest.raises(NoPeerAvailable):
+        await connector.verified_get("test_currency", bma.blockchain.block, {'number': 3})
+
+
+def test_answer_digest():
+    history = {"currency": "test_currency",
+               "pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+               "history": {"sent": [{"hash": "A", "inputs": ["1", "2"]}, {"hash": "B", "inputs": []}],
+                           "received": [],
+                           "sending": [],
+                           "receiving": [],
+                           "pending": []}}
+    reordered = {"pubkey": "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                 "currency": "test_currency",
+                 "history": {"received": [],
+                             "sent": [{"inputs": [], "hash": "B"}, {"inputs": ["2", "1"], "hash": "A"}],
+                             "sending": [{"hash": "C"}],
+                             "receiving": [],
+                             "pending": []}}
+    assert answer_digest(bma.tx.history, history) == answer_digest(bma.tx.history, reordered)
+    # The volatile fields are only skipped for the requests they belong to
+    assert answer_digest(bma.blockchain.block, history) != answer_digest(bma.blockchain.block, reordered)
+    # The data is not modified
+    assert history["history"]["sending"] == []
+
+    reordered["history"]["sent"][1]["inputs"].append("3")
+    assert answer_digest(bma.tx.history, history) != answer_digest(bma.tx.history, reordered)
+    assert answer_digest(bma.blockchain.block, {"number": 1}) != answer_digest(bma.blockchain.block, {"number": "1"})
+
+
+def forge_block(number, previous_hash, fork=0, amount=100):
+    """
+    Forge a block with a transaction, and its hashes
+    """
+    median_time = 1473108382 + number + fork
+    raw = """Version: 10
+Type: Block
+Currency: test_currency
+Number: {number}
+PoWMin: 0
+Time: {median_time}
+MedianTime: {median_time}
+UnitBase: 0
+Issuer: {pubkey}
+IssuersFrame: 1
+IssuersFrameVar: 0
+DifferentIssuersCount: 0
+PreviousHash: {previous_hash}
+PreviousIssuer: {pubkey}
+MembersCount: 1
+Identities:
+Joiners:
+Actives:
+Leavers:
+Revoked:
+Excluded:
+Certifications:
+Transactions:
+TX:10:1:1:1:1:0:0
+{previous_number}-{previous_hash}
+{pubkey}
+{amount}:0:D:{pubkey}:{previous_number}
+0:SIG(0)
+{amount}:0:SIG({pubkey})
+U0lHTkFUVVJF
+""".format(number=number, median_time=median_time, pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+           previous_number=number - 1, previous_hash=previous_hash, amount=amount)
+    inner_hash = hashlib.sha256(raw.encode("ascii")).hexdigest().upper()
+    raw += "InnerHash: {0}\nNonce: 1\n".format(inner_hash)
+    signature = "U0lHTkFUVVJF"
+    sha_hash = hashlib.sha256("InnerHash: {0}\nNonce: 1\n{1}\n".format(inner_hash, signature).encode("ascii"))
+    return {"number": number,
+            "hash": sha_hash.hexdigest().upper(),
+            "previousHash": previous_hash,
+            "medianTime": median_time,
+            "membersCount": 1,
+            "monetaryMass": 0,
+            "dividend": None,
+            "unitbase": 0,
+            "raw": raw,
+            "signature": signature}
+
+
+def forge_chain(end, fork=0, tampered=None):
+    """
+    Forge the blocks 1 to end. The chains of different forks have different blocks.
+    The transaction of the tampered block has a changed amount, the blocks after it are consistent.
+    """
+    blocks = {}
+    previous_hash = "0" * 64
+    for number in range(1, end + 1):
+        blocks[number] = forge_block(number, previous_hash, fork, 200 if number == tampered else 100)
+        previous_hash = blocks[number]['hash']
+    return blocks
+
+
+CHAIN = forge_chain(49)
+
+
+class BlocksBmaConnector(QuorumBmaConnector):
+    """
+    Nodes serve a chain of blocks. The nodes of the given indexes serve another chain.
+    """
+    def __init__(self, nb_nodes, chains=None):
+        super().__init__([0] * nb_nodes)
+        self.chains = chains or {}
+
+    async def _request(self, currency, request, endpoint, req_args, proxy=None):
+        index = int(endpoint.server[4:endpoint.server.index(".")])
+        chain = self.chains.get(index, CHAIN)
+        if request is bma.blockchain.block:
+            return chain[req_args['number']]
+        self.requested.append((index, req_args['start']))
+        await asyncio.sleep(0.01)
+        return [chain[n] for n in range(req_args['start'], req_args['start'] + req_args['count'])]
+
+
+@pytest.mark.asyncio
+async def test_download_blocks(monkeypatch):
+    monkeypatch.setattr(BmaConnector, "BLOCKS_WINDOW", 10)
+    connector = BlocksBmaConnector(3)
+    windows = connector.download_blocks("test_currency", 5, 49, CHAIN[4]['hash'], CHAIN[49]['hash'])
+    assert len(windows) == 5
+    blocks = []
+    for window in windows:
+        blocks += await window
+    assert [b['number'] for b in blocks] == list(range(5, 50))
+    # The windows are spread over the nodes
+    assert sorted(connector.requested) == [(0, 5), (0, 35), (1, 15), (1, 45), (2, 25)]
+
+
+@pytest.mark.asyncio
+async def test_download_blocks_checks_chain(monkeypatch):
+    monkeypatch.setattr(BmaConnector, "BLOCKS_WINDOW", 10)
+    forked_chain = forge_chain(49, fork=1)
+    connector = BlocksBmaConnector(3, chains={1: forked_chain})
+    windows = connector.download_blocks("test_currency", 5, 49, CHAIN[4]['hash'], CHAIN[49]['hash'])
+    blocks = []
+    for window in windows:
+        blocks += await window
+    assert [b['hash'] for b in blocks] == [CHAIN[n]['hash'] for n in range(5, 50)]
+    # The windows served by the forked node were requested again to another node
+    assert (2, 15) in connector.requested
+    assert (2, 45) in connector.requested
+
+    connector = BlocksBmaConnector(2, chains={0: forked_chain, 1: forked_chain})
+    windows = connector.download_blocks("test_currency", 5, 49, CHAIN[4]['hash'], CHAIN[49]['hash'])
+    with pytest.raises(NoPeerAvailable):
+        await windows[0]
+    for window in windows:
+        window.cancel()
+
+
+@pytest.mark.asyncio
+async def test_download_blocks_tampered(monkeypatch):
+    monkeypatch.setattr(BmaConnector, "BLOCKS_WINDOW", 10)
+    # A block whose transaction changed does not match its hashes anymore
+    block = dict(CHAIN[17], raw=CHAIN[17]['raw'].replace("100:0:SIG", "200:0:SIG"))
+    assert not _check_blocks_chain([block], 17, 1, CHAIN[16]['hash'], CHAIN[17]['hash'])
+    assert _check_blocks_chain([CHAIN[17]], 17, 1, CHAIN[16]['hash'], CHAIN[17]['hash'])
+    # The inner hash is checked on the signed text, not on the raw regenerated by duniterpy
+    with monkeypatch.context() as m:
+        m.setattr(Block, "raw", lambda self: "Version: 10\nType: Block\nInnerHash: {0}\n".format(self.inner_hash))
+        assert _check_blocks_chain([CHAIN[17]], 17, 1, CHAIN[16]['hash'], CHAIN[17]['hash'])
+
+    # The node 1 tampers with a transaction and serves a consistent chain after it
+    connector = BlocksBmaConnector(3, chains={1: forge_chain(49, tampered=17)})
+    windows = connector.download_blocks("test_currency", 5, 49, CHAIN[4]['hash'])
+    blocks = []
+    for window in windows:
+        blocks += await window
+    assert blocks == [CHAIN[n] for n in range(5, 50)]
+    # The window of the tampered block was requested again to another node
+    assert (1, 15) in connector.requested
+    assert (2, 15) in connector.requested
+
+
+@pytest.mark.asyncio
+async def test_sessions_limit_connections_per_node():
+    connector = BmaConnector(FakeNodesProcessor(), UserParameters())
+    session = connector.session("test_currency")
+    assert connector.session("test_currency") is session
+    if hasattr(session.connector, "limit_per_host"):
+        # The total of the connections to all the nodes is not limited to the connections to a node
+        assert session.connector.limit_per_host == BmaConnector.CONNECTIONS_PER_HOST
+        assert session.connector.limit > BmaConnector.CONNECTIONS_PER_HOST
+    else:
+        assert session.connector.limit == BmaConnector.CONNECTIONS_PER_HOST
+    await connector.close_sessions()
@@ -0,0 +1,65 @@
+import pytest
+from duniterpy.documents import Peer, endpoint
+from sakia.data.connectors import NodeConnector, CircuitBreaker, CircuitBreakers
+
+
+NODE = endpoint("BASIC_MERKLED_API duniter.inso.ovh 80")
+
+
+def test_open_and_close_circuit(monkeypatch):
+    breakers = CircuitBreakers()
+    for _ in range(0, CircuitBreaker.FAILURES_THRESHOLD - 1):
+        breakers.attempt(NODE)
+        breakers.failure(NODE)
+    assert breakers.available(NODE)
+    breakers.attempt(NODE)
+    breakers.failure(NODE)
+    assert breakers.breaker(NODE).state == CircuitBreaker.OPEN
+    assert not breakers.available(NODE)
+
+    # The cool-down is over : a single trial request is allowed
+    monkeypatch.setattr(CircuitBreaker, "COOLDOWN", 0)
+    assert breakers.available(NODE)
+    breakers.attempt(NODE)
+    assert breakers.breaker(NODE).state == CircuitBreaker.HALF_OPEN
+    assert not breakers.available(NODE)
+
+    # The trial request fails : the circuit is opened again
+    breakers.failure(NODE)
+    assert breakers.breaker(NODE).state == CircuitBreaker.OPEN
+
+    # A cancelled trial request does not block the circuit
+    breakers.attempt(NODE)
+    breakers.release(NODE)
+    assert breakers.available(NODE)
+
+    breakers.attempt(NODE)
+    breakers.success(NODE)
+    assert breakers.breaker(NODE).state == CircuitBreaker.CLOSED
+    assert breakers.breaker(NODE).failures == 0
+
+
+@pytest.mark.asyncio
+async def test_node_connector_skips_open_circuit():
+    peer = Peer.from_signed_raw("""Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw==
+""")
+    breakers = CircuitBreakers()
+    # Failures reported by the bma connector
+    for _ in range(0, CircuitBreaker.FAILURES_THRESHOLD):
+        breakers.failure(NODE)
+    connector = NodeConnector.from_peer('meta_brouzouf', peer, None, breakers)
+    requests = []
+
+    async def request(conn_handler, **kwargs):
+        requests.append(conn_handler)
+        return {}
+
+    assert await connector.safe_request(connector.node.endpoints[0], request, proxy=None) is None
+    assert requests == []
@@ -0,0 +1,91 @@
+import threading
+import pytest
+from sakia.data.repositories import SakiaDatabase, DatabaseExecutor, TransactionsRepo, DividendsRepo, \
+    NodesRepo, NodesStore, STORAGE_PROFILES
+from sakia.data.entities import Transaction, Dividend
+
+
+class ThreadRepo(TransactionsRepo):
+    def thread_name(self):
+        return threading.current_thread().name
+
+
+class FlushedNodesStore(NodesStore):
+    flushes = 0
+
+    def flush(self):
+        FlushedNodesStore.flushes += 1
+        super().flush()
+
+
+def transaction(sha_hash, issuer, receiver):
+    return Transaction("testcurrency", sha_hash, 20,
+                       "15-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67",
+                       1473108382,
+                       "H41/8OGV2W4CLKbE35kk5t1HJQsb3jEM0/QGLUf80CwJvGZf3HvVCcNtHPUFoUBKEDQO9mPK3KJkqOoxHpqHCw==",
+                       issuer, receiver, 1565, 1, "", 0, Transaction.VALIDATED)
+
+
+@pytest.mark.asyncio
+async def test_async_repository(tmpdir):
+    path = str(tmpdir.join("testcurrency.db"))
+    con = SakiaDatabase.connect(path)
+    db = SakiaDatabase(con, transactions_repo=ThreadRepo(con), dividends_repo=DividendsRepo(con),
+                       nodes_repo=FlushedNodesStore(NodesRepo(con)),
+                       executor=DatabaseExecutor(lambda: SakiaDatabase.connect(path)))
+    db.prepare()
+    db.upgrade_database()
+    db.transactions_repo.insert(transaction("A" * 64, "pubkey1", "pubkey2"))
+    db.transactions_repo.insert(transaction("B" * 64, "pubkey3", "pubkey1"))
+    db.transactions_repo.insert(transaction("C" * 64, "pubkey2", "pubkey3"))
+    db.commit()
+
+    transactions = db.async_repo(db.transactions_repo)
+    assert await transactions.thread_name() != threading.current_thread().name
+    transfers = await transactions.get_transfers("testcurrency", "pubkey1")
+    assert sorted(t.sha_hash for t in transfers) == ["A" * 64, "B" * 64]
+
+    # The writes of the database thread are committed
+    await db.async_repo(db.dividends_repo).insert(Dividend("testcurrency", "pubkey1", 3, 1473108382, 100, 0))
+    assert db.dividends_repo.get_one(pubkey="pubkey1").amount == 100
+
+    # The rows not yet committed by the main connection are seen by the database thread
+    db.transactions_repo.insert(transaction("D" * 64, "pubkey1", "pubkey3"))
+    transfers = await transactions.get_transfers("testcurrency", "pubkey1")
+    assert sorted(t.sha_hash for t in transfers) == ["A" * 64, "B" * 64, "D" * 64]
+    assert not con.in_transaction
+
+    # Without pending writes, the database is not committed on the event loop
+    flushes = FlushedNodesStore.flushes
+    await transactions.get_transfers("testcurrency", "pubkey1")
+    assert FlushedNodesStore.flushes == flushes
+
+    # The thread is started again after a shutdown
+    db.shutdown()
+    assert await transactions.thread_name() != threading.current_thread().name
+    db.shutdown()
+
+
+def test_async_nodes_store(meta_repo):
+    with pytest.raises(TypeError):
+        meta_repo.async_repo(meta_repo.nodes_repo)
+
+
+@pytest.mark.asyncio
+async def test_async_repository_in_memory(meta_repo):
+    meta_repo.transactions_repo.insert(transaction("A" * 64, "pubkey1", "pubkey2"))
+    transfers = await meta_repo.async_repo(meta_repo.transactions_repo).get_transfers("testcurrency", "pubkey1")
+    assert [t.sha_hash for t in transfers] == ["A" * 64]
+
+
+def test_storage_profile(tmpdir):
+    path = str(tmpdir.join("testcurrency.db"))
+    con = SakiaDatabase.connect(path, STORAGE_PROFILES["desktop"])
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (1,)
+    assert con.execute("PRAGMA cache_size").fetchone() == (-16000,)
+    # The journal mode is persistent, the other settings are per connection
+    con.close()
+    con = SakiaDatabase.connect(path)
+    assert con.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert con.execute("PRAGMA synchronous").fetchone() == (2,)
@@ -0,0 +1,41 @@
+from duniterpy.documents import endpoint
+from sakia.data.connectors import EndpointsHealthTracker
+from sakia.data.repositories import EndpointsHealthRepo
+
+
+FAST = endpoint("BASIC_MERKLED_API fast.duniter.org 80")
+SLOW = endpoint("BASIC_MERKLED_API slow.duniter.org 80")
+FAILING = endpoint("BASIC_MERKLED_API failing.duniter.org 80")
+
+
+def test_record_outcomes():
+    tracker = EndpointsHealthTracker(None)
+    for _ in range(0, 20):
+        tracker.record_success("testcurrency", FAST, 0.02)
+        tracker.record_success("testcurrency", SLOW, 5)
+        tracker.record_failure("testcurrency", FAILING)
+    assert tracker.score("testcurrency", FAST) < tracker.score("testcurrency", SLOW)
+    assert tracker.score("testcurrency", FAST) < tracker.score("testcurrency", FAILING)
+    assert tracker.health("testcurrency", FAILING).error_rate > 0.9
+
+    tracker.record_limitation("testcurrency", FAST)
+    tracker.record_limitation("testcurrency", FAST)
+    assert tracker.health("testcurrency", FAST).limitations == 2
+    tracker.record_success("testcurrency", FAST, 0.02)
+    assert tracker.health("testcurrency", FAST).limitations == 0
+
+    chosen = [tracker.choose("testcurrency", [FAST, SLOW, FAILING]) for _ in range(0, 500)]
+    assert chosen.count(FAST) > 400
+    assert set(tracker.sample("testcurrency", [FAST, SLOW, FAILING], 2)) <= {FAST, SLOW, FAILING}
+
+
+def test_persist_health(meta_repo):
+    tracker = EndpointsHealthTracker(EndpointsHealthRepo(meta_repo.conn))
+    tracker.record_success("testcurrency", FAST, 0.02)
+    tracker.record_failure("testcurrency", FAILING)
+    tracker.persist()
+
+    tracker = EndpointsHealthTracker(EndpointsHealthRepo(meta_repo.conn))
+    assert tracker.health("testcurrency", FAST).requests == 1
+    assert tracker.health("testcurrency", FAST).latency < EndpointsHealthTracker.DEFAULT_LATENCY
+    assert tracker.health("testcurrency", FAILING).error_rate == EndpointsHealthTracker.ALPHA
@@ -1,5 +1,8 @@
+import asyncio
+import pytest
 from duniterpy.documents import Peer
-from sakia.data.connectors import NodeConnector
+from sakia.data.connectors import NodeConnector, PeersLeaves
+from sakia.data.entities import UserParameters
 
 
 def test_from_peer():
@@ -16,3 +19,55 @@ BASIC_MERKLED_API duniter.inso.ovh 80
     assert connector.node.pubkey == "8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU"
     assert connector.node.endpoints[0].inline() == "BASIC_MERKLED_API duniter.inso.ovh 80"
     assert connector.node.currency == "meta_brouzouf"
+
+
+PEER_DATA = {"raw": """Version: 2
+Type: Peer
+Currency: meta_brouzouf
+PublicKey: 8Fi1VSTbjkXguwThF4v2ZxC5whK7pwG2vcGTkPUPjPGU
+Block: 48698-000005E0F228038E4DDD4F6CA4ACB01EC88FBAF8
+Endpoints:
+BASIC_MERKLED_API duniter.inso.ovh 80
+""", "signature": "82o1sNCh1bLpUXU6nacbK48HBcA9Eu2sPkL1/3c2GtDPxBUZd2U2sb7DxwJ54n6ce9G0Oy7nd1hCxN3fS0oADw=="}
+
+
+class LeavesNodeConnector(NodeConnector):
+    def __init__(self, peer, leaves, peers_leaves):
+        super().__init__(NodeConnector.from_peer('meta_brouzouf', peer, None).node, UserParameters(),
+                         peers_leaves=peers_leaves)
+        self.leaves = leaves
+        self.requested_leaves = []
+        self.running = 0
+        self.max_running = 0
+
+    async def safe_request(self, endpoint, request, proxy, req_args={}):
+        if 'leaves' in req_args:
+            return {"root": "ROOT", "leaves": self.leaves}
+        self.requested_leaves.append(req_args['leaf'])
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return {"leaf": {"hash": req_args['leaf'], "value": PEER_DATA}}
+
+
+@pytest.mark.asyncio
+async def test_request_peers_leaves():
+    peer = Peer.from_signed_raw(PEER_DATA["raw"] + PEER_DATA["signature"] + "\n")
+    peers_leaves = PeersLeaves()
+    leaves = ["LEAF{0}".format(i) for i in range(0, 50)]
+    connector = LeavesNodeConnector(peer, leaves, peers_leaves)
+    found = []
+    connector.neighbour_found.connect(lambda p: found.append(p))
+    await connector.request_peers()
+    assert sorted(connector.requested_leaves) == sorted(leaves)
+    assert 1 < connector.max_running <= NodeConnector.LEAVES_CONCURRENCY
+    assert len(found) == 50
+    assert connector.node.merkle_peers_root == "ROOT"
+    assert connector.node.merkle_peers_leaves == tuple(leaves)
+
+    # The leaves already fetched by another node are skipped
+    other = LeavesNodeConnector(peer, leaves + ["LEAF50"], peers_leaves)
+    await other.request_peers()
+    assert other.requested_leaves == ["LEAF50"]
+    assert other.node.merkle_peers_root == "ROOT"
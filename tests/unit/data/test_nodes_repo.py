@@ -1,4 +1,6 @@
-from sakia.data.repositories import NodesRepo
+import sqlite3
+import pytest
+from sakia.data.repositories import NodesRepo, NodesStore
 from sakia.data.entities import Node
 from duniterpy.documents import BlockUID, BMAEndpoint, UnknownEndpoint, block_uid
 
@@ -92,3 +94,36 @@ UNKNOWNAPI some useless information""",
     node2 = nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
     assert node2.current_buid == block_uid("16-77543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
     assert node2.previous_buid == block_uid("15-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67")
+
+
+def test_nodes_store_write_behind(meta_repo):
+    nodes_repo = NodesRepo(meta_repo.conn)
+    nodes_repo.insert(Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                           "BASIC_MERKLED_API testnet.duniter.org 80", BlockUID.empty(), state=Node.ONLINE))
+    nodes_store = NodesStore(nodes_repo)
+    node = nodes_store.get_one(currency="testcurrency", pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    node.state = Node.DESYNCED
+    node.merkle_peers_leaves = ("LEAF1", "LEAF2")
+    nodes_store.update(node)
+    nodes_store.insert(Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                            "BASIC_MERKLED_API test-net.duniter.fr 9201", BlockUID.empty(), state=Node.ONLINE))
+    with pytest.raises(sqlite3.IntegrityError):
+        nodes_store.insert(Node("testcurrency", "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                                "BASIC_MERKLED_API test-net.duniter.fr 9201", BlockUID.empty()))
+
+    # The changes are served from memory until the store is flushed
+    assert [n.pubkey for n in nodes_store.get_all(currency="testcurrency", state=Node.ONLINE)] \
+        == ["FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn"]
+    assert nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ").state == Node.ONLINE
+    assert len(nodes_repo.get_all()) == 1
+
+    assert nodes_store.flush() == 2
+    node = nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    assert node.state == Node.DESYNCED
+    assert node.merkle_peers_leaves == ("LEAF1", "LEAF2")
+    assert len(nodes_repo.get_all()) == 2
+
+    nodes_store.drop(node)
+    assert nodes_store.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ") is None
+    assert nodes_store.flush() == 1
+    assert nodes_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ") is None
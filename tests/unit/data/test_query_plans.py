@@ -0,0 +1,74 @@
+import sqlite3
+from sakia.data.entities import Dividend, Node, Transaction
+from sakia.data.repositories import SakiaDatabase, TransactionsRepo, CertificationsRepo, NodesRepo, \
+    DividendsRepo, SourcesRepo, IdentitiesRepo
+
+
+class PlansConnection:
+    """
+    Records the query plan of every statement run by a repository
+    """
+    def __init__(self, conn):
+        self._conn = conn
+        self.plans = []
+
+    def execute(self, request, parameters=()):
+        plan = self._conn.execute("EXPLAIN QUERY PLAN " + request, parameters).fetchall()
+        self.plans.append((request, [row[-1] for row in plan]))
+        return self._conn.execute(request, parameters)
+
+
+def assert_no_scan(conn):
+    for request, plan in conn.plans:
+        scans = [step for step in plan if step.startswith("SCAN")]
+        assert not scans, "{0} : {1}".format(" ".join(request.split()), scans)
+
+
+def test_hot_queries_use_indexes(meta_repo):
+    conn = PlansConnection(meta_repo.conn)
+
+    transactions_repo = TransactionsRepo(conn)
+    transactions_repo.get_transfers("testcurrency", "pubkey")
+    transactions_repo.get_all(currency="testcurrency", state=Transaction.AWAITING)
+    transactions_repo.get_all(currency="testcurrency", written_on=10)
+    transactions_repo.get_all(currency="testcurrency", issuer="pubkey")
+    transactions_repo.get_all(currency="testcurrency", receiver="pubkey")
+    transactions_repo.get_one(sha_hash="FCAD5A388AC8A811B45A9334A375585E77071AA9F6E5B6896582961A6C66F365")
+
+    certifications_repo = CertificationsRepo(conn)
+    certifications_repo.get_all(currency="testcurrency", certifier="pubkey")
+    certifications_repo.get_all(currency="testcurrency", certified="pubkey")
+    certifications_repo.get_latest_sent(currency="testcurrency", pubkey="pubkey")
+
+    nodes_repo = NodesRepo(conn)
+    nodes_repo.get_all(currency="testcurrency", state=Node.ONLINE)
+    nodes_repo.get_all(currency="testcurrency", state=Node.ONLINE, member=True)
+    nodes_repo.get_all(currency="testcurrency", root=True)
+    nodes_repo.get_one(currency="testcurrency", pubkey="pubkey")
+
+    DividendsRepo(conn).get_all(currency="testcurrency", pubkey="pubkey")
+    SourcesRepo(conn).get_all(currency="testcurrency", pubkey="pubkey")
+    IdentitiesRepo(conn).get_all(currency="testcurrency", pubkey="pubkey")
+
+    assert len(conn.plans) == 16
+    assert_no_scan(conn)
+
+
+def test_dividends_block_number_migration():
+    con = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    db = SakiaDatabase(con, dividends_repo=DividendsRepo(con))
+    db.prepare()
+    db.version()
+    for upgrade in db.upgrades[:4]:
+        upgrade()
+    with con:
+        con.execute("UPDATE meta SET version=4 WHERE id=1")
+        con.execute("INSERT INTO dividends VALUES ('testcurrency', 'pubkey', '9', 1473108382, 100, 0)")
+        con.execute("INSERT INTO dividends VALUES ('testcurrency', 'pubkey', '10', 1473108482, 100, 0)")
+    db.upgrade_database()
+
+    assert con.execute("SELECT DISTINCT typeof(block_number) FROM dividends").fetchall() == [("integer",)]
+    dividends = db.dividends_repo.get_dividends("testcurrency", "pubkey", sort_by="block_number")
+    assert [d.block_number for d in dividends] == [9, 10]
+    db.dividends_repo.drop(Dividend("testcurrency", "pubkey", 9, 1473108382, 100, 0))
+    assert [d.block_number for d in db.dividends_repo.get_all(currency="testcurrency")] == [10]
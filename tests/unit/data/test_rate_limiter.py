@@ -0,0 +1,42 @@
+import asyncio
+import time
+import pytest
+from duniterpy.documents import endpoint
+from sakia.data.connectors import RateLimiter, TokenBucket
+
+
+NODE = endpoint("BASIC_MERKLED_API node.duniter.org 80")
+
+
+@pytest.mark.asyncio
+async def test_queue_when_budget_spent():
+    limiter = RateLimiter()
+    start = time.monotonic()
+    for _ in range(0, int(TokenBucket.CAPACITY)):
+        await limiter.acquire(NODE)
+    assert time.monotonic() - start < 0.05
+
+    await limiter.acquire(NODE)
+    assert time.monotonic() - start >= 1 / TokenBucket.INITIAL_RATE * 0.9
+
+
+@pytest.mark.asyncio
+async def test_backoff_on_limitation(monkeypatch):
+    monkeypatch.setattr(TokenBucket, "BACKOFF", 0.05)
+    limiter = RateLimiter()
+    bucket = limiter.bucket(NODE)
+
+    limiter.limited(NODE)
+    assert bucket.rate == TokenBucket.INITIAL_RATE / 2
+    start = time.monotonic()
+    await limiter.acquire(NODE)
+    assert time.monotonic() - start >= 0.05 * 0.9
+
+    # The backoff doubles at each consecutive limitation
+    limiter.limited(NODE)
+    assert bucket.delay() >= 0.1 * 0.9
+    assert bucket.rate == TokenBucket.INITIAL_RATE / 4
+
+    limiter.succeeded(NODE)
+    assert bucket.limitations == 0
+    assert bucket.rate > TokenBucket.INITIAL_RATE / 4
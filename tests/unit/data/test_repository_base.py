@@ -0,0 +1,96 @@
+import sqlite3
+import attr
+import pytest
+from sakia.data.entities import Connection, Transaction, Node, Identity
+from sakia.data.repositories import ConnectionsRepo, TransactionsRepo, NodesRepo, IdentitiesRepo
+from sakia.data.repositories.base import Repository, row_decoder
+
+
+@attr.s()
+class String:
+    key = attr.ib(convert=str)
+    value = attr.ib(convert=str)
+
+
+@attr.s(frozen=True)
+class StringsRepo(Repository):
+    _table = "strings"
+    _entity = String
+
+
+def test_statements_are_cached(meta_repo):
+    transactions_repo = TransactionsRepo(meta_repo.conn)
+    select = transactions_repo._statement("SELECT", ("currency", "state"))
+    assert select == "SELECT * FROM transactions WHERE currency=? AND state=?"
+    assert transactions_repo._statement("SELECT", ("currency", "state")) is select
+    assert transactions_repo._statement("UPDATE").endswith("WHERE sha_hash=?")
+
+
+def test_statements_follow_schema(meta_repo):
+    meta_repo.conn.execute("CREATE TABLE strings(key VARCHAR(255), value VARCHAR(255), PRIMARY KEY(key))")
+    strings_repo = StringsRepo(meta_repo.conn)
+    assert strings_repo._statement("UPSERT").endswith("SET value=excluded.value")
+    meta_repo.conn.execute("ALTER TABLE strings ADD COLUMN comment VARCHAR(255)")
+    assert strings_repo._statement("UPSERT").endswith("SET value=excluded.value")
+    strings_repo.clear_statements()
+    assert strings_repo._statement("UPSERT").endswith("SET value=excluded.value,comment=excluded.comment")
+    other_conn = sqlite3.connect(":memory:")
+    other_conn.execute("CREATE TABLE strings(key VARCHAR(255), value VARCHAR(255), PRIMARY KEY(key))")
+    assert StringsRepo(other_conn)._statement("UPSERT").endswith("SET value=excluded.value")
+
+
+def test_decoded_rows_equal_entities(meta_repo):
+    transaction = Transaction("testcurrency",
+                              "FCAD5A388AC8A811B45A9334A375585E77071AA9F6E5B6896582961A6C66F365",
+                              20, "15-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67",
+                              1473108382, "H41/8OGV2W4CLKbE35kk5t1HJQsb3jEM0/QGLUf80CwJvGZf3HvVCcNtHPUFoUBKEDQO9mPK3KJkqOoxHpqHCw==",
+                              "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                              "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                              1565, 1, "", 0, Transaction.TO_SEND)
+    transactions_repo = TransactionsRepo(meta_repo.conn)
+    transactions_repo.insert(transaction)
+    row = meta_repo.conn.execute("SELECT * FROM transactions").fetchone()
+    decoded = transactions_repo._decode(row)
+    assert type(decoded) is Transaction
+    assert attr.astuple(decoded) == attr.astuple(Transaction(*row))
+
+    connections_repo = ConnectionsRepo(meta_repo.conn)
+    connections_repo.insert(Connection("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", "someuid"))
+    connection = connections_repo.get_one(currency="testcurrency")
+    assert connection.uid == "someuid"
+    assert connection.password == ""
+    assert connection.__dict__ == Connection(*meta_repo.conn.execute("SELECT * FROM connections").fetchone()).__dict__
+
+    nodes_repo = NodesRepo(meta_repo.conn)
+    nodes_repo.insert(Node("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                           """BASIC_MERKLED_API test-net.duniter.fr 13.222.11.22 9201
+BASIC_MERKLED_API testnet.duniter.org 80""", "0-E3B0C44298FC1C149AFBF4C8996FB92427AE41E4649B934CA495991B7852B855",
+                           merkle_peers_leaves=("AAAA", "BBBB"), root=True))
+    node = nodes_repo.get_one(currency="testcurrency")
+    assert len(node.endpoints) == 2
+    assert node.merkle_peers_leaves == ("AAAA", "BBBB")
+    assert node.root is True
+
+
+def test_decoded_rows_are_validated(meta_repo):
+    identities_repo = IdentitiesRepo(meta_repo.conn)
+    identities_repo.insert(Identity("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", "john",
+                                    "20-7518C700E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67",
+                                    member=True, membership_type="IN"))
+    row = meta_repo.conn.execute("SELECT * FROM identities").fetchone()
+    identity = identities_repo.get_one(pubkey="7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ")
+    assert identity.__dict__ == Identity(*row).__dict__
+    assert identity.member is True
+
+    row = list(row)
+    row[9] = 1
+    with pytest.raises(TypeError):
+        row_decoder(Identity, len(row))(row)
+
+
+def test_decoded_rows_use_defaults():
+    decoded = row_decoder(Identity, 3)(("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", "john"))
+    assert decoded.__dict__ == Identity("testcurrency", "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ", "john").__dict__
+    assert row_decoder(String, 2)((1, None)).__dict__ == {'key': "1", 'value': "None"}
+    with pytest.raises(TypeError):
+        row_decoder(String, 1)
@@ -1,4 +1,6 @@
+import pytest
 from sakia.data.repositories import TransactionsRepo
+from sakia.data.repositories import base
 from sakia.data.entities import Transaction
 
 
@@ -90,3 +92,33 @@ def test_add_update_transaction(meta_repo):
     transactions_repo.update(transaction)
     transaction2 = transactions_repo.get_one(sha_hash="FCAD5A388AC8A811B45A9334A375585E77071AA9F6E5B6896582961A6C66F365")
     assert transaction2.written_block == 20
+
+
+@pytest.mark.parametrize("upsert_supported", [True, False])
+def test_insert_upsert_many_transactions(meta_repo, monkeypatch, upsert_supported):
+    # Without upsert support (SQLite < 3.24), the known rows are updated then the others inserted
+    monkeypatch.setattr(base, "UPSERT_SUPPORTED", upsert_supported)
+    transactions_repo = TransactionsRepo(meta_repo.conn)
+    transactions = [Transaction("testcurrency",
+                                "{0}CAD5A388AC8A811B45A9334A375585E77071AA9F6E5B6896582961A6C66F365".format(i),
+                                20,
+                                "15-76543400E78B56CC21FB1DDC6CBAB24E0FACC9A798F5ED8736EA007F38617D67",
+                                1473108382,
+                                "H41/8OGV2W4CLKbE35kk5t1HJQsb3jEM0/QGLUf80CwJvGZf3HvVCcNtHPUFoUBKEDQO9mPK3KJkqOoxHpqHCw==",
+                                "7Aqw6Efa9EzE7gtsc8SveLLrM7gm6NEGoywSv4FJx6pZ",
+                                "FADxcH5LmXGmGFgdixSes6nWnC4Vb4pRUBYT81zQRhjn",
+                                1565,
+                                1,
+                                "",
+                                i,
+                                Transaction.TO_SEND) for i in range(0, 4)]
+    transactions_repo.insert_many(transactions[:2])
+    # The known transactions are ignored by insert_many and updated by upsert_many
+    transactions[0].state = Transaction.VALIDATED
+    transactions_repo.insert_many(transactions[:3])
+    assert len(transactions_repo.get_all(currency="testcurrency")) == 3
+    assert transactions_repo.get_one(sha_hash=transactions[0].sha_hash).state == Transaction.TO_SEND
+    transactions_repo.upsert_many(transactions)
+    assert transactions_repo.get_one(sha_hash=transactions[0].sha_hash).state == Transaction.VALIDATED
+    assert transactions_repo.get_one(sha_hash=transactions[1].sha_hash).state == Transaction.TO_SEND
+    assert len(transactions_repo.get_all(currency="testcurrency")) == 4